@@ -5,10 +5,12 @@ import numpy as np
 import math
 import random
 import connectors.openai_connector as Openai
+from connectors.azure_http_client import create_azure_http_client
+from connectors.llm_token_budget import count_message_tokens
 import json
 import os
+import time
 from openai import AzureOpenAI
-import httpx
 
 # Initialize logger
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +20,8 @@ logger = logging.getLogger(__name__)
 API_VERSION = "2024-12-01-preview"
 BASE_URL = "https://laasapim01.laas.icloud.intel.com/azopenai"
 DEFAULT_DEPLOYMENT = "gpt-4o"
+# Appended to an answer that was stopped before the model finished it
+INTERRUPTED_MARK = "\n\n*[response stopped]*"
 
 class AzureOpenAIChat:
     def __init__(self):
@@ -25,6 +29,9 @@ class AzureOpenAIChat:
         self.conversation_history = [
             {"role": "system", "content": "You are a helpful assistant specializing in software development and validation."}
         ]
+        # Outcome of the last chat_stream() call
+        self.last_response = ""
+        self.last_first_token_seconds = None
     
     def chat(self, user_message, max_tokens=1000, temperature=0.7):
         """Send a message and get response while maintaining conversation history"""
@@ -49,6 +56,58 @@ class AzureOpenAIChat:
             logger.error(f"Error in chat: {e}")
             return f"Error: {str(e)}"
     
+    def chat_stream(self, user_message, max_tokens=1000, temperature=0.7):
+        """
+        Streaming variant of chat(): returns a generator of the response text as it arrives, e.g. for st.write_stream.
+        The answer is added to the history when the stream ends. If the consumer stops early (the user stopped the
+        response or the page reran), the request is closed and the part received so far is kept, marked as stopped.
+        last_response and last_first_token_seconds hold the outcome once the generator is exhausted or closed.
+        """
+        self.conversation_history.append({"role": "user", "content": user_message})
+        self.last_response = ""
+        self.last_first_token_seconds = None
+        return self._stream_response(max_tokens, temperature)
+    
+    def _stream_response(self, max_tokens, temperature):
+        parts = []
+        outcome = "stopped"
+        start_time = time.time()
+        stream = None
+        try:
+            stream = self.client.chat.completions.create(
+                model=DEFAULT_DEPLOYMENT,
+                messages=self.conversation_history,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True
+            )
+            for chunk in stream:
+                # Azure also streams content filter results, in chunks without choices or content
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                if self.last_first_token_seconds is None:
+                    self.last_first_token_seconds = time.time() - start_time
+                    logger.info(f"First token after {self.last_first_token_seconds:.2f} seconds")
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+            outcome = "completed"
+        except Exception as e:
+            logger.error(f"Error in chat: {e}")
+            outcome = "failed"
+            parts.append(f"Error: {str(e)}")
+            yield f"Error: {str(e)}"
+        finally:
+            if stream is not None:
+                # Releases the connection (and stops generation) when the stream is abandoned mid-way
+                stream.close()
+            self.last_response = "".join(parts)
+            if outcome == "completed":
+                self.conversation_history.append({"role": "assistant", "content": self.last_response})
+            elif outcome == "stopped":
+                self.last_response += INTERRUPTED_MARK
+                self.conversation_history.append({"role": "assistant", "content": self.last_response})
+            logger.info(f"Chat response {outcome} after {time.time() - start_time:.2f} seconds")
+    
     def clear_history(self):
         """Clear conversation history except system message"""
         self.conversation_history = [self.conversation_history[0]]
@@ -56,12 +115,8 @@ class AzureOpenAIChat:
     def get_token_count(self):
         """Estimate token count of current conversation"""
         try:
-            import tiktoken
-            encoding = tiktoken.get_encoding("cl100k_base")
-            total_tokens = 0
-            for message in self.conversation_history:
-                total_tokens += len(encoding.encode(message["content"]))
-            return total_tokens
+            # Cached encoder of the chat deployment, not reloaded on every rerun
+            return count_message_tokens(self.conversation_history, DEFAULT_DEPLOYMENT)
         except:
             # Fallback estimation
             total_chars = sum(len(msg["content"]) for msg in self.conversation_history)
@@ -78,7 +133,7 @@ def create_azure_client():
         api_key=api_key,
         base_url=BASE_URL,
         default_headers={"Ocp-Apim-Subscription-Key": api_key},
-        http_client=httpx.Client(verify=False)
+        http_client=create_azure_http_client()
     )
     return client
 
@@ -126,14 +181,23 @@ def streamlit_chat_app():
         with st.chat_message("user"):
             st.markdown(prompt)
         
-        # Get AI response
+        # Stream the AI response into the message as it is generated
+        chat_bot = st.session_state.chat_bot
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = st.session_state.chat_bot.chat(prompt)
-                st.markdown(response)
-        
-        # Add assistant response to chat history
-        st.session_state.messages.append({"role": "assistant", "content": response})
+            # Clicking Stop reruns the page, which interrupts the stream; the part received so far is kept
+            stop_placeholder = st.empty()
+            stop_placeholder.button("⏹ Stop", key="stop_response")
+            stream = chat_bot.chat_stream(prompt, temperature=st.session_state.get("temperature", 0.7))
+            try:
+                st.write_stream(stream)
+            finally:
+                stream.close()
+                # Also runs when the stream is interrupted, so the page history matches the conversation history
+                if chat_bot.last_response:
+                    st.session_state.messages.append({"role": "assistant", "content": chat_bot.last_response})
+            stop_placeholder.empty()
+            if chat_bot.last_first_token_seconds is not None:
+                st.caption(f"First token after {chat_bot.last_first_token_seconds:.1f}s")
     
     # Sidebar controls
     with st.sidebar:
@@ -20,7 +20,6 @@
 
 from openai import AzureOpenAI
 import requests
-import httpx
 import openai
 import urllib3
 import http.client
@@ -31,7 +30,6 @@ import json
 import ast
 from datetime import datetime
 from pathlib import Path
-from requests_kerberos import HTTPKerberosAuth
 import argparse
 import pandas as pd
 import re
@@ -39,6 +37,23 @@ import sys
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Add the parent directory to sys.path to import the shared connectors
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+from connectors.hsd_async_fetcher import fetch_hsd_batches, DEFAULT_MAX_CONCURRENCY
+from connectors.hsd_retry import call_with_retry, HsdFatalError
+from connectors.hsd_session import get_shared_session, ARTICLE_URL
+from connectors.hsd_field_profiles import resolve_fields
+from connectors.azure_http_client import create_azure_http_client
+from connectors.llm_batch_executor import run_batches, TokenUsage, DEFAULT_LLM_CONCURRENCY
+from connectors.llm_token_budget import data_token_budget, max_batch_hsds, DEFAULT_PROMPT_TOKEN_BUDGET, DEFAULT_COMPLETION_TOKENS_PER_HSD
+from connectors.llm_prompt_payload import serialise_for_prompt, payload_report
+from connectors.llm_response_cache import cached_completion, get_default_llm_cache
+from connectors.hsd_query_pager import iter_query_pages, iter_query_records, DEFAULT_QUERY_PAGE_SIZE
+from connectors.hsd_query_sync import QuerySync
+from connectors.hsd_article import load_articles, load_batch_articles
+
 # Create logs directory function
 def ensure_logs_directory():
     """Create the FCCB_HSD_Query_Summary_Logs directory if it doesn't exist"""
@@ -102,7 +117,7 @@ client = AzureOpenAI(
     api_key = openai_key, #TODO - Need to update the API KEY and it shouldn't be hard coded it
     base_url = "https://laasapim01.laas.icloud.intel.com/azopenai",
     default_headers={"Ocp-Apim-Subscription-Key" :openai_key},
-    http_client=httpx.Client(verify=False)
+    http_client=create_azure_http_client()
     )
 
 
@@ -121,7 +136,7 @@ class HsdConnector:
         associated with the given ID. If the ID does not exist or the request fails, the method raises an exception.
         Raises:
         requests.exceptions.HTTPError: If the HTTP request encounters an error or if the response status code is not 200 OK.
-        urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached MAX retries count (10)
+        urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached the retry policy's max attempts
         requests.exceptions.ProxyError: Problem with proxy settings
         http.client.RemoteDisconnected: During the query the remote was disconnected
         https://hsdes-api.intel.com/rest/article/{id}?fields={field1}%2C%20{field1}%2C%20{field1}...
@@ -137,44 +152,34 @@ class HsdConnector:
             fields = None
         assert fields is None or (len(fields) > 0 and type(fields) != str and all([type(f) == str for f in fields])), \
             "fields must be None or a list\\iterator of strings. Got %s." % (repr(fields),)
-        retry = 10
-        while (retry > 0):
-            try:
-                req = "https://hsdes-api.intel.com/rest/article/" + str(hsd_id)
-                #req = "https://hsdes.intel.com/appstore/article-one/#/article/" + str(hsd_id)
-                if fields is not None:
-                    req += "?fields=" + "%2C%20".join(fields)
-                headers = {'Content-type': 'application/json'}
-                # print req
-                response_data = self._get_response(req, headers)
-                if "data" in response_data:
-                    #return response_data["data"][0]
-                   # Generate the timestamp and dynamic filename
-                   timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                   hsd_id_data_file = f"hsd_query_{hsd_id}_{timestamp}.json"
-                   # Get full path in hsd_summary_logs directory
-                   full_file_path = get_log_file_path(hsd_id_data_file)
-                   with open(full_file_path, 'w', encoding='utf-8') as final_file:
-                       json.dump(response_data, final_file, indent=4, ensure_ascii=False)
-                       print(f"Full JSON data has been saved to '{full_file_path}'\n")
-                       return str(full_file_path)
-                else:
-                    raise Exception('Could not find "data" in response...')
-            except urllib3.exceptions.MaxRetryError:
-                print('Got "urllib3.exceptions.MaxRetryError" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except requests.exceptions.ProxyError:
-                print('Got "requests.exceptions.ProxyError" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except http.client.RemoteDisconnected:
-                print('Got "http.client.RemoteDisconnected" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except Exception as e:
-                print(
-                    'Got unknown exception: {}, retrying {} more attempts'.format(traceback.format_exc(), (retry - 1)))
-                retry -= 1
+        req = ARTICLE_URL + str(hsd_id)
+        if fields is not None:
+            req += "?fields=" + "%2C%20".join(fields)
+        headers = {'Content-type': 'application/json'}
+
+        def fetch():
+            response_data = self._get_response(req, headers)
+            if "data" in response_data:
+                return response_data
+            raise HsdFatalError('Could not find "data" in response...')
+
+        try:
+            response_data = call_with_retry(fetch, description=f"HSD {hsd_id} fetch")
+        except Exception as e:
+            print(f'Failed to fetch HSD {hsd_id}: {e}')
+            return None
+
+        # Generate the timestamp and dynamic filename
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        hsd_id_data_file = f"hsd_query_{hsd_id}_{timestamp}.json"
+        # Get full path in hsd_summary_logs directory
+        full_file_path = get_log_file_path(hsd_id_data_file)
+        with open(full_file_path, 'w', encoding='utf-8') as final_file:
+            json.dump(response_data, final_file, indent=4, ensure_ascii=False)
+            print(f"Full JSON data has been saved to '{full_file_path}'\n")
+        return str(full_file_path)
    
-    def get_multiple_hsd_data_in_file(self, hsd_ids, fields=None):
+    def get_multiple_hsd_data_in_file(self, hsd_ids, fields="fccb"):
         """
         Fetches detailed information for multiple HSD IDs and saves all data to a single JSON file.
         The method sends GET requests to the HSD API for each HSD ID and accumulates all data.
@@ -182,19 +187,20 @@ class HsdConnector:
         Note: The HSD API requires Kerberos authentication. Meaning it can only be executed locally and not over cloud.
         Parameters:
         hsd_ids (list): List of HSD IDs to fetch information for.
-        fields (List<str>): fields to include in the response, list of strings (optional). If not defined, returns all fields.
+        fields (List<str> | str): fields to include in the response, list of strings or a field profile name from
+        connectors.hsd_field_profiles (default: "fccb").
         Returns:
         str: File name of the JSON data file containing accumulated data from all HSD IDs
         
         Raises:
         requests.exceptions.HTTPError: If the HTTP request encounters an error or if the response status code is not 200 OK.
-        urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached MAX retries count (10)
+        urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached the retry policy's max attempts
         requests.exceptions.ProxyError: Problem with proxy settings
         http.client.RemoteDisconnected: During the query the remote was disconnected
         """
         # Only collect the specified fields
         #fields = ["id","title", "description", "subject", "owner", "status", "comments", "tenant", "failing_info", "component","env_found"]
-        fields = ["id","title", "description", "status", "comments","forum_notes"]
+        fields = resolve_fields(fields)
         if fields == "":  # Backwards compatibility
             fields = None
         assert fields is None or (len(fields) > 0 and type(fields) != str and all([type(f) == str for f in fields])), \
@@ -218,46 +224,34 @@ class HsdConnector:
         
         for i, hsd_id in enumerate(hsd_ids, 1):
             print(f"Processing HSD {i}/{len(hsd_ids)}: {hsd_id}")
-            retry = 10
-            success = False
-            while retry > 0 and not success:
-                try:
-                    req = "https://hsdes-api.intel.com/rest/article/" + str(hsd_id)
-                    if fields is not None:
-                        req += "?fields=" + "%2C%20".join(fields)
-                    headers = {'Content-type': 'application/json'}
-                    
-                    response_data = self._get_response(req, headers)
-                    
-                    if "data" in response_data:
-                        # Handle both single data item and list of data items
-                        if isinstance(response_data["data"], list):
-                            accumulated_data["data"].extend(response_data["data"])
-                        else:
-                            accumulated_data["data"].append(response_data["data"])
-                        successful_count += 1
-                        success = True
-                    else:
-                        print(f"  ✗ No data found for HSD ID: {hsd_id}")
-                        failed_count += 1
-                        success = True  # Don't retry for no data
-                        
-                except urllib3.exceptions.MaxRetryError:
-                    print(f'  ⚠ Got "urllib3.exceptions.MaxRetryError" for HSD {hsd_id}, retrying {retry - 1} more attempts')
-                    retry -= 1
-                except requests.exceptions.ProxyError:
-                    print(f'  ⚠ Got "requests.exceptions.ProxyError" for HSD {hsd_id}, retrying {retry - 1} more attempts')
-                    retry -= 1
-                except http.client.RemoteDisconnected:
-                    print(f'  ⚠ Got "http.client.RemoteDisconnected" for HSD {hsd_id}, retrying {retry - 1} more attempts')
-                    retry -= 1
-                except Exception as e:
-                    print(f'  ✗ Got unknown exception for HSD {hsd_id}: {traceback.format_exc()}, retrying {retry - 1} more attempts')
-                    retry -= 1
-            
-            if not success:
-                print(f"  ✗ Failed to fetch data for HSD ID: {hsd_id} after all retries")
+            req = ARTICLE_URL + str(hsd_id)
+            if fields is not None:
+                req += "?fields=" + "%2C%20".join(fields)
+            headers = {'Content-type': 'application/json'}
+
+            def fetch():
+                response_data = self._get_response(req, headers)
+                if "data" not in response_data:
+                    raise HsdFatalError(f"No data found for HSD ID: {hsd_id}")
+                return response_data["data"]
+
+            try:
+                data = call_with_retry(fetch, description=f"HSD {hsd_id} fetch")
+            except HsdFatalError as e:
+                print(f"  ✗ {e}")
                 failed_count += 1
+                continue
+            except Exception as e:
+                print(f"  ✗ Failed to fetch data for HSD ID: {hsd_id} after all retries ({e})")
+                failed_count += 1
+                continue
+
+            # Handle both single data item and list of data items
+            if isinstance(data, list):
+                accumulated_data["data"].extend(data)
+            else:
+                accumulated_data["data"].append(data)
+            successful_count += 1
         
         # Save the accumulated data to file
         with open(full_file_path, 'w', encoding='utf-8') as final_file:
@@ -272,95 +266,29 @@ class HsdConnector:
         
         return str(full_file_path)
     
-    def get_multiple_hsd_data_in_batch(self, hsd_ids, batch_size=8, fields=None):
+    def get_multiple_hsd_data_in_batch(self, hsd_ids, batch_size=8, fields="fccb", max_concurrency=DEFAULT_MAX_CONCURRENCY, token_budget=None):
         """
         Fetches detailed information for multiple HSD IDs in batches and saves each batch to separate JSON files.
         This helps avoid token limits when processing large numbers of HSDs.
+        The HSDs are fetched concurrently by the shared fetch engine (connectors.hsd_async_fetcher).
         
         Parameters:
         hsd_ids (list): List of HSD IDs to fetch information for.
         batch_size (int): Number of HSDs to process in each batch (default: 10)
-        fields (List<str>): fields to include in the response, list of strings (optional).
+        fields (List<str> | str): fields to include in the response, list of strings or a field profile name from
+        connectors.hsd_field_profiles (default: "fccb").
+        max_concurrency (int): Maximum number of concurrent article requests.
+        token_budget (int): Pack the HSDs into batches of at most this many tokens of HSD data, with at most
+        batch_size HSDs each, instead of fixed batches of batch_size (optional, see connectors.llm_token_budget).
         
         Returns:
         list: List of JSON file paths containing batch data
         """
-        fields = ["id","title", "description", "status", "comments","forum_notes"]
-        
-        if not hsd_ids or not isinstance(hsd_ids, list):
-            raise ValueError("hsd_ids must be a non-empty list")
-        
-        # Split HSDs into batches
-        batches = [hsd_ids[i:i + batch_size] for i in range(0, len(hsd_ids), batch_size)]
-        batch_files = []
-        
-        print(f"📊 Processing {len(hsd_ids)} HSDs in {len(batches)} batches of {batch_size} HSDs each...")
-        
-        for batch_num, batch_hsd_ids in enumerate(batches, 1):
-            print(f"\n🔄 Processing Batch {batch_num}/{len(batches)} ({len(batch_hsd_ids)} HSDs)...")
-            
-            # Generate timestamp and dynamic filename for this batch
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            batch_file = f"hsd_batch_{batch_num}_of_{len(batches)}_{len(batch_hsd_ids)}hsds_{timestamp}.json"
-            # Get full path in hsd_summary_logs directory
-            full_batch_path = get_log_file_path(batch_file)
-            
-            # Initialize batch data structure
-            batch_data = {"data": []}
-            successful_count = 0
-            failed_count = 0
-            
-            for i, hsd_id in enumerate(batch_hsd_ids, 1):
-                print(f"  Processing HSD {i}/{len(batch_hsd_ids)} in batch {batch_num}: {hsd_id}")
-                retry = 10
-                success = False
-                
-                while retry > 0 and not success:
-                    try:
-                        req = "https://hsdes-api.intel.com/rest/article/" + str(hsd_id)
-                        if fields is not None:
-                            req += "?fields=" + "%2C%20".join(fields)
-                        headers = {'Content-type': 'application/json'}
-                        
-                        response_data = self._get_response(req, headers)
-                        
-                        if "data" in response_data:
-                            if isinstance(response_data["data"], list):
-                                batch_data["data"].extend(response_data["data"])
-                            else:
-                                batch_data["data"].append(response_data["data"])
-                            successful_count += 1
-                            success = True
-                        else:
-                            print(f"    ✗ No data found for HSD ID: {hsd_id}")
-                            failed_count += 1
-                            success = True
-                            
-                    except Exception as e:
-                        print(f'    ⚠ Error for HSD {hsd_id}: {str(e)}, retrying {retry - 1} more attempts')
-                        retry -= 1
-                
-                if not success:
-                    print(f"    ✗ Failed to fetch data for HSD ID: {hsd_id} after all retries")
-                    failed_count += 1
-            
-            # Save batch data to file
-            with open(full_batch_path, 'w', encoding='utf-8') as f:
-                json.dump(batch_data, f, indent=4, ensure_ascii=False)
-            
-            batch_files.append(str(full_batch_path))
-            
-            print(f"  ✅ Batch {batch_num} complete:")
-            print(f"    • Successful: {successful_count}")
-            print(f"    • Failed: {failed_count}")
-            print(f"    • HSDs with content: {len(batch_data['data'])}")
-            print(f"    • Saved to: '{full_batch_path}'")
-        
-        print(f"\n📊 All Batches Complete:")
-        print(f"  • Total batches: {len(batches)}")
-        print(f"  • Batch files created: {len(batch_files)}")
+        fields = resolve_fields(fields)
         
-        return batch_files
+        return fetch_hsd_batches(hsd_ids, batch_size=batch_size, fields=fields,
+                                 get_batch_file_path=get_log_file_path, max_concurrency=max_concurrency,
+                                 token_budget=token_budget)
 
     def _get_response(self, req, headers):
         """
@@ -377,8 +305,8 @@ class HsdConnector:
         HTTPError: If the GET request is not successful (i.e., if the response status code is not 200).
         Exception: If there is an error when trying to parse the response data as JSON.
     """
-        # Send a GET request to the specified URL (req) with the provided headers
-        response = requests.get(req, auth=HTTPKerberosAuth(), verify=False, headers=headers)
+        # Send a GET request over the shared pooled HSD session (see connectors.hsd_session)
+        response = get_shared_session().get(req, headers=headers)
         # If the response is successful (status code 200)
         if response.ok:
             try:
@@ -393,54 +321,30 @@ class HsdConnector:
             # If the response is not successful, raise an HTTPError for the given status code
             response.raise_for_status()
 
-    def fetch_hsd_ids_from_query(self, query_id):
+    def fetch_hsd_ids_from_query(self, query_id, page_size=DEFAULT_QUERY_PAGE_SIZE):
         """
-        Fetch all HSD IDs from a given query ID using the HSD API
+        Fetch all HSD IDs from a given query ID using the HSD API. Only the 'id' field is requested and the result
+        is read page by page (see connectors.hsd_query_pager).
         
         Parameters:
         query_id (str): The query ID to fetch HSD IDs from
+        page_size (int): Rows per request
         
         Returns:
-        dict: A dictionary containing:
-            - hsd_ids: List of HSD IDs found in the query
-            - total_count: Total number of HSDs in the query
+        list: HSD IDs found in the query, None if the query is empty, or a dictionary containing:
+            - error: Error message
             - query_id: The original query ID
-            - error: Error message if any
         """
         try:
-            # Construct the URL dynamically
-            base_url = "https://hsdes-api.intel.com/rest/query/execution/"
-            req = f"{base_url}{query_id}"
-            headers = {'Content-type': 'application/json'}
-            
-            # Get initial response to determine total count
-            response_data = self._get_response(req, headers)
-            
-            # Extract the total number of HSDs
-            total_hsds = response_data.get("total", 0)
-            if total_hsds > 0:
-                print(f"Total HSD entries found: {total_hsds}")
-
-                # Construct the updated URL with max_results parameter to get all entries
-                # Option 1: Use max_results to get all HSDs (default returns all fields)
-                # full_query_url = f"{req}?max_results={total_hsds}"
-
-                # Option 2: Use fields parameter to get only the 'id' field for each HSD
-                # This is more efficient if you only want HSD IDs and no other data.
-                full_query_url = f"{req}?max_results={total_hsds}&fields=id"
+            hsd_ids = []
+            for page in iter_query_pages(self._get_response, query_id, page_size=page_size, fields=["id"]):
+                if page.start_at == 1 and page.total > 0:
+                    print(f"Total HSD entries found: {page.total}")
+                hsd_ids.extend(item.get("id") for item in page.records if item.get("id"))
 
-                # Option 3: Use fields to get a minimal set (id, title, status, etc.)
-                # full_query_url = f"{req}?max_results={total_hsds}&fields=id,title,status"
-                
-                # Fetch full data
-                full_response_data = self._get_response(full_query_url, headers)
-
-                # Extract HSD IDs from the response
-                if "data" in full_response_data and isinstance(full_response_data["data"], list):
-                    hsd_ids = [item.get("id") for item in full_response_data["data"] if item.get("id")]
-                    print(f"Extracted {len(hsd_ids)} HSD IDs from query {query_id}")
-                    # Save full response to the final output file
-                    return hsd_ids
+            if hsd_ids:
+                print(f"Extracted {len(hsd_ids)} HSD IDs from query {query_id}")
+                return hsd_ids
                 
         except Exception as e:
             error_msg = f"An error occurred while fetching HSD IDs from query {query_id}: {e}"
@@ -450,12 +354,36 @@ class HsdConnector:
                 "query_id": query_id
             }
 
+    def fetch_query_members(self, query_id, page_size=DEFAULT_QUERY_PAGE_SIZE):
+        """
+        Fetch the current members of a query together with their updated_date, used for incremental sync
+        (see connectors.hsd_query_sync).
+
+        Parameters:
+        query_id (str): The query ID
+        page_size (int): Rows per request
+
+        Returns:
+        dict: HSD ID -> updated_date for every HSD in the query (empty if the query has no entries)
+        """
+        records = iter_query_records(self._get_response, query_id, page_size=page_size, fields=["id", "updated_date"])
+        return {str(item["id"]): item.get("updated_date") for item in records if item.get("id")}
+
 class OpenAIConnector:
     # Initialize the OpenAI connector class
-    def __init__(self, deployment_name=None):
+    def __init__(self, deployment_name=None, use_cache=True, bypass_cache=False):
+        '''
+        use_cache (bool): Answer identical requests from the LLM response cache (see connectors.llm_response_cache).
+        bypass_cache (bool): Always call OpenAI; the fresh responses still refresh the cache.
+        '''
         if deployment_name is None:
             deployment_name = DEFAULT_DEPLOYMENT_NAME
         self.deployment_name = deployment_name
+        # Batches may run concurrently (see connectors.llm_batch_executor), so the totals use a thread-safe counter
+        self.usage = TokenUsage()
+        # Identical requests (same deployment, prompts and HSD data) are answered from the response cache
+        self.llm_cache = get_default_llm_cache() if use_cache else None
+        self.bypass_cache = bypass_cache
 
     # Run the prompt on the OpenAI model
     def run_prompt(self, prompt):
@@ -464,16 +392,11 @@ class OpenAIConnector:
             https://platform.openai.com/docs/guides/text-generation/chat-completions-api
             https://platform.openai.com/docs/api-reference/chat/create
         '''
-        # Display tokens consumed before running the prompt
-        print("Tokens consumed before run_prompt: 0")  # Initially, no tokens are consumed
-
         # Record the start time
         start_time = time.time()
 
-        completion = client.chat.completions.create(
-            model=self.deployment_name,
-            messages=prompt
-        )
+        completion, cached = cached_completion(client, self.llm_cache, self.bypass_cache,
+                                               model=self.deployment_name, messages=prompt)
 
         # Record the end time
         end_time = time.time()
@@ -485,11 +408,11 @@ class OpenAIConnector:
         prompt_tokens = completion.usage.prompt_tokens
         completion_tokens = completion.usage.completion_tokens
         total_tokens = completion.usage.total_tokens
+        self.usage.record_cached(completion, cached)
 
-        print(f"Prompt tokens: {prompt_tokens}")
-        print(f"Completion tokens: {completion_tokens}")
-        print(f"Total tokens consumed: {total_tokens}")
-        print(f"Time taken for query execution: {time_taken:.2f} seconds")
+        # One print per completion, so lines of concurrent batches do not interleave
+        print(f"{'♻️  Cached response, no tokens consumed | ' if cached else ''}Prompt tokens: {prompt_tokens} | Completion tokens: {completion_tokens} | "
+              f"Total tokens consumed: {total_tokens} | Time taken for query execution: {time_taken:.2f} seconds")
 
         gpt_response = completion.choices[0].message.content
         return {
@@ -499,13 +422,19 @@ class OpenAIConnector:
     def run_prompt_with_json(self, hsd_query_data_file, system_prompt, user_action_prompt):
         try:
             with open(hsd_query_data_file, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-                json_data_str = json.dumps(json_data, indent=4)
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_action_prompt + "/n" + json_data_str},
-                ]
-                return self.run_prompt(messages)
+                raw_data = json.load(f)
+            # The model only needs the text of the HTML fields, without markup, whitespace runs or empty fields
+            json_data_str = serialise_for_prompt(raw_data)
+            # Tokens of the HSD data as it used to be sent (indented JSON with HTML) against the compact payload
+            before, after, message = payload_report(raw_data, json_data_str,
+                                                    label=f"HSD data of {Path(hsd_query_data_file).name}")
+            self.usage.record_payload(before, after)
+            print(message)
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_action_prompt + "/n" + json_data_str},
+            ]
+            return self.run_prompt(messages)
         except FileNotFoundError:
             print(f"Error: File not found at '{hsd_query_data_file}'. Please check the file path.")
         except json.JSONDecodeError:
@@ -951,78 +880,103 @@ def convert_hsd_data_to_excel(hsd_json_file, output_excel_file):
     str: Path to the created Excel file
     """
     try:
+        articles = load_articles(hsd_json_file)
+        if articles is not None:
+            return convert_articles_to_excel(articles, output_excel_file)
+        
         # Ensure output file is in the logs directory
         if not str(output_excel_file).startswith(str(Path("hsd_summary_logs"))):
             output_excel_file = get_log_file_path(Path(output_excel_file).name)
         
+        # Handle case where JSON structure is different
         with open(hsd_json_file, 'r', encoding='utf-8') as f:
             json_data = json.load(f)
+        with pd.ExcelWriter(output_excel_file, engine='openpyxl') as writer:
+            df = pd.json_normalize(json_data)
+            df.to_excel(writer, sheet_name='Raw_Data', index=False)
+            print(f"✅ Excel file created with raw data: {output_excel_file}")
+        
+        return str(output_excel_file)
+        
+    except Exception as e:
+        print(f"❌ Error converting to Excel: {e}")
+        return None
+
+
+def convert_articles_to_excel(articles, output_excel_file):
+    """
+    Write HSD articles to Excel format with multiple sheets for better organization.
+    
+    Parameters:
+    articles (list): HsdArticle objects (see connectors/hsd_article.py), e.g. from load_batch_articles()
+    output_excel_file (str): Path for the output Excel file
+    
+    Returns:
+    str: Path to the created Excel file
+    """
+    try:
+        # Ensure output file is in the logs directory
+        if not str(output_excel_file).startswith(str(Path("hsd_summary_logs"))):
+            output_excel_file = get_log_file_path(Path(output_excel_file).name)
         
         # Create Excel writer object
         with pd.ExcelWriter(output_excel_file, engine='openpyxl') as writer:
-            
-            if "data" in json_data and isinstance(json_data["data"], list):
-                # Create main HSD data sheet
-                hsd_df = pd.json_normalize(json_data["data"])
-                
-                # Ensure proper column ordering if specific columns exist
-                preferred_columns = ['id', 'title', 'description', 'status', 'comments', 'forum_notes']
-                existing_columns = [col for col in preferred_columns if col in hsd_df.columns]
-                other_columns = [col for col in hsd_df.columns if col not in preferred_columns]
-                column_order = existing_columns + other_columns
-                
-                if column_order:
-                    hsd_df = hsd_df[column_order]
-                
-                hsd_df.to_excel(writer, sheet_name='HSD_Data', index=False)
-                
-                # Create summary sheet with key statistics
-                summary_data = {
-                    'Metric': ['Total HSDs', 'Unique Statuses', 'HSDs with Comments', 'HSDs with Descriptions'],
-                    'Count': [
-                        len(json_data["data"]),
-                        len(hsd_df['status'].unique()) if 'status' in hsd_df.columns else 0,
-                        len(hsd_df[hsd_df['comments'].notna()]) if 'comments' in hsd_df.columns else 0,
-                        len(hsd_df[hsd_df['description'].notna()]) if 'description' in hsd_df.columns else 0
-                    ]
-                }
-                summary_df = pd.DataFrame(summary_data)
-                summary_df.to_excel(writer, sheet_name='Summary', index=False)
-                
-                # If status field exists, create status breakdown sheet
-                if 'status' in hsd_df.columns:
-                    status_counts = hsd_df['status'].value_counts().reset_index()
-                    status_counts.columns = ['Status', 'Count']
-                    status_counts.to_excel(writer, sheet_name='Status_Breakdown', index=False)
-                
-                # Create a simplified view with just ID, Title, and Status (if available)
-                simple_columns = []
-                if 'id' in hsd_df.columns:
-                    simple_columns.append('id')
-                if 'title' in hsd_df.columns:
-                    simple_columns.append('title')
-                if 'status' in hsd_df.columns:
-                    simple_columns.append('status')
-                
-                if simple_columns:
-                    simple_df = hsd_df[simple_columns].copy()
-                    # Rename columns for better readability
-                    column_rename = {'id': 'HSD ID', 'title': 'Title', 'status': 'Status'}
-                    simple_df = simple_df.rename(columns=column_rename)
-                    simple_df.to_excel(writer, sheet_name='HSD_Simple_View', index=False)
-                
-                print(f"✅ Excel file created successfully: {output_excel_file}")
-                print(f"   • Main data sheet: {len(json_data['data'])} HSD records")
-                print(f"   • Summary sheet: Key metrics and statistics")
-                if 'status' in hsd_df.columns:
-                    print(f"   • Status breakdown sheet: {len(status_counts)} different statuses")
-                if simple_columns:
-                    print(f"   • Simple view sheet: {len(simple_columns)} key columns")
-            else:
-                # Handle case where JSON structure is different
-                df = pd.json_normalize(json_data)
-                df.to_excel(writer, sheet_name='Raw_Data', index=False)
-                print(f"✅ Excel file created with raw data: {output_excel_file}")
+            # Create main HSD data sheet
+            hsd_df = pd.json_normalize([article.to_record() for article in articles])
+            
+            # Ensure proper column ordering if specific columns exist
+            preferred_columns = ['id', 'title', 'description', 'status', 'comments', 'forum_notes']
+            existing_columns = [col for col in preferred_columns if col in hsd_df.columns]
+            other_columns = [col for col in hsd_df.columns if col not in preferred_columns]
+            column_order = existing_columns + other_columns
+
+            if column_order:
+                hsd_df = hsd_df[column_order]
+
+            hsd_df.to_excel(writer, sheet_name='HSD_Data', index=False)
+
+            # Create summary sheet with key statistics
+            summary_data = {
+                'Metric': ['Total HSDs', 'Unique Statuses', 'HSDs with Comments', 'HSDs with Descriptions'],
+                'Count': [
+                    len(articles),
+                    len(hsd_df['status'].unique()) if 'status' in hsd_df.columns else 0,
+                    len(hsd_df[hsd_df['comments'].notna()]) if 'comments' in hsd_df.columns else 0,
+                    len(hsd_df[hsd_df['description'].notna()]) if 'description' in hsd_df.columns else 0
+                ]
+            }
+            summary_df = pd.DataFrame(summary_data)
+            summary_df.to_excel(writer, sheet_name='Summary', index=False)
+
+            # If status field exists, create status breakdown sheet
+            if 'status' in hsd_df.columns:
+                status_counts = hsd_df['status'].value_counts().reset_index()
+                status_counts.columns = ['Status', 'Count']
+                status_counts.to_excel(writer, sheet_name='Status_Breakdown', index=False)
+
+            # Create a simplified view with just ID, Title, and Status (if available)
+            simple_columns = []
+            if 'id' in hsd_df.columns:
+                simple_columns.append('id')
+            if 'title' in hsd_df.columns:
+                simple_columns.append('title')
+            if 'status' in hsd_df.columns:
+                simple_columns.append('status')
+
+            if simple_columns:
+                simple_df = hsd_df[simple_columns].copy()
+                # Rename columns for better readability
+                column_rename = {'id': 'HSD ID', 'title': 'Title', 'status': 'Status'}
+                simple_df = simple_df.rename(columns=column_rename)
+                simple_df.to_excel(writer, sheet_name='HSD_Simple_View', index=False)
+
+            print(f"✅ Excel file created successfully: {output_excel_file}")
+            print(f"   • Main data sheet: {len(articles)} HSD records")
+            print(f"   • Summary sheet: Key metrics and statistics")
+            if 'status' in hsd_df.columns:
+                print(f"   • Status breakdown sheet: {len(status_counts)} different statuses")
+            if simple_columns:
+                print(f"   • Simple view sheet: {len(simple_columns)} key columns")
         
         return str(output_excel_file)
         
@@ -1464,6 +1418,11 @@ if __name__ == "__main__":
     parser.add_argument("--report_formatting", help="Path to the text file containing report formatting prompt instructions.")
     parser.add_argument("--hsd_excel", action="store_true", help="Generate Excel (.xlsx) files in addition to standard output files.")
     parser.add_argument("--ai_excel", action="store_true", help="Generate Excel (.xlsx) files of AI response in addition to standard output files.")
+    parser.add_argument("--llm_concurrency", type=int, default=DEFAULT_LLM_CONCURRENCY, help="Maximum number of batches analysed by OpenAI at the same time (1 runs them one after another).")
+    parser.add_argument("--token_budget", type=int, default=DEFAULT_PROMPT_TOKEN_BUDGET, help="Prompt tokens per OpenAI batch (prompts plus HSD data); HSDs are packed into as few batches as fit. 0 uses fixed batches of 3 HSDs.")
+    parser.add_argument("--completion_tokens_per_hsd", type=int, default=DEFAULT_COMPLETION_TOKENS_PER_HSD, help="Expected response tokens per HSD; limits how many HSDs share a batch so the response fits.")
+    parser.add_argument("--incremental", action="store_true", help="Only fetch and analyse HSDs added or modified since the previous --incremental run of the same query; reuse the previous results for the rest.")
+    parser.add_argument("--refresh_llm_cache", action="store_true", help="Send every batch to OpenAI even if the identical request was answered before (the LLM response cache is refreshed with the new responses).")
 
     args = parser.parse_args()
 
@@ -1570,49 +1529,85 @@ if __name__ == "__main__":
             Do not include any // comments or /* */ comments in the JSON.
             Ensure all JSON syntax is correct with proper commas and brackets."""
     hsd_connector = HsdConnector()
-    openai_connector = OpenAIConnector()
+    openai_connector = OpenAIConnector(bypass_cache=args.refresh_llm_cache)
     
     if args.query_id:
-        # Fetch all HSD IDs from the query
-        hsd_ids = hsd_connector.fetch_hsd_ids_from_query(args.query_id)
-        print(f"hsd_ids: {len(hsd_ids)} HSDs found")
+        query_sync = None
+        if args.incremental:
+            # Only the delta since the previous run goes through fetch, LLM and export
+            query_sync = QuerySync(args.query_id)
+            try:
+                members = hsd_connector.fetch_query_members(args.query_id)
+            except Exception as e:
+                print(f"An error occurred while fetching HSD IDs from query {args.query_id}: {e}")
+                print("Failed to fetch HSD IDs.")
+                sys.exit(1)
+            delta = query_sync.diff(members)
+            print(f"🔄 Incremental sync of query {args.query_id} (previous run: {query_sync.last_synced or 'none'}): {delta.summary()}")
+            all_hsd_ids = list(members)
+            hsd_ids = delta.changed
+        else:
+            # Fetch all HSD IDs from the query
+            hsd_ids = hsd_connector.fetch_hsd_ids_from_query(args.query_id)
+            all_hsd_ids = hsd_ids
+        print(f"hsd_ids: {len(all_hsd_ids)} HSDs found")
         
-        if not hsd_ids:
+        if not all_hsd_ids:
             print("Failed to fetch HSD IDs.")
             sys.exit(1)
         else:
-            # Process HSDs in batches to avoid token limits
-            batch_files = hsd_connector.get_multiple_hsd_data_in_batch(hsd_ids, batch_size=3)
+            # Process HSDs in batches to avoid token limits: packed by prompt tokens (see connectors.llm_token_budget),
+            # or fixed batches of 3 HSDs with --token_budget 0
+            if args.token_budget:
+                token_budget = data_token_budget(system_prompt, user_action_prompt, budget=args.token_budget)
+                batch_size = max_batch_hsds(args.completion_tokens_per_hsd)
+            else:
+                token_budget, batch_size = None, 3
+            batch_files = hsd_connector.get_multiple_hsd_data_in_batch(hsd_ids, batch_size=batch_size, token_budget=token_budget) if hsd_ids else []
             
             # Process each batch file with OpenAI
             all_responses = []
             
-            for batch_num, batch_file in enumerate(batch_files, 1):
-                print(f"\n🤖 Processing Batch {batch_num}/{len(batch_files)} with OpenAI...")
+            def analyse_batch(batch_file):
+                # Runs on a worker thread: only the completion and the batch's own output file
+                res = openai_connector.run_prompt_with_json(batch_file, system_prompt, user_action_prompt)
+                if not res:
+                    raise RuntimeError("No response from OpenAI")
                 
-                try:
-                    res = openai_connector.run_prompt_with_json(batch_file, system_prompt, user_action_prompt)
-                    
-                    # Create output filename for this batch
-                    base_filename = Path(batch_file).stem
-                    timestamp = base_filename.split('_')[-1]
-                    new_base_filename = '_'.join(base_filename.split('_')[:-1]) + '_gpt_output_' + timestamp
-                    
-                    # Determine file extension
-                    response_format = args.output_ext
-                    extension = ".txt" if response_format == "text" else ".html" if response_format == "html" else ".json"
-                    batch_output_filename = get_log_file_path(new_base_filename + extension)
-                    
-                    # Save batch response
-                    with open(batch_output_filename, "w", encoding='utf-8') as file:
-                        file.write(res['response'])
-                    
+                # Create output filename for this batch
+                base_filename = Path(batch_file).stem
+                timestamp = base_filename.split('_')[-1]
+                new_base_filename = '_'.join(base_filename.split('_')[:-1]) + '_gpt_output_' + timestamp
+                
+                # Determine file extension
+                response_format = args.output_ext
+                extension = ".txt" if response_format == "text" else ".html" if response_format == "html" else ".json"
+                batch_output_filename = get_log_file_path(new_base_filename + extension)
+                
+                # Save batch response
+                with open(batch_output_filename, "w", encoding='utf-8') as file:
+                    file.write(res['response'])
+                return str(batch_output_filename), res['response']
+            
+            print(f"\n🤖 Processing {len(batch_files)} batches with OpenAI, up to {args.llm_concurrency} at a time...")
+            outcomes = run_batches(batch_files, analyse_batch, max_in_flight=args.llm_concurrency,
+                                   on_done=lambda outcome, done, total: print(
+                                       f"  {'✅' if outcome.ok else '❌'} Batch {outcome.index + 1} finished ({done}/{total}) "
+                                       f"in {outcome.seconds:.1f}s"))
+            
+            # Results are handled in batch order, whatever order the batches finished in
+            for batch_num, outcome in enumerate(outcomes, 1):
+                batch_file = outcome.item
+                if outcome.ok:
+                    batch_output_filename, response = outcome.result
                     all_responses.append({
                         'batch_num': batch_num,
                         'batch_file': batch_file,
-                        'output_file': str(batch_output_filename),
-                        'response': res['response']
+                        'output_file': batch_output_filename,
+                        'response': response
                     })
+                    if query_sync is not None:
+                        query_sync.record_batch(batch_file, response)
                     
                     print(f"  ✅ Batch {batch_num} response saved to: {batch_output_filename}")
                     
@@ -1622,14 +1617,45 @@ if __name__ == "__main__":
                         hsd_excel_filename = get_log_file_path(f"{Path(batch_file).stem}.xlsx")
                         convert_hsd_data_to_excel(batch_file, str(hsd_excel_filename))
                 
-                except Exception as e:
-                    print(f"  ❌ Error processing batch {batch_num}: {e}")
+                else:
+                    print(f"  ❌ Error processing batch {batch_num}: {outcome.error}")
                     all_responses.append({
                         'batch_num': batch_num,
                         'batch_file': batch_file,
-                        'error': str(e)
+                        'error': outcome.error
                     })
-            
+            usage = openai_connector.usage.stats()
+            print(f"🔢 Tokens used: {usage['prompt_tokens']} prompt + {usage['completion_tokens']} completion "
+                  f"= {usage['total_tokens']} over {usage['requests']} requests")
+            if usage['payload_tokens_before']:
+                print(f"🧮 HSD data: {usage['payload_tokens_before']} -> {usage['payload_tokens_after']} tokens "
+                      f"after compaction")
+            if usage['cache_hits']:
+                print(f"♻️  {usage['cache_hits']} batch(es) answered from the LLM response cache, "
+                      f"{usage['saved_tokens']} tokens saved")
+            
+            if query_sync is not None:
+                # Merge the unchanged HSDs back from the previous run so the exports still cover the whole query
+                timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+                if delta.unchanged:
+                    previous_batch_file = get_log_file_path(f"hsd_previous_run_{len(delta.unchanged)}hsds_{timestamp}.json")
+                    with open(previous_batch_file, 'w', encoding='utf-8') as f:
+                        json.dump({"data": query_sync.unchanged_articles(delta.unchanged)}, f, indent=4, ensure_ascii=False)
+                    previous_output_file = get_log_file_path(f"hsd_previous_run_gpt_output_{timestamp}.json")
+                    previous_response = json.dumps(query_sync.unchanged_results(delta.unchanged), indent=4, ensure_ascii=False)
+                    with open(previous_output_file, 'w', encoding='utf-8') as f:
+                        f.write(previous_response)
+                    batch_files.append(str(previous_batch_file))
+                    all_responses.append({
+                        'batch_num': 'previous run',
+                        'batch_file': str(previous_batch_file),
+                        'output_file': str(previous_output_file),
+                        'response': previous_response
+                    })
+                    print(f"  ♻️  Reused previous results for {len(delta.unchanged)} unchanged HSDs")
+                query_sync.forget(delta.removed)
+                query_sync.save()
+
             # Create a combined summary report
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
             summary_filename = get_log_file_path(f"batch_processing_summary_{args.query_id}_{timestamp}.txt")
@@ -1638,7 +1664,9 @@ if __name__ == "__main__":
                 summary_file.write(f"BATCH PROCESSING SUMMARY\n")
                 summary_file.write(f"========================\n\n")
                 summary_file.write(f"Query ID: {args.query_id}\n")
-                summary_file.write(f"Total HSDs: {len(hsd_ids)}\n")
+                summary_file.write(f"Total HSDs: {len(all_hsd_ids)}\n")
+                if query_sync is not None:
+                    summary_file.write(f"Incremental sync: {delta.summary()}\n")
                 summary_file.write(f"Total Batches: {len(batch_files)}\n")
                 summary_file.write(f"Batch Size: 10 HSDs per batch\n")
                 summary_file.write(f"Processing Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
@@ -1673,24 +1701,9 @@ if __name__ == "__main__":
                 consolidated_hsd_excel = get_log_file_path(f"consolidated_hsd_data_{args.query_id}_{timestamp}.xlsx")
                 
                 try:
-                    # Combine all HSD data from successful batches
-                    all_hsd_data = {"data": []}
-                    for batch_file in batch_files:
-                        try:
-                            with open(batch_file, 'r', encoding='utf-8') as f:
-                                batch_data = json.load(f)
-                                if "data" in batch_data and isinstance(batch_data["data"], list):
-                                    all_hsd_data["data"].extend(batch_data["data"])
-                        except Exception as e:
-                            print(f"  ⚠️  Warning: Could not read batch file {batch_file}: {e}")
-                    
-                    # Save consolidated HSD data to temporary JSON and convert to Excel
-                    temp_hsd_json = get_log_file_path(f"temp_consolidated_hsd_{timestamp}.json")
-                    with open(temp_hsd_json, 'w', encoding='utf-8') as f:
-                        json.dump(all_hsd_data, f, indent=4, ensure_ascii=False)
-                    
-                    convert_hsd_data_to_excel(temp_hsd_json, consolidated_hsd_excel)
-                    os.remove(temp_hsd_json)  # Clean up temporary file
+                    # Combine all HSD data from successful batches, held in compact form (see connectors/hsd_article.py)
+                    articles = load_batch_articles(batch_files)
+                    convert_articles_to_excel(articles, consolidated_hsd_excel)
                     print(f"  ✅ Consolidated HSD Excel: {consolidated_hsd_excel}")
                     
                 except Exception as e:
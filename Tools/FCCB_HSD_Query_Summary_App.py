@@ -6,6 +6,7 @@ import sys
 from datetime import datetime
 from pathlib import Path
 import time
+import uuid
 
 # Add the parent directory to the path to import the original classes
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -16,15 +17,23 @@ try:
         HsdConnector, 
         OpenAIConnector, 
         convert_hsd_data_to_excel, 
+        convert_articles_to_excel,
+        load_batch_articles,
         convert_ai_response_to_excel, 
         parse_hsd_summary_format,
         parse_fccb_json_to_excel,
         get_log_file_path
     )
+    from connectors.hsd_prefetch import start_query_prefetch, cancel_query_prefetch
+    from connectors.llm_batch_executor import run_batches, DEFAULT_LLM_CONCURRENCY
+    from connectors.llm_token_budget import data_token_budget, max_batch_hsds, DEFAULT_PROMPT_TOKEN_BUDGET
 except ImportError as e:
     st.error(f"Failed to import required modules: {e}")
     st.stop()
 
+# Field profile fetched by get_multiple_hsd_data_in_batch(), the prefetch warms the cache under the same key
+PREFETCH_FIELDS = "fccb"
+
 def app():
     st.title("🔍 FCCB HSD Query Summary & Analysis")
     st.markdown("Analyze FCCB HSDs data with AI-powered insights")
@@ -44,8 +53,35 @@ def app():
             "Enter Query ID:", 
             help="Enter the HSD query ID to fetch multiple HSDs"
         )
+        # Start listing the query and warming the article cache while the rest of the run is configured
+        # Other sessions may be waiting on the same prefetch, so it is only cancelled once none of them uses it
+        prefetch_owner = st.session_state.setdefault("prefetch_owner", uuid.uuid4().hex)
+        if st.session_state.get("prefetch_query_id") not in (None, query_id):
+            cancel_query_prefetch(st.session_state["prefetch_query_id"], PREFETCH_FIELDS, owner=prefetch_owner)
+        st.session_state["prefetch_query_id"] = query_id
+        prefetch = start_query_prefetch(query_id, PREFETCH_FIELDS, owner=prefetch_owner)
+        if prefetch is not None:
+            status = prefetch.status()
+            if status["total"] is not None:
+                st.caption(f"⏳ Prefetching: {status['warmed']}/{status['total']} HSDs cached ({status['state']})")
+            elif status["state"] != "failed":
+                st.caption("⏳ Listing query HSDs in the background...")
         hsd_id = None
-        batch_size = st.sidebar.slider("Batch Size", min_value=1, max_value=10, value=3)
+        pack_batches = st.sidebar.checkbox(
+            "Pack batches by token budget", value=True,
+            help="Fill each OpenAI batch with as many HSDs as fit in the prompt token budget instead of a fixed number"
+        )
+        if pack_batches:
+            token_budget = st.sidebar.slider("Prompt Token Budget", min_value=4000, max_value=100000,
+                                             value=min(max(DEFAULT_PROMPT_TOKEN_BUDGET, 4000), 100000), step=1000,
+                                             help="Prompt tokens per batch, prompts included")
+            batch_size = None
+        else:
+            token_budget = None
+            batch_size = st.sidebar.slider("Batch Size", min_value=1, max_value=10, value=3)
+        llm_concurrency = st.sidebar.slider("Concurrent OpenAI Batches", min_value=1, max_value=16,
+                                            value=min(DEFAULT_LLM_CONCURRENCY, 16),
+                                            help="Batches analysed by OpenAI at the same time")
     else:
         hsd_id = st.text_input(
             "Enter HSD ID:", 
@@ -53,6 +89,9 @@ def app():
         )
         query_id = None
         batch_size = None
+        token_budget = None
+        llm_concurrency = 1
+        prefetch = None
     
     # Prompt configuration
     st.subheader("Analysis Configuration")
@@ -122,6 +161,11 @@ def app():
     
     hsd_excel = "HSD Data Excel" in excel_options
     ai_excel = "AI Analysis Excel" in excel_options
+    refresh_llm_cache = st.sidebar.checkbox(
+        "Refresh AI responses",
+        help="Send every batch to OpenAI even if the identical request was answered before. "
+             "By default unchanged batches reuse the cached response and consume no tokens."
+    )
     
     # Processing button
     if st.button("🚀 Start Analysis", type="primary"):
@@ -139,7 +183,7 @@ def app():
             try:
                 # Initialize connectors
                 hsd_connector = HsdConnector()
-                openai_connector = OpenAIConnector()
+                openai_connector = OpenAIConnector(bypass_cache=refresh_llm_cache)
                 
                 # Prepare the prompt
                 if output_format == "text":
@@ -216,7 +260,9 @@ def app():
                 if query_id:
                     # Process query ID
                     st.info(f"Fetching HSD IDs from query: {query_id}")
-                    hsd_ids = hsd_connector.fetch_hsd_ids_from_query(query_id)
+                    hsd_ids = prefetch.handover() if prefetch is not None else None
+                    if hsd_ids is None:
+                        hsd_ids = hsd_connector.fetch_hsd_ids_from_query(query_id)
                     
                     if not hsd_ids:
                         st.error("Failed to fetch HSD IDs from the query")
@@ -228,35 +274,50 @@ def app():
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    batch_files = hsd_connector.get_multiple_hsd_data_in_batch(hsd_ids, batch_size=batch_size)
+                    if token_budget:
+                        batch_files = hsd_connector.get_multiple_hsd_data_in_batch(
+                            hsd_ids, batch_size=max_batch_hsds(),
+                            token_budget=data_token_budget(system_prompt, final_prompt, budget=token_budget))
+                    else:
+                        batch_files = hsd_connector.get_multiple_hsd_data_in_batch(hsd_ids, batch_size=batch_size)
                     all_responses = []
                     
-                    for batch_num, batch_file in enumerate(batch_files, 1):
-                        progress = batch_num / len(batch_files)
-                        progress_bar.progress(progress)
-                        status_text.text(f"Processing Batch {batch_num}/{len(batch_files)} with OpenAI...")
+                    def analyse_batch(batch_file):
+                        # Runs on a worker thread: no Streamlit calls here, only the completion and its output file
+                        res = openai_connector.run_prompt_with_json(batch_file, system_prompt, final_prompt)
+                        if not res:
+                            raise RuntimeError("No response from OpenAI")
                         
-                        try:
-                            res = openai_connector.run_prompt_with_json(batch_file, system_prompt, final_prompt)
-                            
-                            # Create output filename for this batch
-                            base_filename = Path(batch_file).stem
-                            timestamp = base_filename.split('_')[-1]
-                            new_base_filename = '_'.join(base_filename.split('_')[:-1]) + '_gpt_output_' + timestamp
-                            
-                            # Determine file extension
-                            extension = ".txt" if output_format == "text" else ".html" if output_format == "html" else ".json"
-                            batch_output_filename = get_log_file_path(new_base_filename + extension)
-                            
-                            # Save batch response
-                            with open(batch_output_filename, "w", encoding='utf-8') as file:
-                                file.write(res['response'])
-                            
+                        # Create output filename for this batch
+                        base_filename = Path(batch_file).stem
+                        timestamp = base_filename.split('_')[-1]
+                        new_base_filename = '_'.join(base_filename.split('_')[:-1]) + '_gpt_output_' + timestamp
+                        
+                        # Determine file extension
+                        extension = ".txt" if output_format == "text" else ".html" if output_format == "html" else ".json"
+                        batch_output_filename = get_log_file_path(new_base_filename + extension)
+                        
+                        # Save batch response
+                        with open(batch_output_filename, "w", encoding='utf-8') as file:
+                            file.write(res['response'])
+                        return str(batch_output_filename), res['response']
+                    
+                    def show_progress(outcome, done, total):
+                        progress_bar.progress(done / total)
+                        status_text.text(f"Processed {done}/{total} batches with OpenAI ({llm_concurrency} at a time)...")
+                    
+                    status_text.text(f"Processing {len(batch_files)} batches with OpenAI ({llm_concurrency} at a time)...")
+                    outcomes = run_batches(batch_files, analyse_batch, max_in_flight=llm_concurrency, on_done=show_progress)
+                    
+                    for batch_num, outcome in enumerate(outcomes, 1):
+                        batch_file = outcome.item
+                        if outcome.ok:
+                            batch_output_filename, response = outcome.result
                             all_responses.append({
                                 'batch_num': batch_num,
                                 'batch_file': batch_file,
-                                'output_file': str(batch_output_filename),
-                                'response': res['response']
+                                'output_file': batch_output_filename,
+                                'response': response
                             })
                             
                             # Convert to Excel per batch if --hsd_excel is specified
@@ -264,12 +325,12 @@ def app():
                                 hsd_excel_filename = get_log_file_path(f"{Path(batch_file).stem}.xlsx")
                                 convert_hsd_data_to_excel(batch_file, str(hsd_excel_filename))
                         
-                        except Exception as e:
-                            st.error(f"Error processing batch {batch_num}: {e}")
+                        else:
+                            st.error(f"Error processing batch {batch_num}: {outcome.error}")
                             all_responses.append({
                                 'batch_num': batch_num,
                                 'batch_file': batch_file,
-                                'error': str(e)
+                                'error': outcome.error
                             })
                     
                     progress_bar.progress(1.0)
@@ -286,24 +347,9 @@ def app():
                         st.info("Creating consolidated HSD Excel file...")
                         consolidated_hsd_excel = get_log_file_path(f"consolidated_hsd_data_{query_id}_{timestamp}.xlsx")
                         
-                        # Combine all HSD data from successful batches
-                        all_hsd_data = {"data": []}
-                        for batch_file in batch_files:
-                            try:
-                                with open(batch_file, 'r', encoding='utf-8') as f:
-                                    batch_data = json.load(f)
-                                    if "data" in batch_data and isinstance(batch_data["data"], list):
-                                        all_hsd_data["data"].extend(batch_data["data"])
-                            except Exception as e:
-                                st.warning(f"Could not read batch file {batch_file}: {e}")
-                        
-                        # Save consolidated HSD data to temporary JSON and convert to Excel
-                        temp_hsd_json = get_log_file_path(f"temp_consolidated_hsd_{timestamp}.json")
-                        with open(temp_hsd_json, 'w', encoding='utf-8') as f:
-                            json.dump(all_hsd_data, f, indent=4, ensure_ascii=False)
-                        
-                        convert_hsd_data_to_excel(temp_hsd_json, consolidated_hsd_excel)
-                        os.remove(temp_hsd_json)  # Clean up temporary file
+                        # Combine all HSD data from successful batches, held in compact form (see connectors/hsd_article.py)
+                        articles = load_batch_articles(batch_files)
+                        convert_articles_to_excel(articles, consolidated_hsd_excel)
                         consolidated_files['hsd_excel'] = consolidated_hsd_excel
                     
                     if ai_excel:
@@ -41,8 +41,8 @@ class FCCBAnalyzer:
             if query_id:
                 hsd_data = self.hsd_handler.hsd.fetch_query_data(query_id)
             else:
-                # Search for FCCB related HSDs
-                hsd_data = self.hsd_handler.hsd.search_hsds(search_term) # Need to implement search_hsds in HSDHandler
+                # Search for FCCB related HSDs in the local index of fetched HSDs
+                hsd_data = self.hsd_handler.hsd.search_hsds(search_term)
             return hsd_data
         except Exception as e:
             logger.error(f"Error getting FCCB HSDs: {e}")
@@ -64,7 +64,7 @@ class FCCBAnalyzer:
             # ]
             
             # hsd_details = self.hsd_handler.hsd.get_hsd(hsd_id, fields)
-            hsd_details = self.hsd_handler.hsd.get_hsd(hsd_id)
+            hsd_details = self.hsd_handler.hsd.get_hsd(hsd_id, "fccb")
             # If HSD details are not found, return error
             if not hsd_details:
                 return {"error": "HSD details not found"}
@@ -18,7 +18,6 @@ import traceback
 from datetime import datetime
 from typing import Dict, Any, List, Tuple
 from pathlib import Path
-from requests_kerberos import HTTPKerberosAuth
 
 # Suppress SSL warnings for internal Intel API calls
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -80,6 +79,15 @@ def extract_hsd_id_from_string(hsd_info_string):
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
+from connectors.hsd_async_fetcher import fetch_hsd_batches, fetch_articles, DEFAULT_MAX_CONCURRENCY
+from connectors.hsd_retry import call_with_retry, HsdFatalError
+from connectors.hsd_session import get_shared_session, ARTICLE_URL
+from connectors.hsd_field_profiles import resolve_fields
+from connectors.llm_prompt_payload import serialise_for_prompt
+from connectors.hsd_singleflight import SingleFlight, hsd_key
+from connectors.hsd_rate_limiter import HSD_RATE_LIMITER
+from connectors.hsd_bulk_fetcher import BULK_MIN_IDS
+from connectors.hsd_article import HsdArticle, compact_hsd
 
 # Import OpenAI connector
 try:
@@ -121,8 +129,8 @@ class HsdConnector:
         HTTPError: If the GET request is not successful (i.e., if the response status code is not 200).
         Exception: If there is an error when trying to parse the response data as JSON.
     """
-        # Send a GET request to the specified URL (req) with the provided headers
-        response = requests.get(req, auth=HTTPKerberosAuth(), verify=False, headers=headers)
+        # Send a GET request over the shared pooled HSD session (see connectors.hsd_session)
+        response = get_shared_session().get(req, headers=headers)
         # If the response is successful (status code 200)
         if response.ok:
             try:
@@ -142,20 +150,21 @@ class HsdConnector:
             field_keys = full_response_data["data"][0].keys()
             print(f"The fields that we are writing into the {hsd_query_data_file} file are: {', '.join(field_keys)}")
    
-    def get_hsd(self, hsd_id, fields=None):
+    def get_hsd(self, hsd_id, fields="fccb"):
         """
         Fetches detailed information about an HSD page using its ID. The method sends a GET request to the HSD API and
         retrieves the data associated with the given ID. The data is returned as a dictionary.
         Note: The HSD API requires Kerberos authentication. Meaning it can only be executed locally and not over cloud.
         Parameters:
         id (str): The ID of the HSD page to fetch information for.
-        fields (List<str>): fields to include in the response, list of strings (optional). If not defined, returns all fields.
+        fields (List<str> | str): fields to include in the response, list of strings or a field profile name from
+        connectors.hsd_field_profiles (default: "fccb").
         Returns:
         dict: A dictionary containing detailed information about the HSD page. The dictionary includes the data
         associated with the given ID. If the ID does not exist or the request fails, the method raises an exception.
         Raises:
         requests.exceptions.HTTPError: If the HTTP request encounters an error or if the response status code is not 200 OK.
-        urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached MAX retries count (10)
+        urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached the retry policy's max attempts
         requests.exceptions.ProxyError: Problem with proxy settings
         http.client.RemoteDisconnected: During the query the remote was disconnected
         https://hsdes-api.intel.com/rest/article/{id}?fields={field1}%2C%20{field1}%2C%20{field1}...
@@ -163,144 +172,66 @@ class HsdConnector:
         :param fields: list of field names
         :return:json of all the fields returned from the hsd
         """
+        fields = resolve_fields(fields)
         if fields == "":  # Backwards compatibility
             fields = None
         assert fields is None or (len(fields) > 0 and type(fields) != str and all([type(f) == str for f in fields])), \
             "fields must be None or a list\\iterator of strings. Got %s." % (repr(fields),)
-        fields = ["id","title", "description", "status", "comments"]
-        
-        retry = 10
-        while (retry > 0):
-            try:
-                req = "https://hsdes-api.intel.com/rest/article/" + str(hsd_id)
-                if fields is not None:
-                    req += "?fields=" + "%2C%20".join(fields)
-                headers = {'Content-type': 'application/json'}
-                # print req
-                response_data = self._get_response(req, headers)
-                if "data" in response_data:
-                    return response_data["data"][0]
-                else:
-                    raise Exception('Could not find "data" in response...')
-            except urllib3.exceptions.MaxRetryError:
-                print('Got "urllib3.exceptions.MaxRetryError" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except requests.exceptions.ProxyError:
-                print('Got "requests.exceptions.ProxyError" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except http.client.RemoteDisconnected:
-                print('Got "http.client.RemoteDisconnected" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except Exception as e:
-                print(
-                    'Got unknown exception: {}, retrying {} more attempts'.format(traceback.format_exc(), (retry - 1)))
-                retry -= 1
 
-    def get_multiple_hsd_data_in_batch(self, hsd_ids, batch_size=8, fields=None):
+        req = ARTICLE_URL + str(hsd_id)
+        if fields is not None:
+            req += "?fields=" + "%2C%20".join(fields)
+        headers = {'Content-type': 'application/json'}
+
+        def fetch():
+            response_data = self._get_response(req, headers)
+            if "data" in response_data:
+                return response_data["data"][0]
+            raise HsdFatalError('Could not find "data" in response...')
+
+        try:
+            return call_with_retry(fetch, description=f"HSD {hsd_id} fetch")
+        except Exception as e:
+            print(f'Failed to fetch HSD {hsd_id}: {e}')
+            return None
+
+    def get_multiple_hsd_data_in_batch(self, hsd_ids, batch_size=8, fields="fccb", max_concurrency=DEFAULT_MAX_CONCURRENCY):
         """
         Fetches detailed information for multiple HSD IDs in batches and saves each batch to separate JSON files.
         This helps avoid token limits when processing large numbers of HSDs.
+        The HSDs are fetched concurrently by the shared fetch engine (connectors.hsd_async_fetcher).
         
         Parameters:
         hsd_ids (list): List of HSD IDs to fetch information for.
         batch_size (int): Number of HSDs to process in each batch (default: 10)
-        fields (List<str>): fields to include in the response, list of strings (optional).
+        fields (List<str> | str): fields to include in the response, list of strings or a field profile name from
+        connectors.hsd_field_profiles (default: "fccb").
+        max_concurrency (int): Maximum number of concurrent article requests.
         
         Returns:
         list: List of JSON file paths containing batch data
         """
         # fields = ["id","title", "description", "status", "comments","forum_notes"]
-        fields = ["id","title", "description", "status", "comments"]
-        
-        if not hsd_ids or not isinstance(hsd_ids, list):
-            raise ValueError("hsd_ids must be a non-empty list")
-        
-        # Split HSDs into batches
-        batches = [hsd_ids[i:i + batch_size] for i in range(0, len(hsd_ids), batch_size)]
-        batch_files = []
-        
-        print(f"📊 Processing {len(hsd_ids)} HSDs in {len(batches)} batches of {batch_size} HSDs each...")
+        fields = resolve_fields(fields)
         
-        for batch_num, batch_hsd_ids in enumerate(batches, 1):
-            print(f"\n🔄 Processing Batch {batch_num}/{len(batches)} ({len(batch_hsd_ids)} HSDs)...")
-            
-            # Generate timestamp and dynamic filename for this batch
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            batch_file = f"hsd_batch_{batch_num}_of_{len(batches)}_{len(batch_hsd_ids)}hsds_{timestamp}.json"
-            # Get full path in fuse_report directory
-            full_batch_path = get_fuse_report_file_path(batch_file)
-            
-            # Initialize batch data structure
-            batch_data = {"data": []}
-            successful_count = 0
-            failed_count = 0
-            
-            for i, hsd_id in enumerate(batch_hsd_ids, 1):
-                print(f"  Processing HSD {i}/{len(batch_hsd_ids)} in batch {batch_num}: {hsd_id}")
-                retry = 10
-                success = False
-                
-                while retry > 0 and not success:
-                    try:
-                        req = "https://hsdes-api.intel.com/rest/article/" + str(hsd_id)
-                        if fields is not None:
-                            req += "?fields=" + "%2C%20".join(fields)
-                        headers = {'Content-type': 'application/json'}
-                        
-                        response_data = self._get_response(req, headers)
-                        
-                        if "data" in response_data:
-                            if isinstance(response_data["data"], list):
-                                batch_data["data"].extend(response_data["data"])
-                            else:
-                                batch_data["data"].append(response_data["data"])
-                            successful_count += 1
-                            success = True
-                        else:
-                            print(f"    ✗ No data found for HSD ID: {hsd_id}")
-                            failed_count += 1
-                            success = True
-                            
-                    except Exception as e:
-                        print(f'    ⚠ Error for HSD {hsd_id}: {str(e)}, retrying {retry - 1} more attempts')
-                        retry -= 1
-                
-                if not success:
-                    print(f"    ✗ Failed to fetch data for HSD ID: {hsd_id} after all retries")
-                    failed_count += 1
-            
-            # Save batch data to file
-            with open(full_batch_path, 'w', encoding='utf-8') as f:
-                json.dump(batch_data, f, indent=4, ensure_ascii=False)
-            
-            batch_files.append(str(full_batch_path))
-            
-            print(f"  ✅ Batch {batch_num} complete:")
-            print(f"    • Successful: {successful_count}")
-            print(f"    • Failed: {failed_count}")
-            print(f"    • HSDs with content: {len(batch_data['data'])}")
-            print(f"    • Saved to: '{full_batch_path}'")
-        
-        print(f"\n📊 All Batches Complete:")
-        print(f"  • Total batches: {len(batches)}")
-        print(f"  • Batch files created: {len(batch_files)}")
-        
-        return batch_files
-    
-    def get_hsd_data_in_file(self, hsd_id, fields=None):
+        return fetch_hsd_batches(hsd_ids, batch_size=batch_size, fields=fields,
+                                 get_batch_file_path=get_fuse_report_file_path, max_concurrency=max_concurrency)
+
+    def get_hsd_data_in_file(self, hsd_id, fields="fccb"):
         """
         Fetches detailed information about an HSD page using its ID. The method sends a GET request to the HSD API and
         retrieves the data associated with the given ID. The data is returned as a dictionary.
         Note: The HSD API requires Kerberos authentication. Meaning it can only be executed locally and not over cloud.
         Parameters:
         id (str): The ID of the HSD page to fetch information for.
-        fields (List<str>): fields to include in the response, list of strings (optional). If not defined, returns all fields.
+        fields (List<str> | str): fields to include in the response, list of strings or a field profile name from
+        connectors.hsd_field_profiles (default: "fccb").
         Returns:
         dict: A dictionary containing detailed information about the HSD page. The dictionary includes the data
         associated with the given ID. If the ID does not exist or the request fails, the method raises an exception.
         Raises:
         requests.exceptions.HTTPError: If the HTTP request encounters an error or if the response status code is not 200 OK.
-        urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached MAX retries count (10)
+        urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached the retry policy's max attempts
         requests.exceptions.ProxyError: Problem with proxy settings
         http.client.RemoteDisconnected: During the query the remote was disconnected
         https://hsdes-api.intel.com/rest/article/{id}?fields={field1}%2C%20{field1}%2C%20{field1}...
@@ -310,47 +241,38 @@ class HsdConnector:
         """
         # FIXME (vbbhogad) THis is an ugly implementation rigt now where we dump the entire HSD data in dictionary to a file (which lingers around). This will need to eliminaited and fucntion shoudl only pass the JSON)
         # fields = ["id","title", "description", "subject", "owner", "status", "comments", "tenant", "bugeco.por", "component"]
-        fields = ["id","title", "description", "status", "comments"]
+        fields = resolve_fields(fields)
 
         if fields == "":  # Backwards compatibility
             fields = None
         assert fields is None or (len(fields) > 0 and type(fields) != str and all([type(f) == str for f in fields])), \
             "fields must be None or a list\\iterator of strings. Got %s." % (repr(fields),)
-        retry = 10
-        while (retry > 0):
-            try:
-                req = "https://hsdes-api.intel.com/rest/article/" + str(hsd_id)
-                if fields is not None:
-                    req += "?fields=" + "%2C%20".join(fields)
-                headers = {'Content-type': 'application/json'}
-                # print req
-                response_data = self._get_response(req, headers)
-                if "data" in response_data:
-                    #return response_data["data"][0]
-                   # Generate the timestamp and dynamic filename
-                   timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                   hsd_id_data_file = f"hsd_query_{hsd_id}_{timestamp}.json"
-                   # Get full path in fuse_report directory
-                   full_file_path = get_fuse_report_file_path(hsd_id_data_file)
-                   with open(full_file_path, 'w', encoding='utf-8') as final_file:
-                       json.dump(response_data, final_file, indent=4, ensure_ascii=False)
-                       #print(f"Full JSON data has been saved to '{full_file_path}'\n")
-                       return str(full_file_path)
-                else:
-                    raise Exception('Could not find "data" in response...')
-            except urllib3.exceptions.MaxRetryError:
-                print('Got "urllib3.exceptions.MaxRetryError" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except requests.exceptions.ProxyError:
-                print('Got "requests.exceptions.ProxyError" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except http.client.RemoteDisconnected:
-                print('Got "http.client.RemoteDisconnected" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except Exception as e:
-                print(
-                    'Got unknown exception: {}, retrying {} more attempts'.format(traceback.format_exc(), (retry - 1)))
-                retry -= 1
+        req = ARTICLE_URL + str(hsd_id)
+        if fields is not None:
+            req += "?fields=" + "%2C%20".join(fields)
+        headers = {'Content-type': 'application/json'}
+
+        def fetch():
+            response_data = self._get_response(req, headers)
+            if "data" in response_data:
+                return response_data
+            raise HsdFatalError('Could not find "data" in response...')
+
+        try:
+            response_data = call_with_retry(fetch, description=f"HSD {hsd_id} fetch")
+        except Exception as e:
+            print(f'Failed to fetch HSD {hsd_id}: {e}')
+            return None
+
+        # Generate the timestamp and dynamic filename
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        hsd_id_data_file = f"hsd_query_{hsd_id}_{timestamp}.json"
+        # Get full path in fuse_report directory
+        full_file_path = get_fuse_report_file_path(hsd_id_data_file)
+        with open(full_file_path, 'w', encoding='utf-8') as final_file:
+            json.dump(response_data, final_file, indent=4, ensure_ascii=False)
+            #print(f"Full JSON data has been saved to '{full_file_path}'\n")
+        return str(full_file_path)
 
 class FuseEquationEvaluator:
     """
@@ -368,6 +290,9 @@ class FuseEquationEvaluator:
         self.data = None
         self.results = []
         self.openai_connector = None
+        # Many rows reference the same HSD: share one connector and fetch each HSD once per run
+        self.hsd_connector = HsdConnector()
+        self.hsd_lookups = SingleFlight(name="HSD lookups")
         
         # Initialize OpenAI connector if available
         if OPENAI_AVAILABLE:
@@ -469,9 +394,8 @@ class FuseEquationEvaluator:
             # print(f"   🔍 Extracted HSD ID: {hsd_id} from HSD Info: {str(hsd_info)[:100]}...")
             print(f"   🔍 Extracted HSD ID: {hsd_id}")
             try:
-                hsd_connector = HsdConnector()
                 #hsd_data_file = hsd_connector.get_hsd_data_in_file(hsd_id)
-                hsd_data = hsd_connector.get_hsd(hsd_id)
+                hsd_data = self.hsd_lookups.do(hsd_key(hsd_id, "fccb"), lambda: compact_hsd(self.hsd_connector.get_hsd(hsd_id, "fccb")))
                 if hsd_data:
                     print(f"   ✅ HSD data retrieved successfully")
                 else:
@@ -554,7 +478,9 @@ class FuseEquationEvaluator:
             - Use clear, technical language suitable for engineering teams'''
             
             # Convert hsd_data dictionary to JSON string for OpenAI processing
-            hsd_data_str = json.dumps(hsd_data, indent=2) if isinstance(hsd_data, dict) else str(hsd_data)
+            if isinstance(hsd_data, HsdArticle):
+                hsd_data = hsd_data.to_record()
+            hsd_data_str = serialise_for_prompt(hsd_data) if isinstance(hsd_data, dict) else str(hsd_data)
             
             # Process with OpenAI
             res = self.openai_connector.run_system_user_prompt(hsd_data_str, system_prompt_hsd, user_action_prompt)
@@ -916,6 +842,30 @@ class FuseEquationEvaluator:
         # Final fallback
         return f"Summary extraction failed for HSD {hsd_id} - see full analysis file"
     
+    def prefetch_hsd_data(self) -> int:
+        """
+        Fetches the HSDs referenced by all rows up front, so the per-row lookups are served from memory. With more
+        than a handful of distinct HSDs they are fetched with a few bulk queries instead of one request each.
+        
+        Returns:
+            int: Number of HSDs prefetched
+        """
+        hsd_column = self.column_names['hsd_info']
+        if self.data is None or hsd_column not in self.data.columns:
+            return 0
+        hsd_ids = list(dict.fromkeys(filter(None, (extract_hsd_id_from_string(value) for value in self.data[hsd_column]))))
+        if len(hsd_ids) < BULK_MIN_IDS:
+            return 0
+        
+        print(f"📥 Prefetching {len(hsd_ids)} referenced HSDs...")
+        prefetched = 0
+        for result in fetch_articles(hsd_ids, fields=resolve_fields("fccb")):
+            if result.ok and result.data:
+                self.hsd_lookups.remember(hsd_key(result.hsd_id, "fccb"), HsdArticle(result.data[0]))
+                prefetched += 1
+        print(f"✅ Prefetched {prefetched}/{len(hsd_ids)} HSDs")
+        return prefetched
+    
     def process_excel_data(self, column_mapping: Dict[str, str] = None) -> List[Dict]:
         """
         Process all rows in the Excel data and evaluate equations using OpenAI
@@ -942,6 +892,8 @@ class FuseEquationEvaluator:
         if column_mapping:
             print(f"🔧 Custom column mapping provided: {column_mapping}")
         
+        self.prefetch_hsd_data()
+        
         for index, row in self.data.iterrows():
             try:
                 print(f"\n📝 Processing Row {index + 1}/{total_rows}")
@@ -1017,6 +969,10 @@ class FuseEquationEvaluator:
         
         self.results = results
         print(f"\n✅ Processed {len(results)} rows with OpenAI evaluation")
+        hsd_stats = self.hsd_lookups.stats()
+        print(f"🔗 HSD lookups: {hsd_stats['calls_made']} fetched, {hsd_stats['calls_saved']} duplicate fetches saved")
+        limiter_stats = HSD_RATE_LIMITER.stats()
+        print(f"🚦 HSD rate limiter: {limiter_stats['wait_seconds']:.1f}s waiting, {limiter_stats['throttled']} throttled responses")
         return results
     
     def save_results_to_excel(self, output_path: str = None) -> bool:
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the HSD data pipeline. Run offline against synthesised (or recorded) stand-in data, see
+Tools/hsd_standin_server.py.
+
+Subcommands:
+- html: parse time per MB of HSD HTML fields for every installed HTML-to-text backend (common/html_text.py),
+  compared with the previous BeautifulSoup(html.parser).text, and the time per MB of memo hits.
+- transfer: fetches articles from a local stand-in server with and without gzip and reports bytes on the wire
+  versus decoded bytes and the wall time.
+- search: time to add articles to the local full-text index (connectors/hsd_search_index.py) and the latency of
+  keyword searches over it.
+- memory: memory held by parsed articles as plain dicts versus HsdArticle (connectors/hsd_article.py), reported per
+  10k articles, and the cost of decoding them back.
+- json-stream: checks the streaming query parser (connectors/hsd_json_stream.py) against json.loads with the body
+  split into two chunks at every byte offset, so values cut by a chunk boundary are exercised.
+
+Usage:
+    python Tools/hsd_benchmarks.py html --articles 200 --payload-kb 20
+    python Tools/hsd_benchmarks.py html --fixtures Tools/hsd_standin_fixtures
+    python Tools/hsd_benchmarks.py transfer --articles 300 --latency-ms 30
+    python Tools/hsd_benchmarks.py search --articles 5000 --term FCCB --term "pcode_cfg_17"
+    python Tools/hsd_benchmarks.py memory --articles 10000 --payload-kb 8
+    python Tools/hsd_benchmarks.py json-stream --articles 3
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import os
+import time
+import tracemalloc
+from pathlib import Path
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+from common.html_text import html_to_text, clear_html_memo, html_memo_stats, BACKENDS, HTML_FIELDS
+from connectors.hsd_article import HsdArticle
+from connectors.hsd_search_index import HsdSearchIndex
+from connectors.hsd_json_stream import iter_json_array, _iter_with_stdlib, ijson
+from hsd_standin_server import StandinConfig, synthesize_article, start_server
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+def _timed(func, repeat):
+    """Returns the best wall time of repeat runs of func()."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def load_html_corpus(articles, payload_kb, fixtures=None):
+    """
+    Returns the HTML field values to benchmark: from recorded article fixtures if fixtures is given, otherwise
+    from synthesised stand-in articles (one description and one comments value each).
+    """
+    if fixtures:
+        corpus = []
+        for path in sorted(Path(fixtures, "articles").glob("*.json")):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for record in data.get("data", [data]) if isinstance(data, dict) else data:
+                corpus.extend(value for key, value in record.items() if key in HTML_FIELDS and isinstance(value, str))
+        return corpus
+    config = StandinConfig(payload_kb=payload_kb)
+    corpus = []
+    for i in range(articles):
+        article = synthesize_article(config, 1400000000 + i)
+        corpus.extend([article["description"], article["comments"]])
+    return corpus
+
+
+def bench_html(args):
+    corpus = load_html_corpus(args.articles, args.payload_kb, args.fixtures)
+    if not corpus:
+        print("❌ No HTML values found to benchmark.")
+        return 1
+    megabytes = sum(len(value.encode("utf-8")) for value in corpus) / (1024 * 1024)
+    print(f"📊 {len(corpus)} HTML values, {megabytes:.2f} MB, best of {args.repeat} runs")
+
+    rows = []
+    if BeautifulSoup is not None:
+        seconds = _timed(lambda: [BeautifulSoup(value, "html.parser").text for value in corpus], args.repeat)
+        rows.append(("previous: BeautifulSoup(html.parser).text", seconds))
+    for backend in BACKENDS:
+        seconds = _timed(lambda: [html_to_text(value, backend=backend, memoize=False) for value in corpus], args.repeat)
+        rows.append((f"html_to_text backend={backend}", seconds))
+
+    clear_html_memo()
+    [html_to_text(value) for value in corpus]
+    seconds = _timed(lambda: [html_to_text(value) for value in corpus], args.repeat)
+    rows.append(("html_to_text memo hits", seconds))
+
+    baseline = rows[0][1]
+    print(f"\n{'Stage':<45} {'ms/MB':>10} {'MB/s':>10} {'speedup':>9}")
+    for name, seconds in rows:
+        print(f"{name:<45} {seconds * 1000 / megabytes:>10.1f} {megabytes / seconds:>10.1f} {baseline / seconds:>8.1f}x")
+
+    text_bytes = sum(len(html_to_text(value).encode("utf-8")) for value in corpus)
+    print(f"\n📉 Text output is {text_bytes / (megabytes * 1024 * 1024):.0%} of the HTML size")
+    print(f"🧠 Memo: {html_memo_stats()}")
+    return 0
+
+
+def bench_transfer(args):
+    config = StandinConfig(latency_ms=args.latency_ms, payload_kb=args.payload_kb)
+    server = start_server(config)
+    # Must be set before the connectors are imported, they read the API root at import time. The synthetic
+    # articles must not reach the article cache or the search index, where real runs would pick them up.
+    os.environ.update({"HSD_API_BASE_URL": f"http://127.0.0.1:{server.server_port}", "HSD_API_AUTH": "none",
+                       "HSD_CACHE": "off", "HSD_SEARCH_INDEX": "off"})
+    from connectors.hsd_async_fetcher import fetch_articles
+    from connectors.hsd_field_profiles import resolve_fields
+    from connectors.transfer_stats import HSD_TRANSFER_STATS, format_bytes
+
+    hsd_ids = [str(1400000000 + i) for i in range(args.articles)]
+    print(f"📊 {args.articles} articles of ~{args.payload_kb:.0f} KB, {args.latency_ms:.0f} ms latency")
+    print(f"\n{'Mode':<12} {'Requests':>9} {'On the wire':>13} {'Decoded':>11} {'Ratio':>7} {'Seconds':>8}")
+    for compress in (False, True):
+        config.compress = compress
+        HSD_TRANSFER_STATS.reset()
+        start = time.perf_counter()
+        results = fetch_articles(hsd_ids, fields=resolve_fields(args.fields), bulk=not args.no_bulk)
+        elapsed = time.perf_counter() - start
+        stats = HSD_TRANSFER_STATS.stats()
+        failed = sum(not result.ok for result in results)
+        print(f"{'gzip' if compress else 'identity':<12} {stats['responses']:>9} {format_bytes(stats['wire_bytes']):>13} "
+              f"{format_bytes(stats['decoded_bytes']):>11} {stats['ratio'] or 0:>7.1%} {elapsed:>8.2f}"
+              + (f"  ({failed} failed)" if failed else ""))
+    server.shutdown()
+    return 0
+
+
+def bench_search(args):
+    config = StandinConfig(payload_kb=args.payload_kb)
+    records = [synthesize_article(config, 1400000000 + i) for i in range(args.articles)]
+    with tempfile.TemporaryDirectory() as directory:
+        index = HsdSearchIndex(os.path.join(directory, "hsd_search.sqlite3"))
+        start = time.perf_counter()
+        index.index(records)
+        elapsed = time.perf_counter() - start
+        print(f"📊 Indexed {len(index)} articles of ~{args.payload_kb:.0f} KB in {elapsed:.2f}s "
+              f"({elapsed * 1000 / len(records) * 1000:.0f} ms per 1k)")
+        start = time.perf_counter()
+        index.index(records)
+        print(f"♻️  Re-indexing unchanged articles: {time.perf_counter() - start:.2f}s")
+
+        print(f"\n{'Search term':<30} {'Matches':>8} {'ms':>8}")
+        for term in args.term or ["FCCB", "fuse configuration", "pcode_cfg_17", "pcode*"]:
+            matches = []
+            seconds = _timed(lambda: matches.__setitem__(slice(None), index.search(term)), args.repeat)
+            print(f"{term:<30} {len(matches):>8} {seconds * 1000:>8.2f}")
+        index.close()
+    return 0
+
+
+def load_records(articles, payload_kb, fixtures=None):
+    """
+    Returns the serialised records to benchmark: recorded article fixtures if fixtures is given (cycled up to
+    articles), otherwise synthesised stand-in articles. Each is parsed separately, like API responses are.
+    """
+    if fixtures:
+        payloads = []
+        for path in sorted(Path(fixtures, "articles").glob("*.json")):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            payloads.extend(json.dumps(record) for record in (data.get("data", [data]) if isinstance(data, dict) else data))
+        return [payloads[i % len(payloads)] for i in range(articles)] if payloads else []
+    config = StandinConfig(payload_kb=payload_kb)
+    return [json.dumps(synthesize_article(config, 1400000000 + i)) for i in range(articles)]
+
+
+def _held_bytes(build):
+    """Returns (object, bytes still allocated by build() once it returned)."""
+    tracemalloc.start()
+    try:
+        held = build()
+        return held, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(args):
+    payloads = load_records(args.articles, args.payload_kb, args.fixtures)
+    if not payloads:
+        print("❌ No articles found to benchmark.")
+        return 1
+    count = len(payloads)
+    per_10k = 10000 / count
+    megabytes = sum(len(payload) for payload in payloads) / (1024 * 1024)
+    print(f"📊 {count} articles, {megabytes:.1f} MB of JSON")
+
+    records, dict_bytes = _held_bytes(lambda: [json.loads(payload) for payload in payloads])
+    del records
+    articles, article_bytes = _held_bytes(lambda: [HsdArticle(json.loads(payload)) for payload in payloads])
+
+    print(f"\n{'Representation':<20} {'Held':>10} {'Per 10k articles':>18}")
+    for name, held in (("dict records", dict_bytes), ("HsdArticle", article_bytes)):
+        print(f"{name:<20} {held / (1024 * 1024):>8.1f} MB {held * per_10k / (1024 * 1024):>15.1f} MB")
+    print(f"\n📉 HsdArticle holds {article_bytes / dict_bytes:.1%} of the dict memory "
+          f"({dict_bytes / article_bytes:.1f}x less)")
+
+    seconds = _timed(lambda: [article.to_record() for article in articles], args.repeat)
+    print(f"⏱️  Decoding all articles back to dicts: {seconds * 1000:.0f} ms "
+          f"({seconds * 1000 * per_10k:.0f} ms per 10k)")
+    if not args.fixtures:
+        print("💡 Synthesised text is very repetitive and compresses better than real HSDs, use --fixtures for "
+              "recorded articles")
+    return 0
+
+
+class _SplitStream:
+    """Binary stream returning a body in two reads, split at the given offset."""
+
+    def __init__(self, body, offset):
+        self.parts = [part for part in (body[:offset], body[offset:]) if part]
+
+    def read(self, size=-1):
+        return self.parts.pop(0) if self.parts else b""
+
+
+def check_json_stream(args):
+    config = StandinConfig(payload_kb=args.payload_kb)
+    records = [synthesize_article(config, 1500000000 + i) for i in range(args.articles)]
+    # Numbers in every form a chunk boundary can cut: fractions, exponents, signs
+    records.append({"id": 1, "ratio": 12.75, "scale": -1.5e-3, "big": 2E+10, "flags": [0, -7, 1e5, 0.0], "ok": True})
+    query = {"total": len(records), "elapsed": 0.125, "data": records, "offset": -0.0}
+    body = json.dumps(query, ensure_ascii=False).encode("utf-8")
+    expected_meta = {name: value for name, value in query.items() if name != "data"}
+    expected_items = json.loads(body)["data"]
+
+    # The stdlib parser is checked whether or not ijson is installed; with ijson the public path is checked too
+    parsers = [("stdlib", lambda stream, meta: _iter_with_stdlib(stream, "data", meta, len(body)))]
+    if ijson is not None:
+        parsers.append(("iter_json_array", lambda stream, meta: iter_json_array(stream, meta=meta)))
+    print(f"📊 {len(body)} byte body, {len(records)} records, split at every offset")
+    failures = 0
+    for name, parse in parsers:
+        failed = []
+        for offset in range(len(body) + 1):
+            meta = {}
+            try:
+                ok = list(parse(_SplitStream(body, offset), meta)) == expected_items and meta == expected_meta
+            except ValueError:
+                ok = False
+            if not ok:
+                failed.append(offset)
+        failures += len(failed)
+        if failed:
+            print(f"❌ {name}: {len(failed)} split offsets differ from json.loads, first at {failed[0]} "
+                  f"({body[max(0, failed[0] - 10):failed[0] + 10]!r})")
+        else:
+            print(f"✅ {name}: all {len(body) + 1} split offsets match json.loads")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the HSD data pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    html = subparsers.add_parser("html", help="HTML-to-text parse time per MB")
+    html.add_argument("--articles", type=int, default=200, help="Synthesised articles (2 HTML values each)")
+    html.add_argument("--payload-kb", type=float, default=20.0, help="Size of each synthesised article in KB")
+    html.add_argument("--fixtures", help="Use the HTML fields of recorded stand-in fixtures instead")
+    html.add_argument("--repeat", type=int, default=3, help="Runs per stage, the best one is reported")
+    html.set_defaults(func=bench_html)
+
+    transfer = subparsers.add_parser("transfer", help="Bytes on the wire versus decoded, with and without gzip")
+    transfer.add_argument("--articles", type=int, default=300, help="Articles to fetch")
+    transfer.add_argument("--payload-kb", type=float, default=20.0, help="Size of each synthesised article in KB")
+    transfer.add_argument("--latency-ms", type=float, default=20.0, help="Stand-in latency per request")
+    transfer.add_argument("--fields", default="sighting_summary", help="Field profile to fetch")
+    transfer.add_argument("--no-bulk", action="store_true", help="Fetch article by article instead of in bulk")
+    transfer.set_defaults(func=bench_transfer)
+
+    search = subparsers.add_parser("search", help="Full-text index build time and search latency")
+    search.add_argument("--articles", type=int, default=5000, help="Synthesised articles to index")
+    search.add_argument("--payload-kb", type=float, default=8.0, help="Size of each synthesised article in KB")
+    search.add_argument("--term", action="append", help="Search term to time (repeatable)")
+    search.add_argument("--repeat", type=int, default=5, help="Runs per search, the best one is reported")
+    search.set_defaults(func=bench_search)
+
+    memory = subparsers.add_parser("memory", help="Memory held by dict records versus HsdArticle")
+    memory.add_argument("--articles", type=int, default=10000, help="Articles to hold")
+    memory.add_argument("--payload-kb", type=float, default=8.0, help="Size of each synthesised article in KB")
+    memory.add_argument("--fixtures", help="Use recorded stand-in article fixtures instead")
+    memory.add_argument("--repeat", type=int, default=3, help="Decode runs, the best one is reported")
+    memory.set_defaults(func=bench_memory)
+
+    json_stream = subparsers.add_parser("json-stream", help="Streaming JSON parser against json.loads at every split")
+    json_stream.add_argument("--articles", type=int, default=3, help="Synthesised articles in the body")
+    json_stream.add_argument("--payload-kb", type=float, default=0.5, help="Size of each synthesised article in KB")
+    json_stream.set_defaults(func=check_json_stream)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the HSD REST API, used to exercise and benchmark the HSD connectors without Kerberos or
+hsdes-api.intel.com.
+
+Implements:
+- GET /rest/article/{id}              ({"data": [article]}, honours ?fields=)
+- GET /rest/article/{id}/links        ({"responses": [...]}, honours ?fields=)
+- GET /rest/query/execution/{id}      ({"total": N, "data": [...]}, honours ?fields=, start_at and max_results)
+- POST /rest/query/execution/eql      ({"eql": "select f1, f2 where id in (1, 2)"}, bulk fetch by ID)
+
+Articles, links and query results are read from recorded fixtures when present
+(<fixtures>/articles/<id>.json, <fixtures>/links/<id>.json, <fixtures>/queries/<id>.json) and synthesised
+deterministically otherwise. Latency, error rate and payload size are configurable.
+
+Usage:
+    python Tools/hsd_standin_server.py serve --port 8765 --latency-ms 40 --error-rate 0.02 --payload-kb 20
+    export HSD_API_BASE_URL=http://127.0.0.1:8765 HSD_API_AUTH=none
+
+    # Record fixtures from the live API (needs Kerberos)
+    python Tools/hsd_standin_server.py record --ids 14012345678 14012345679 --query 1209876543
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_FIXTURES_DIR = Path(__file__).parent / "hsd_standin_fixtures"
+ID_EQL_PATTERN = re.compile(r"^\s*select\s+(.+?)\s+where\s+id\s+in\s*\(([\d\s,]*)\)\s*$", re.IGNORECASE)
+SUBJECT_BY_DEPTH = ["test_plan", "test_plan_feature", "test_case_definition", "test_case"]
+STATUSES = ["open", "complete", "rejected", "future", "verified"]
+
+
+class StandinConfig:
+    """
+    Behaviour of the stand-in server.
+
+    Attributes:
+    fixtures_dir (Path): Directory with recorded fixtures.
+    latency_ms (float): Mean added latency per request.
+    jitter_ms (float): Uniform random +/- jitter around latency_ms.
+    error_rate (float): Fraction of requests answered with a transient error (503 with Retry-After, or 500).
+    payload_kb (float): Approximate size of the description/comments of synthesised articles.
+    query_size (int): Rows returned by synthesised queries.
+    link_fanout (int): Children per node in synthesised link trees.
+    tree_depth (int): Depth of synthesised link trees.
+    compress (bool): gzip response bodies for clients that send Accept-Encoding: gzip (like the real API).
+    max_rps (float): Server-side throttle: requests beyond this many per second get 429 with Retry-After (0: off).
+    seed (int): Seed for the error/latency random generator.
+    """
+
+    def __init__(self, fixtures_dir=DEFAULT_FIXTURES_DIR, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 payload_kb=4.0, query_size=200, link_fanout=3, tree_depth=3, max_rps=0.0, compress=True,
+                 seed=0):
+        self.fixtures_dir = Path(fixtures_dir)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.payload_kb = payload_kb
+        self.query_size = query_size
+        self.link_fanout = link_fanout
+        self.tree_depth = tree_depth
+        self.max_rps = max_rps
+        self.compress = compress
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.throttled_count = 0
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.request_count = 0
+
+
+def _stable_int(text, modulo):
+    return int(hashlib.sha1(str(text).encode()).hexdigest(), 16) % modulo
+
+
+def _filler_html(hsd_id, label, size_bytes):
+    sentence = (f"<p>{label} for {hsd_id}: the fuse sv.socket0.io0.fuses.punit_fuses.pcode_cfg_{_stable_int(hsd_id, 97)} "
+                f"changes from 0x{_stable_int(hsd_id, 16):x} to 0x{_stable_int(label + str(hsd_id), 255):x} "
+                f"after the post-silicon validation sighting was reproduced on the&nbsp;A0 stepping.</p>\n")
+    repeats = max(1, int(size_bytes) // len(sentence))
+    return "<div>" + sentence * repeats + "</div>"
+
+
+def _read_fixture(config, kind, item_id):
+    path = config.fixtures_dir / kind / f"{item_id}.json"
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None
+
+
+def synthesize_article(config, hsd_id):
+    hsd_id = str(hsd_id)
+    half = config.payload_kb * 1024 / 2
+    depth = _tree_depth(config, hsd_id)
+    return {
+        "id": hsd_id,
+        "title": f"[Stand-in] Sighting {hsd_id}: fuse configuration change request",
+        "description": _filler_html(hsd_id, "Description", half),
+        "comments": _filler_html(hsd_id, "Comment", half),
+        "forum_notes": f"Forum notes for {hsd_id}",
+        "status": STATUSES[_stable_int(hsd_id, len(STATUSES))],
+        "owner": f"user{_stable_int(hsd_id, 50)}",
+        "priority": f"p{_stable_int(hsd_id, 4) + 1}",
+        "subject": SUBJECT_BY_DEPTH[min(depth, len(SUBJECT_BY_DEPTH) - 1)],
+        "tenant": "server",
+        "from_subject": None,
+        "component": "fuses",
+        "updated_date": f"2024-01-{_stable_int(hsd_id, 28) + 1:02d} 12:00:00.000",
+    }
+
+
+def _tree_depth(config, hsd_id):
+    # Synthesised children of X are X1..X<fanout>, so depth is how many digits were appended to a 10-digit root
+    return max(0, len(str(hsd_id)) - 10)
+
+
+def get_article(config, hsd_id):
+    article = _read_fixture(config, "articles", hsd_id)
+    return article if article is not None else synthesize_article(config, hsd_id)
+
+
+def get_links(config, hsd_id):
+    links = _read_fixture(config, "links", hsd_id)
+    if links is not None:
+        return links
+    hsd_id = str(hsd_id)
+    depth = _tree_depth(config, hsd_id)
+    responses = []
+    if depth < config.tree_depth and depth + 1 < len(SUBJECT_BY_DEPTH):
+        for child in range(1, config.link_fanout + 1):
+            child_id = f"{hsd_id}{child}"
+            responses.append({"id": child_id, "parent_id": hsd_id, "relationship": "parent-child",
+                              "subject": SUBJECT_BY_DEPTH[depth + 1], "tenant": "server",
+                              "title": f"[Stand-in] {SUBJECT_BY_DEPTH[depth + 1]} {child_id}",
+                              "owner": f"user{_stable_int(child_id, 50)}", "status": "open"})
+    return {"responses": responses}
+
+
+def get_query_rows(config, query_id):
+    rows = _read_fixture(config, "queries", query_id)
+    if rows is not None:
+        return rows.get("data", rows) if isinstance(rows, dict) else rows
+    base = 1400000000 + _stable_int(query_id, 1000) * 100000
+    return [synthesize_article(config, base + i) for i in range(config.query_size)]
+
+
+def project(record, fields):
+    if not fields:
+        return record
+    return {field: record.get(field) for field in fields}
+
+
+def _parse_fields(query):
+    raw = query.get("fields", [""])[0]
+    fields = [field.strip() for field in raw.replace("%2C", ",").split(",") if field.strip()]
+    return fields or None
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API behind its load balancer
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, extra_headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if self.config.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate_network(self):
+        """Sleeps for the configured latency. Returns True if this request should fail."""
+        config = self.config
+        with config.random_lock:
+            config.request_count += 1
+            delay = config.latency_ms + config.random.uniform(-config.jitter_ms, config.jitter_ms)
+            fail = config.random.random() < config.error_rate
+            use_retry_after = config.random.random() < 0.5
+            throttled = False
+            if config.max_rps:
+                now = time.monotonic()
+                if now - config.window_start >= 1.0:
+                    config.window_start, config.window_count = now, 0
+                config.window_count += 1
+                throttled = config.window_count > config.max_rps
+                config.throttled_count += throttled
+        if throttled:
+            self._send_json(429, {"message": "Too many requests (stand-in)"}, {"Retry-After": "1"})
+            return True
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if fail:
+            if use_retry_after:
+                self._send_json(503, {"message": "Service unavailable (stand-in)"}, {"Retry-After": "1"})
+            else:
+                self._send_json(500, {"message": "Internal error (stand-in)"})
+        return fail
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+        if self._simulate_network():
+            return
+        fields = _parse_fields(query)
+
+        if len(parts) == 3 and parts[:2] == ["rest", "article"]:
+            self._send_json(200, {"data": [project(get_article(self.config, parts[2]), fields)]})
+        elif len(parts) == 4 and parts[:2] == ["rest", "article"] and parts[3] == "links":
+            links = get_links(self.config, parts[2])
+            self._send_json(200, {"responses": [project(link, fields) for link in links.get("responses", [])]})
+        elif len(parts) == 4 and parts[:3] == ["rest", "query", "execution"]:
+            rows = get_query_rows(self.config, parts[3])
+            start_at = int(query.get("start_at", ["1"])[0])
+            max_results = int(query.get("max_results", [str(len(rows))])[0])
+            page = rows[start_at - 1:start_at - 1 + max_results]
+            self._send_json(200, {"total": len(rows), "data": [project(row, fields) for row in page]})
+        else:
+            self._send_json(404, {"message": f"Unknown endpoint {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        if self._simulate_network():
+            return
+        if url.path.rstrip("/") != "/rest/query/execution/eql":
+            self._send_json(404, {"message": f"Unknown endpoint {url.path}"})
+            return
+        try:
+            eql = json.loads(body or b"{}").get("eql", "")
+        except ValueError:
+            eql = ""
+        # Only the "select <fields> where id in (...)" form used by connectors.hsd_bulk_fetcher is understood
+        match = ID_EQL_PATTERN.match(eql)
+        if match is None:
+            self._send_json(400, {"message": f"Unsupported EQL (stand-in): {eql[:200]}"})
+            return
+        fields = [field.strip() for field in match.group(1).split(",")]
+        fields = None if fields == ["*"] else fields
+        ids = [hsd_id.strip() for hsd_id in match.group(2).split(",") if hsd_id.strip()]
+        self._send_json(200, {"total": len(ids), "data": [project(get_article(self.config, hsd_id), fields)
+                                                          for hsd_id in ids]})
+
+
+def start_server(config, host="127.0.0.1", port=0):
+    """
+    Starts the stand-in server on a background thread.
+
+    Parameters:
+    config (StandinConfig): Server behaviour.
+    host (str): Interface to bind.
+    port (int): Port to bind, 0 for a free port.
+
+    Returns:
+    ThreadingHTTPServer: The running server. Its base URL is http://<host>:<server.server_port>; call
+    shutdown() to stop it.
+    """
+    handler = type("ConfiguredStandinHandler", (StandinHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="hsd-standin", daemon=True).start()
+    return server
+
+
+def record_fixtures(fixtures_dir, hsd_ids, query_ids, with_links):
+    """Records articles, links and query results from the live API into the fixtures directory."""
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from connectors.hsd_connector import HsdConnector
+
+    hsd_connector = HsdConnector(use_cache=False)
+    fixtures_dir = Path(fixtures_dir)
+    for kind in ("articles", "links", "queries"):
+        (fixtures_dir / kind).mkdir(parents=True, exist_ok=True)
+
+    def save(kind, item_id, payload):
+        with open(fixtures_dir / kind / f"{item_id}.json", 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=4, ensure_ascii=False)
+        print(f"  ✅ Recorded {kind[:-1]} {item_id}")
+
+    for hsd_id in hsd_ids:
+        article = hsd_connector.get_hsd(hsd_id)
+        if article is None:
+            print(f"  ❌ Could not fetch HSD {hsd_id}")
+            continue
+        save("articles", hsd_id, article)
+        if with_links:
+            links = hsd_connector.get_hsd_links(hsd_id)
+            if links is not None:
+                save("links", hsd_id, links)
+    for query_id in query_ids:
+        query_data = hsd_connector.fetch_query_data(query_id)
+        if query_data is None:
+            print(f"  ❌ Could not execute query {query_id}")
+            continue
+        save("queries", query_id, {"data": query_data["data"]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the HSD REST API")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Run the stand-in server")
+    serve.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    serve.add_argument("--fixtures", default=str(DEFAULT_FIXTURES_DIR), help="Recorded fixtures directory")
+    serve.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request in milliseconds")
+    serve.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- jitter around the latency")
+    serve.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail with 500/503")
+    serve.add_argument("--payload-kb", type=float, default=4.0, help="Size of synthesised article bodies in KB")
+    serve.add_argument("--query-size", type=int, default=200, help="Rows in synthesised query results")
+    serve.add_argument("--link-fanout", type=int, default=3, help="Children per node in synthesised link trees")
+    serve.add_argument("--tree-depth", type=int, default=3, help="Depth of synthesised link trees")
+    serve.add_argument("--no-compress", action="store_true", help="Never gzip responses")
+    serve.add_argument("--max-rps", type=float, default=0.0, help="Answer requests beyond this rate with 429 (0: off)")
+    serve.add_argument("--seed", type=int, default=0, help="Seed for latency jitter and error injection")
+
+    record = subparsers.add_parser("record", help="Record fixtures from the live HSD API (needs Kerberos)")
+    record.add_argument("--fixtures", default=str(DEFAULT_FIXTURES_DIR), help="Fixtures directory to write")
+    record.add_argument("--ids", nargs="*", default=[], help="HSD IDs to record")
+    record.add_argument("--query", nargs="*", default=[], help="Query IDs to record")
+    record.add_argument("--links", action="store_true", help="Also record the links of each HSD")
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        print(f"📼 Recording fixtures into {args.fixtures}")
+        record_fixtures(args.fixtures, args.ids, args.query, args.links)
+        return 0
+
+    config = StandinConfig(fixtures_dir=args.fixtures, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                           error_rate=args.error_rate, payload_kb=args.payload_kb, query_size=args.query_size,
+                           link_fanout=args.link_fanout, tree_depth=args.tree_depth, max_rps=args.max_rps,
+                           compress=not args.no_compress,
+                           seed=args.seed)
+    server = start_server(config, args.host, args.port)
+    print(f"🚀 HSD stand-in server listening on http://{args.host}:{server.server_port}")
+    print(f"   export HSD_API_BASE_URL=http://{args.host}:{server.server_port} HSD_API_AUTH=none")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\n🛑 Stopping ({config.request_count} requests served)")
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+# HTML-to-text for HSD rich-text fields (description, comments, forum notes), shared by the tree builder and the
+# prompt builders. The fastest installed parser is used: selectolax (lexbor), then lxml, then BeautifulSoup.
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+    import lxml.etree
+except ImportError:
+    lxml = None
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+# Distinct field values remembered by html_to_text(). HSD trees and query batches repeat the same descriptions and
+# comment threads (templates, copied text, re-runs), so a hit skips the parse entirely.
+DEFAULT_MEMO_SIZE = 4096
+# Values shorter than this are converted without touching the memo
+MIN_MEMO_LENGTH = 256
+# HSD fields that hold HTML
+HTML_FIELDS = ("description", "comments", "forum_notes", "sighting.forum_notes", "notes")
+
+_SKIP_TAGS = ("script", "style", "head", "title")
+# Line breaks are inserted as text before block-level closing tags and <br>, so every backend only has to
+# concatenate text nodes and still keeps paragraphs, list items and table rows apart
+_BLOCK_END = re.compile(r"(<br\b|</(?:p|div|li|tr|h[1-6]|table|ul|ol|pre|blockquote|dt|dd)\s*>)", re.IGNORECASE)
+_CELL_END = re.compile(r"</t[dh]\s*>", re.IGNORECASE)
+# Marks the end of a table cell until the text is extracted; str.strip() treats it as whitespace, so marks at the
+# start or end of a line disappear and only the ones between cells become " | "
+_CELL_MARK = "\x1f"
+_CELL_SEPARATOR = re.compile(r"\s*\x1f[\s\x1f]*")
+_INLINE_SPACE = re.compile(r"[ \t\f\v\xa0\u200b]+")
+_HTML_HINT = re.compile(r"<[a-zA-Z/!]|&[#a-zA-Z0-9]+;")
+
+
+def _text_selectolax(markup):
+    tree = LexborHTMLParser(markup)
+    tree.strip_tags(list(_SKIP_TAGS))
+    root = tree.body or tree.root
+    return root.text(deep=True, separator="", strip=False) if root is not None else ""
+
+
+def _text_lxml(markup):
+    try:
+        document = lxml.html.document_fromstring(markup)
+    except (lxml.etree.ParserError, ValueError):
+        return ""
+    lxml.etree.strip_elements(document, *_SKIP_TAGS, with_tail=False)
+    return document.text_content()
+
+
+def _text_bs4(markup):
+    soup = BeautifulSoup(markup, "html.parser")
+    for element in soup(_SKIP_TAGS):
+        element.decompose()
+    return soup.get_text()
+
+
+BACKENDS = OrderedDict((name, func) for name, func, available in (
+    ("selectolax", _text_selectolax, LexborHTMLParser is not None),
+    ("lxml", _text_lxml, lxml is not None),
+    ("bs4", _text_bs4, BeautifulSoup is not None),
+) if available)
+DEFAULT_BACKEND = next(iter(BACKENDS), None)
+
+
+def collapse_whitespace(text):
+    """
+    Collapses runs of spaces, drops blank lines and trims each line.
+    """
+    lines = (_INLINE_SPACE.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _convert(markup, backend):
+    if not _HTML_HINT.search(markup):
+        return collapse_whitespace(markup)
+    markup = _CELL_END.sub(lambda match: _CELL_MARK + match.group(0), markup)
+    markup = _BLOCK_END.sub(lambda match: "\n" + match.group(0), markup)
+    if backend is None:
+        raise RuntimeError("No HTML parser available: install selectolax, lxml or beautifulsoup4")
+    return _CELL_SEPARATOR.sub(" | ", collapse_whitespace(BACKENDS[backend](markup)))
+
+
+class _Memo:
+    """Thread-safe LRU of converted values, keyed by the content hash of the markup."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_memo = _Memo(DEFAULT_MEMO_SIZE)
+
+
+def html_to_text(markup, backend=None, memoize=True):
+    """
+    Converts an HSD HTML field to plain text: scripts/styles dropped, entities decoded, one line per paragraph,
+    list item or table row (cells separated by " | "), whitespace collapsed and blank lines removed.
+
+    Parameters:
+    markup (str): The HTML. None gives "". Plain text is only whitespace-collapsed.
+    backend (str): Parser to use, a key of BACKENDS (optional). Defaults to the fastest installed one.
+    memoize (bool): Look the value up in (and add it to) the content-hash LRU.
+
+    Returns:
+    str: The text.
+    """
+    if markup is None:
+        return ""
+    if not isinstance(markup, str):
+        markup = str(markup)
+    backend = backend or DEFAULT_BACKEND
+    if not memoize or len(markup) < MIN_MEMO_LENGTH:
+        return _convert(markup, backend)
+    key = (backend, hashlib.blake2b(markup.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+    text = _memo.get(key)
+    if text is None:
+        text = _convert(markup, backend)
+        _memo.put(key, text)
+    return text
+
+
+def strip_html_fields(records, fields=HTML_FIELDS):
+    """
+    Returns copies of HSD records with the HTML fields converted to text. Other fields are left untouched.
+
+    Parameters:
+    records (dict | list): An HSD record, a list of records, or a response/batch dict with the records under "data".
+    fields (tuple): Names of the fields to convert.
+
+    Returns:
+    The same shape as records.
+    """
+    if isinstance(records, list):
+        return [strip_html_fields(record, fields) for record in records]
+    if not isinstance(records, dict):
+        return records
+    if isinstance(records.get("data"), list):
+        return {**records, "data": strip_html_fields(records["data"], fields)}
+    return {key: html_to_text(value) if key in fields and isinstance(value, str) else value
+            for key, value in records.items()}
+
+
+def html_memo_stats():
+    """
+    Returns:
+    dict: hits, misses and entries of the html_to_text() memo.
+    """
+    with _memo._lock:
+        return {"hits": _memo.hits, "misses": _memo.misses, "entries": len(_memo._entries)}
+
+
+def clear_html_memo():
+    _memo.clear()
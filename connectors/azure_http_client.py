@@ -0,0 +1,79 @@
+import httpx
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+from connectors.transfer_stats import AZURE_TRANSFER_STATS
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2]). Without it the client stays on HTTP/1.1.
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+# Multiplex concurrent completions over one HTTP/2 connection to the APIM gateway (AZURE_HTTP2=off to disable)
+AZURE_HTTP2 = os.environ.get("AZURE_HTTP2", "on").lower() != "off"
+# Completions on large prompts can take minutes; connecting or waiting for a pooled connection should not
+AZURE_TIMEOUT = httpx.Timeout(connect=10.0, read=300.0, write=60.0, pool=60.0)
+AZURE_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=120.0)
+
+
+class CountingClient(httpx.Client):
+    """
+    httpx.Client that adds every response to AZURE_TRANSFER_STATS (bytes on the wire versus decoded). httpx
+    negotiates gzip/deflate (and br/zstd when brotli/zstandard are installed) and decodes transparently.
+    """
+
+    def send(self, request, *, stream=False, **kwargs):
+        response = super().send(request, stream=stream, **kwargs)
+        if stream:
+            _count_when_closed(response)
+        else:
+            _record(response, len(response.content))
+        return response
+
+
+def _record(response, decoded_bytes):
+    AZURE_TRANSFER_STATS.record(response.num_bytes_downloaded, decoded_bytes,
+                                compressed=bool(response.headers.get("Content-Encoding")))
+
+
+def _count_when_closed(response):
+    # Streamed completions are read through iter_bytes(); count what it yields and record once the response closes
+    decoded = [0]
+    iter_bytes = response.iter_bytes
+    close = response.close
+
+    def counting_iter_bytes(*args, **kwargs):
+        for chunk in iter_bytes(*args, **kwargs):
+            decoded[0] += len(chunk)
+            yield chunk
+
+    def counting_close():
+        if not response.is_closed:
+            _record(response, decoded[0])
+        close()
+
+    response.iter_bytes = counting_iter_bytes
+    response.close = counting_close
+
+
+def create_azure_http_client(http2=None, verify=False):
+    """
+    Creates the httpx client passed to AzureOpenAI(http_client=...): HTTP/2 when available, tuned connection
+    limits and timeouts, compressed responses and transfer accounting.
+
+    Parameters:
+    http2 (bool): Use HTTP/2 (optional). Defaults to AZURE_HTTP2 if the h2 package is installed.
+    verify (bool): TLS verification (disabled, same as the previous httpx.Client(verify=False)).
+
+    Returns:
+    httpx.Client: The client.
+    """
+    if http2 is None:
+        http2 = AZURE_HTTP2 and h2 is not None
+    elif http2 and h2 is None:
+        logger.warning("HTTP/2 requested for Azure OpenAI but the h2 package is not installed, using HTTP/1.1")
+        http2 = False
+    return CountingClient(verify=verify, http2=http2, timeout=AZURE_TIMEOUT, limits=AZURE_LIMITS)
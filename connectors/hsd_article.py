@@ -0,0 +1,167 @@
+import json
+import zlib
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+
+# Fields with their own slot. Everything else goes into a small per-article dict.
+SLOT_FIELDS = ("id", "title", "status", "owner", "priority", "subject", "tenant", "updated_date")
+# Enum-like fields: every article with the same value shares one string object
+INTERNED_FIELDS = frozenset(("status", "owner", "priority", "subject", "tenant", "from_subject", "component",
+                             "release", "sighting.status"))
+# Large HTML fields, kept zlib-compressed and decoded only when read
+TEXT_FIELDS = frozenset(("description", "comments", "forum_notes", "sighting.forum_notes", "notes"))
+# Text shorter than this is not worth compressing
+MIN_COMPRESS_LENGTH = 512
+# Fast level: HSD HTML is repetitive and compresses well even at level 1
+COMPRESS_LEVEL = 1
+
+_MISSING = object()
+# Field name tuples shared by all articles with the same fields (usually all of a query)
+_key_tuples = {}
+
+
+class _Compressed:
+    __slots__ = ("blob",)
+
+    def __init__(self, text):
+        self.blob = zlib.compress(text.encode("utf-8", "surrogatepass"), COMPRESS_LEVEL)
+
+    def decode(self):
+        return zlib.decompress(self.blob).decode("utf-8", "surrogatepass")
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class HsdArticle:
+    """
+    Compact in-memory form of one HSD record. The common fields live in slots, enum-like values (status, owner,
+    tenant, subject, ...) are interned and large HTML fields are stored compressed and decoded on access, so
+    holding tens of thousands of articles costs a fraction of the equivalent dicts.
+
+    Read it like a read-only dict (article["status"], article.get("comments"), article.keys()) or convert it back
+    with to_record(). Field order is preserved.
+
+    Parameters:
+    record (dict): An HSD record as returned by the API.
+    """
+
+    __slots__ = SLOT_FIELDS + ("_keys", "_extra")
+
+    def __init__(self, record):
+        keys = tuple(record)
+        self._keys = _key_tuples.setdefault(keys, keys)
+        self._extra = None
+        for field in SLOT_FIELDS:
+            setattr(self, field, _MISSING)
+        for field, value in record.items():
+            if field in INTERNED_FIELDS:
+                value = _intern(value)
+            elif field in TEXT_FIELDS and isinstance(value, str) and len(value) >= MIN_COMPRESS_LENGTH:
+                value = _Compressed(value)
+            if field in SLOT_FIELDS and not isinstance(value, _Compressed):
+                setattr(self, field, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[sys.intern(field)] = value
+
+    @classmethod
+    def from_record(cls, record):
+        return record if isinstance(record, cls) else cls(record)
+
+    def _value(self, field):
+        if field in SLOT_FIELDS:
+            value = getattr(self, field)
+            if value is not _MISSING:
+                return value
+        if self._extra is not None and field in self._extra:
+            value = self._extra[field]
+            return value.decode() if isinstance(value, _Compressed) else value
+        return _MISSING
+
+    def __getitem__(self, field):
+        value = self._value(field)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+
+    def get(self, field, default=None):
+        value = self._value(field)
+        return default if value is _MISSING else value
+
+    def __contains__(self, field):
+        return field in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def keys(self):
+        return self._keys
+
+    def items(self):
+        return ((field, self[field]) for field in self._keys)
+
+    def to_record(self):
+        """
+        Returns:
+        dict: The original record (text fields decoded).
+        """
+        return {field: self[field] for field in self._keys}
+
+    def __repr__(self):
+        return f"HsdArticle(id={self.get('id')!r}, status={self.get('status')!r})"
+
+
+def compact_records(records):
+    """
+    Converts HSD records to HsdArticle.
+
+    Parameters:
+    records (list | dict): A list of records, or a response/batch dict with the records under "data".
+
+    Returns:
+    list: HsdArticle per record. Entries that are not dicts are skipped.
+    """
+    if isinstance(records, dict):
+        records = records.get("data", [])
+    return [HsdArticle.from_record(record) for record in records if isinstance(record, (dict, HsdArticle))]
+
+
+def compact_hsd(data):
+    """
+    Returns an HSD record as HsdArticle. Anything else (None, error strings) is returned unchanged.
+    """
+    return HsdArticle(data) if isinstance(data, dict) else data
+
+
+def load_articles(path):
+    """
+    Reads a batch file ({"data": [...]}, see fetch_hsd_batches) into HsdArticle objects. Only one file's dicts are
+    alive at a time, so loading many batches keeps only the compact form in memory.
+
+    Returns:
+    list: The articles, or None if the file does not hold a {"data": [...]} batch.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("data"), list):
+        return None
+    return compact_records(data["data"])
+
+
+def load_batch_articles(paths):
+    """
+    Reads several batch files into one list of HsdArticle. Unreadable files are logged and skipped.
+    """
+    articles = []
+    for path in paths:
+        try:
+            articles.extend(load_articles(path) or [])
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read batch file {path}: {e}")
+    return articles
@@ -0,0 +1,294 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+from connectors.hsd_session import get_shared_session, ARTICLE_URL
+from connectors.hsd_retry import call_with_retry, HsdFatalError
+from connectors.hsd_rate_limiter import HSD_RATE_LIMITER
+from connectors.hsd_bulk_fetcher import fetch_chunk_or_none, bulk_enabled, chunk_size_for, BULK_MIN_IDS
+from connectors.hsd_cache import get_default_cache, with_updated_date, strip_updated_date, REVALIDATE_FIELDS
+from connectors.hsd_search_index import index_fetched
+from connectors.llm_token_budget import pack_by_tokens
+from connectors.llm_prompt_payload import record_tokens
+
+# Maximum number of article requests in flight at once. Kept moderate so a large query does not flood the API.
+DEFAULT_MAX_CONCURRENCY = 16
+# fetch_hsd_batches() keeps about this many multiples of max_concurrency articles in memory at once
+WINDOW_FACTOR = 4
+
+
+class ArticleResult:
+    """
+    Outcome of fetching one HSD article. Exactly one of data/error is meaningful.
+
+    Attributes:
+    hsd_id (str): The requested HSD ID.
+    data (list): The article records returned in the "data" key of the response (usually one).
+    error (str): Error message if the fetch failed or the response had no "data".
+    """
+
+    def __init__(self, hsd_id, data=None, error=None):
+        self.hsd_id = hsd_id
+        self.data = data if data is not None else []
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _article_url(hsd_id, fields=None):
+    req = ARTICLE_URL + str(hsd_id)
+    if fields is not None:
+        req += "?fields=" + "%2C%20".join(fields)
+    return req
+
+
+def _fetch_article_blocking(session, hsd_id, fields, policy):
+    req = _article_url(hsd_id, fields)
+    headers = {'Content-type': 'application/json'}
+
+    def fetch():
+        response = session.get(req, headers=headers)
+        response.raise_for_status()
+        response_data = response.json()
+        if "data" not in response_data:
+            raise HsdFatalError(f"No data found for HSD ID: {hsd_id}")
+        data = response_data["data"]
+        return data if isinstance(data, list) else [data]
+
+    try:
+        return ArticleResult(hsd_id, data=call_with_retry(fetch, description=f"HSD {hsd_id} fetch", policy=policy))
+    except HsdFatalError as e:
+        return ArticleResult(hsd_id, error=str(e))
+    except Exception as e:
+        return ArticleResult(hsd_id, error=f"Failed to fetch data for HSD ID: {hsd_id} ({e})")
+
+
+async def _fetch_uncached(hsd_ids, fields, max_concurrency, session, policy, bulk=True):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    loop = asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="hsd-fetch") as executor:
+        async def fetch(hsd_id):
+            async with semaphore:
+                try:
+                    return await loop.run_in_executor(executor, _fetch_article_blocking, session, hsd_id, fields, policy)
+                except Exception as e:
+                    return ArticleResult(hsd_id, error=str(e))
+
+        async def fetch_chunk(chunk):
+            async with semaphore:
+                records = await loop.run_in_executor(executor, fetch_chunk_or_none, session, chunk, fields, policy)
+            # IDs the query did not return (or the whole chunk, if the query failed) are fetched one by one,
+            # which also gives them the usual per-HSD error message
+            records = records or {}
+            missing = [hsd_id for hsd_id in chunk if str(hsd_id) not in records]
+            fetched = dict(zip(missing, await asyncio.gather(*(fetch(hsd_id) for hsd_id in missing))))
+            return [ArticleResult(hsd_id, data=[records[str(hsd_id)]]) if str(hsd_id) in records else fetched[hsd_id]
+                    for hsd_id in chunk]
+
+        if not (bulk and fields is not None and len(hsd_ids) >= BULK_MIN_IDS and bulk_enabled(fields)):
+            return await asyncio.gather(*(fetch(hsd_id) for hsd_id in hsd_ids))
+
+        unique_ids = list(dict.fromkeys(hsd_ids))
+        chunk_size = chunk_size_for(fields)
+        chunks = [unique_ids[start:start + chunk_size] for start in range(0, len(unique_ids), chunk_size)]
+        results = {}
+        for chunk_results in await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)):
+            results.update((result.hsd_id, result) for result in chunk_results)
+        logger.debug(f"Fetched {len(unique_ids)} HSDs with {len(chunks)} bulk queries")
+        return [results[hsd_id] for hsd_id in hsd_ids]
+
+
+async def _fetch_cached(hsd_ids, fields, max_concurrency, session, policy, cache, bulk):
+    unique_ids = list(dict.fromkeys(hsd_ids))
+    cached = cache.get_many(unique_ids, fields)
+    results = {}
+
+    # Revalidate cached entries with a cheap id,updated_date request and keep the ones that did not change
+    cached_ids = [hsd_id for hsd_id in unique_ids if str(hsd_id) in cached]
+    if cached_ids:
+        stamps = await _fetch_uncached(cached_ids, REVALIDATE_FIELDS, max_concurrency, session, policy, bulk)
+        unchanged = []
+        for stamp in stamps:
+            entry = cached[str(stamp.hsd_id)]
+            if stamp.ok and stamp.data and entry.updated_date is not None \
+                    and stamp.data[0].get("updated_date") == entry.updated_date:
+                results[stamp.hsd_id] = ArticleResult(stamp.hsd_id, data=strip_updated_date(entry.data, fields))
+                unchanged.append(stamp.hsd_id)
+        cache.touch(unchanged, fields)
+
+    to_fetch = [hsd_id for hsd_id in unique_ids if hsd_id not in results]
+    fetched = await _fetch_uncached(to_fetch, with_updated_date(fields), max_concurrency, session, policy, bulk)
+    cache.put_many(((result.hsd_id, result.data) for result in fetched if result.ok), fields)
+    for result in fetched:
+        if result.ok:
+            result.data = strip_updated_date(result.data, fields)
+        elif str(result.hsd_id) in cached:
+            # The API is failing for this article; a possibly outdated copy beats no data
+            logger.warning(f"Serving cached copy of HSD {result.hsd_id}: {result.error}")
+            result = ArticleResult(result.hsd_id, data=strip_updated_date(cached[str(result.hsd_id)].data, fields))
+        results[result.hsd_id] = result
+
+    logger.info(f"HSD article cache: {len(hsd_ids) - len(to_fetch)} served from cache, {len(to_fetch)} fetched")
+    return [results[hsd_id] for hsd_id in hsd_ids]
+
+
+async def fetch_articles_async(hsd_ids, fields=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, session=None,
+                               policy=None, cache=None, bulk=True):
+    """
+    Fetches many HSD articles concurrently with at most max_concurrency requests in flight.
+
+    The requests go through the shared pooled Kerberos session (see connectors.hsd_session), driven from a
+    bounded worker pool, so the connection reuse and auth caching of the session apply to every fetch.
+
+    Parameters:
+    hsd_ids (list): HSD IDs to fetch.
+    fields (List<str>): fields to include in the response (optional). If not defined, returns all fields.
+    max_concurrency (int): Maximum number of concurrent requests.
+    session (requests.Session): Session to use (optional). Defaults to the shared HSD session.
+    policy (RetryPolicy): Retry policy per HSD (optional). Defaults to the shared policy in connectors.hsd_retry.
+    cache (HsdArticleCache): Article cache (optional). If given, cached articles are revalidated against their
+    updated_date and only new or changed articles are fetched in full.
+    bulk (bool): When fields are given and at least BULK_MIN_IDS IDs are requested, fetch them in chunks with one
+    EQL query execution per chunk instead of one request per article (see connectors.hsd_bulk_fetcher).
+
+    Returns:
+    list: One ArticleResult per input ID, in the same order as hsd_ids. A failing ID never affects the others.
+    The fetched articles are added to the local search index.
+    """
+    if session is None:
+        session = get_shared_session(max_concurrency)
+    if cache is None:
+        results = await _fetch_uncached(hsd_ids, fields, max_concurrency, session, policy, bulk)
+    else:
+        results = await _fetch_cached(hsd_ids, fields, max_concurrency, session, policy, cache, bulk)
+    # Everything fetched becomes searchable locally (see connectors.hsd_search_index)
+    index_fetched(record for result in results if result.ok for record in result.data)
+    return results
+
+
+def fetch_articles(hsd_ids, **kwargs):
+    """
+    Synchronous entry point for fetch_articles_async(). Accepts the same keyword arguments.
+
+    Returns:
+    list: One ArticleResult per input ID, in input order.
+    """
+    coroutine = fetch_articles_async(hsd_ids, **kwargs)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Called from inside a running event loop: drive the fetch on a helper thread with its own loop
+    with ThreadPoolExecutor(max_workers=1) as runner:
+        return runner.submit(asyncio.run, coroutine).result()
+
+
+def fetch_hsd_batches(hsd_ids, batch_size=8, fields=None, get_batch_file_path=Path,
+                      max_concurrency=DEFAULT_MAX_CONCURRENCY, use_cache=True, token_budget=None):
+    """
+    Fetches the HSDs concurrently and saves them in batches, each to its own JSON file using the existing
+    hsd_batch_<n>_of_<total>_<count>hsds_<timestamp>.json layout. Batches are written as soon as their window
+    of articles has been fetched, so memory use does not grow with the number of HSDs.
+
+    Parameters:
+    hsd_ids (list): List of HSD IDs to fetch information for.
+    batch_size (int): Number of HSDs per batch file. With token_budget, the maximum number of HSDs per batch.
+    fields (List<str>): fields to include in the response, list of strings (optional).
+    get_batch_file_path (callable): Maps a batch file name to the path it is written to.
+    max_concurrency (int): Maximum number of concurrent article requests.
+    use_cache (bool): Serve unchanged articles from the on-disk article cache (see connectors.hsd_cache).
+    token_budget (int): Pack the HSDs into batches of at most this many tokens of HSD data instead of fixed slices
+        of batch_size (optional, see connectors.llm_token_budget).
+
+    Returns:
+    list: List of JSON file paths containing batch data
+    """
+    if not hsd_ids or not isinstance(hsd_ids, list):
+        raise ValueError("hsd_ids must be a non-empty list")
+
+    print(f"📊 Fetching {len(hsd_ids)} HSDs with up to {max_concurrency} concurrent requests...")
+    cache = get_default_cache() if use_cache else None
+
+    batch_files = []
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    if token_budget:
+        # The number of batches is only known once every HSD has been measured: files get their final
+        # "_of_<total>" name at the end
+        total_batches = None
+        print(f"📊 Packing {len(hsd_ids)} HSDs into batches of up to {token_budget} tokens "
+              f"and {batch_size} HSDs each...")
+    else:
+        total_batches = (len(hsd_ids) + batch_size - 1) // batch_size
+        print(f"📊 Processing {len(hsd_ids)} HSDs in {total_batches} batches of {batch_size} HSDs each...")
+
+    # Fetch a window of whole batches at a time and write them out before fetching the next window, so memory
+    # holds at most one window of articles however many HSDs the query has
+    window = batch_size * max(1, -(-max_concurrency * WINDOW_FACTOR // batch_size))
+    batch_counts = []
+    for window_start in range(0, len(hsd_ids), window):
+        results = fetch_articles(hsd_ids[window_start:window_start + window], fields=fields,
+                                 max_concurrency=max_concurrency, cache=cache)
+        if token_budget:
+            sizes = [sum(record_tokens(record) for record in result.data) for result in results]
+            groups = [([results[index] for index in members], sum(sizes[index] for index in members))
+                      for members in pack_by_tokens(sizes, token_budget, max_items=batch_size)]
+        else:
+            groups = [(results[offset:offset + batch_size], None) for offset in range(0, len(results), batch_size)]
+
+        for batch_results, batch_tokens in groups:
+            batch_num = len(batch_files) + 1
+            batch_file = f"hsd_batch_{batch_num}_of_{total_batches or 'n'}_{len(batch_results)}hsds_{timestamp}.json"
+            full_batch_path = get_batch_file_path(batch_file)
+
+            batch_data = {"data": []}
+            successful_count = 0
+            failed_count = 0
+            for result in batch_results:
+                if result.ok:
+                    batch_data["data"].extend(result.data)
+                    successful_count += 1
+                else:
+                    print(f"    ✗ {result.error}")
+                    failed_count += 1
+
+            with open(full_batch_path, 'w', encoding='utf-8') as f:
+                json.dump(batch_data, f, indent=4, ensure_ascii=False)
+
+            batch_files.append(str(full_batch_path))
+            batch_counts.append(len(batch_results))
+
+            print(f"  ✅ Batch {batch_num} complete:")
+            print(f"    • Successful: {successful_count}")
+            print(f"    • Failed: {failed_count}")
+            print(f"    • HSDs with content: {len(batch_data['data'])}")
+            if batch_tokens is not None:
+                print(f"    • Estimated tokens of HSD data: {batch_tokens}")
+            else:
+                print(f"    • Saved to: '{full_batch_path}'")
+
+    if total_batches is None:
+        total_batches = len(batch_files)
+        for index, (path, count) in enumerate(zip(batch_files, batch_counts)):
+            final_path = str(get_batch_file_path(
+                f"hsd_batch_{index + 1}_of_{total_batches}_{count}hsds_{timestamp}.json"))
+            os.replace(path, final_path)
+            batch_files[index] = final_path
+            print(f"  • Batch {index + 1} saved to: '{final_path}'")
+
+    print(f"\n📊 All Batches Complete:")
+    print(f"  • Total batches: {total_batches}")
+    print(f"  • Batch files created: {len(batch_files)}")
+    limiter_stats = HSD_RATE_LIMITER.log_stats()
+    print(f"  • Time waiting for the HSD rate limiter: {limiter_stats['wait_seconds']:.1f}s "
+          f"({limiter_stats['throttled']} throttled responses)")
+
+    return batch_files
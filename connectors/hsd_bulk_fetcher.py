@@ -0,0 +1,147 @@
+import threading
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+from connectors.hsd_session import EQL_EXECUTION_URL
+from connectors.hsd_cache import fields_key
+from connectors.hsd_retry import call_with_retry, HsdFatalError
+
+# Requests for fewer IDs than this go to /rest/article/{id} one by one: a single bulk query is not worth it and
+# the per-article path reports missing/forbidden HSDs individually
+BULK_MIN_IDS = 5
+# IDs per bulk query. The ID list travels in a POST body, so the limit is the response size: articles with the
+# long text fields (description, comments, ...) are a few KB to a few hundred KB each
+BULK_CHUNK_SIZE = 100
+# Chunk size when only short fields are requested (e.g. the id,updated_date cache revalidation)
+LIGHT_BULK_CHUNK_SIZE = 1000
+LONG_TEXT_FIELDS = {"description", "comments", "forum_notes", "sighting.forum_notes", "notes"}
+# Statuses meaning the EQL execution endpoint itself is not available
+ENDPOINT_MISSING_STATUSES = (404, 405, 501)
+
+# Set to False the first time the API reports the bulk query endpoint missing, so the rest of the process goes
+# straight to per-article requests
+_bulk_supported = True
+# fields_key() of the field lists whose bulk query the API rejected as invalid (HTTP 400, e.g. a field EQL does
+# not accept). Only those field lists fall back to per-article requests.
+_rejected_fields = set()
+_bulk_supported_lock = threading.Lock()
+
+
+class BulkQueryRejected(HsdFatalError):
+    """
+    The API rejected a bulk query statement (HTTP 400) while the endpoint itself is available.
+    """
+
+
+def bulk_enabled(fields=None):
+    """
+    Returns True if bulk queries may be used, for the given field list if one is passed.
+    """
+    if fields is not None and fields_key(fields) in _rejected_fields:
+        return False
+    return _bulk_supported and os.environ.get("HSD_BULK_FETCH", "on").lower() != "off"
+
+
+def _disable_bulk(reason):
+    global _bulk_supported
+    with _bulk_supported_lock:
+        if _bulk_supported:
+            logger.warning(f"HSD bulk fetch disabled for this process, falling back to per-article requests: {reason}")
+        _bulk_supported = False
+
+
+def _reject_fields(fields, reason):
+    key = fields_key(fields)
+    with _bulk_supported_lock:
+        if key not in _rejected_fields:
+            logger.warning(f"HSD bulk fetch of fields {key} rejected, fetching them per article: {reason}")
+        _rejected_fields.add(key)
+
+
+def chunk_size_for(fields):
+    """
+    Returns the number of IDs per bulk query for a field list.
+    """
+    if fields is not None and not LONG_TEXT_FIELDS.intersection(fields):
+        return LIGHT_BULK_CHUNK_SIZE
+    return BULK_CHUNK_SIZE
+
+
+def build_id_eql(hsd_ids, fields):
+    """
+    Builds the EQL statement selecting the given fields of the given HSD IDs.
+
+    Raises:
+    ValueError: If an ID is not numeric (IDs are inlined in the statement).
+    """
+    ids = [str(hsd_id).strip() for hsd_id in hsd_ids]
+    for hsd_id in ids:
+        if not hsd_id.isdigit():
+            raise ValueError(f"Invalid HSD ID for bulk fetch: {hsd_id!r}")
+    return f"select {', '.join(fields)} where id in ({', '.join(ids)})"
+
+
+def fetch_chunk_blocking(session, hsd_ids, fields, policy=None):
+    """
+    Fetches one chunk of HSD articles with a single EQL query execution.
+
+    Parameters:
+    session (requests.Session): The HSD session.
+    hsd_ids (list): HSD IDs of the chunk (at most chunk_size_for(fields)).
+    fields (List<str>): fields to include for each article. "id" is always added.
+    policy (RetryPolicy): Retry policy (optional).
+
+    Returns:
+    dict: HSD ID (str) -> article record, for the IDs the API returned. IDs the query did not return are absent.
+
+    Raises:
+    BulkQueryRejected: If the API rejects the statement (HTTP 400).
+    HsdFatalError: If the bulk query endpoint is not available or its response is unusable (the caller should fall
+    back to per-article requests).
+    The last transient error if all attempts fail.
+    """
+    drop_id = "id" not in fields
+    fields = ["id"] + list(fields) if drop_id else list(fields)
+    body = {"eql": build_id_eql(hsd_ids, fields)}
+    req = f"{EQL_EXECUTION_URL}?start_at=1&max_results={len(hsd_ids)}"
+    headers = {'Content-type': 'application/json'}
+
+    def fetch():
+        response = session.post(req, json=body, headers=headers)
+        if response.status_code == 400:
+            raise BulkQueryRejected(f"Bulk query rejected with HTTP 400: {response.text[:200]}")
+        if response.status_code in ENDPOINT_MISSING_STATUSES:
+            raise HsdFatalError(f"Bulk query rejected with HTTP {response.status_code}")
+        response.raise_for_status()
+        response_data = response.json()
+        if "data" not in response_data:
+            raise HsdFatalError("Could not find \"data\" in bulk query response")
+        return response_data["data"]
+
+    records = call_with_retry(fetch, description=f"bulk fetch of {len(hsd_ids)} HSDs", policy=policy)
+    articles = {}
+    for record in records:
+        hsd_id = str(record.get("id"))
+        if drop_id:
+            record.pop("id", None)
+        articles[hsd_id] = record
+    return articles
+
+
+def fetch_chunk_or_none(session, hsd_ids, fields, policy=None):
+    """
+    Same as fetch_chunk_blocking() but returns None instead of raising, so the caller can fetch the chunk
+    article by article. A rejected statement stops bulk fetching of that field list; a missing endpoint stops
+    bulk fetching for the rest of the process.
+    """
+    try:
+        return fetch_chunk_blocking(session, hsd_ids, fields, policy)
+    except BulkQueryRejected as e:
+        _reject_fields(fields, e)
+    except HsdFatalError as e:
+        _disable_bulk(e)
+    except Exception as e:
+        logger.warning(f"Bulk fetch of {len(hsd_ids)} HSDs failed ({e}), fetching them one by one")
+    return None
@@ -0,0 +1,227 @@
+import json
+import sqlite3
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+
+# Cache location. Override with the HSD_CACHE_PATH environment variable, or set HSD_CACHE=off to disable the cache.
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.hsd_cache', 'hsd_articles.sqlite3')
+# Entries older than this are dropped even if the article did not change. Longer than a week so a weekly query
+# re-run still finds last week's articles.
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50000
+# Field used to detect whether a cached article changed on the server
+UPDATED_DATE_FIELD = "updated_date"
+REVALIDATE_FIELDS = ["id", UPDATED_DATE_FIELD]
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def fields_key(fields):
+    """
+    Normalises a field list into the cache key component. None (all fields) maps to "*".
+    """
+    if fields is None:
+        return "*"
+    return ",".join(sorted(set(fields)))
+
+
+def with_updated_date(fields):
+    """
+    Returns the field list to request so the response carries updated_date (needed to revalidate the entry later).
+    """
+    if fields is None or UPDATED_DATE_FIELD in fields:
+        return fields
+    return list(fields) + [UPDATED_DATE_FIELD]
+
+
+def strip_updated_date(records, fields):
+    """
+    Removes updated_date from records if the caller did not ask for it, so cached and uncached results look the same.
+    """
+    if fields is None or UPDATED_DATE_FIELD in fields:
+        return records
+    return [{k: v for k, v in record.items() if k != UPDATED_DATE_FIELD} for record in records]
+
+
+class CacheEntry:
+    """
+    One cached article.
+
+    Attributes:
+    hsd_id (str): The HSD ID.
+    data (list): The article records (the "data" list of the API response).
+    updated_date (str): The article's updated_date when it was fetched, used for revalidation.
+    fetched_at (float): Unix time the entry was stored.
+    """
+
+    def __init__(self, hsd_id, data, updated_date, fetched_at):
+        self.hsd_id = hsd_id
+        self.data = data
+        self.updated_date = updated_date
+        self.fetched_at = fetched_at
+
+
+class HsdArticleCache:
+    """
+    SQLite backed on-disk cache of HSD articles keyed by (HSD ID, field set).
+
+    Entries are not served blindly: callers revalidate them against the article's current updated_date (a cheap
+    fields=id,updated_date request) and only refetch articles that changed. Entries older than ttl_seconds are
+    evicted, and the least recently used entries are evicted once the cache holds more than max_entries.
+
+    Parameters:
+    path (str): Path of the SQLite database file. Created if missing.
+    ttl_seconds (float): Maximum age of an entry.
+    max_entries (int): Maximum number of entries kept.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # The fetch engine reads and writes from worker threads, access is serialised with self._lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS articles ("
+                " hsd_id TEXT NOT NULL,"
+                " fields_key TEXT NOT NULL,"
+                " payload TEXT NOT NULL,"
+                " updated_date TEXT,"
+                " fetched_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (hsd_id, fields_key))")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_accessed ON articles (accessed_at)")
+        self.evict()
+
+    def get(self, hsd_id, fields=None):
+        """
+        Returns the cached entry for (hsd_id, fields), or None if missing or expired.
+        """
+        return self.get_many([hsd_id], fields).get(str(hsd_id))
+
+    def get_many(self, hsd_ids, fields=None):
+        """
+        Looks up several articles with the same field set.
+
+        Returns:
+        dict: HSD ID (str) -> CacheEntry for every ID that has a live entry.
+        """
+        key = fields_key(fields)
+        ids = list(dict.fromkeys(str(hsd_id) for hsd_id in hsd_ids))
+        oldest = time.time() - self.ttl_seconds
+        entries = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT hsd_id, payload, updated_date, fetched_at FROM articles"
+                    f" WHERE fields_key = ? AND fetched_at >= ? AND hsd_id IN ({','.join('?' * len(chunk))})",
+                    [key, oldest] + chunk).fetchall()
+                for hsd_id, payload, updated_date, fetched_at in rows:
+                    entries[hsd_id] = CacheEntry(hsd_id, json.loads(payload), updated_date, fetched_at)
+        return entries
+
+    def put(self, hsd_id, fields, data):
+        """
+        Stores an article. data is the "data" list of the API response and should include updated_date.
+        """
+        self.put_many([(hsd_id, data)], fields)
+
+    def put_many(self, items, fields=None):
+        """
+        Stores several articles fetched with the same field set.
+
+        Parameters:
+        items (iterable): (hsd_id, data) pairs.
+        fields (List<str>): The field set the articles were requested with (None for all fields).
+        """
+        key = fields_key(fields)
+        now = time.time()
+        rows = []
+        for hsd_id, data in items:
+            updated_date = data[0].get(UPDATED_DATE_FIELD) if data else None
+            rows.append((str(hsd_id), key, json.dumps(data, ensure_ascii=False), updated_date, now, now))
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.evict()
+
+    def touch(self, hsd_ids, fields=None):
+        """
+        Marks entries as used (for LRU eviction) after they were revalidated and served.
+        """
+        key = fields_key(fields)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE articles SET accessed_at = ? WHERE hsd_id = ? AND fields_key = ?",
+                                   [(now, str(hsd_id), key) for hsd_id in hsd_ids])
+
+    def invalidate(self, hsd_id):
+        """
+        Drops every cached field set of an article.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM articles WHERE hsd_id = ?", (str(hsd_id),))
+
+    def evict(self):
+        """
+        Drops expired entries, then the least recently used ones beyond max_entries.
+
+        Returns:
+        int: Number of entries removed.
+        """
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM articles WHERE fetched_at < ?",
+                                         (time.time() - self.ttl_seconds,)).rowcount
+            excess = self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0] - self.max_entries
+            if excess > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM articles WHERE rowid IN"
+                    " (SELECT rowid FROM articles ORDER BY accessed_at LIMIT ?)", (excess,)).rowcount
+        if removed:
+            logger.info(f"Evicted {removed} entries from the HSD article cache")
+        return removed
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM articles")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_default_cache():
+    """
+    Returns the process-wide article cache, or None if caching is disabled with HSD_CACHE=off.
+    """
+    global _default_cache
+    if os.environ.get("HSD_CACHE", "").lower() in ("off", "0", "false", "no"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            path = os.environ.get("HSD_CACHE_PATH", DEFAULT_CACHE_PATH)
+            try:
+                _default_cache = HsdArticleCache(path)
+                logger.info(f"Using HSD article cache at {os.path.abspath(path)}")
+            except sqlite3.Error as e:
+                logger.warning(f"Could not open HSD article cache at {path}, caching disabled: {e}")
+                return None
+        return _default_cache
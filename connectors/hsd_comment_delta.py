@@ -0,0 +1,245 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+from common.html_text import html_to_text
+
+# Store location. Override with the HSD_DELTA_PATH environment variable, or set HSD_DELTA=off to always send the
+# full comment history.
+DEFAULT_DELTA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.hsd_cache', 'hsd_comment_delta.sqlite3')
+# Analyses older than this are forgotten and the HSD is analysed from its full history again
+DEFAULT_DELTA_TTL_SECONDS = 90 * 24 * 3600
+# Thread fields that grow over the life of a sighting; only their new entries are sent for an HSD analysed before
+THREAD_FIELDS = ("comments", "forum_notes", "sighting.forum_notes")
+# Fields that are sent again only when they changed since the previous analysis
+STABLE_FIELDS = ("description",)
+# HSD starts every comment with a "++++<timestamp> <idsid>" header line. Fields without headers are split into lines.
+_COMMENT_HEADER = re.compile(r"^(?=\+{4}\d+\s)", re.MULTILINE)
+_JSON_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+DELTA_INSTRUCTIONS = """
+Some HSDs were analysed in an earlier run. Those carry "previous_summary" (the earlier analysis) and only the
+comments and forum notes added since then ("new_comments", "new_forum_notes"); "description" is included only if it
+changed. Update the previous summary with the new information and keep it as is where nothing changed. Still report
+every HSD in the required format."""
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def prompt_key(*prompts):
+    """
+    Identifies the prompts a summary was produced with. Summaries are only reused for the same prompts.
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    for prompt in prompts:
+        digest.update((prompt or "").encode("utf-8", "surrogatepass") + b"\0")
+    return digest.hexdigest()
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=12).hexdigest()
+
+
+def split_thread(value):
+    """
+    Splits a comments/forum notes field into its entries (text, one per comment).
+    """
+    text = html_to_text(value) if isinstance(value, str) else ""
+    if _COMMENT_HEADER.search(text):
+        entries = _COMMENT_HEADER.split(text)
+    else:
+        entries = text.splitlines()
+    return [entry.strip() for entry in entries if entry.strip()]
+
+
+class PendingAnalysis:
+    """
+    What was sent for one HSD, recorded once the model's summary for it is known.
+    """
+
+    def __init__(self, hsd_id, thread_hashes, stable_hashes):
+        self.hsd_id = hsd_id
+        self.thread_hashes = thread_hashes
+        self.stable_hashes = stable_hashes
+
+
+class CommentDeltaStore:
+    """
+    SQLite backed record of the HSDs already analysed with a given prompt: the summary the model returned and hashes
+    of the comment entries and descriptions it saw. A re-run then sends the previous summary plus only the new
+    entries for HSDs that were analysed before.
+
+    Parameters:
+    path (str): Path of the SQLite database file. Created if missing.
+    ttl_seconds (float): Analyses older than this are ignored.
+    """
+
+    def __init__(self, path=DEFAULT_DELTA_PATH, ttl_seconds=DEFAULT_DELTA_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                " hsd_id TEXT NOT NULL,"
+                " prompt_key TEXT NOT NULL,"
+                " summary TEXT NOT NULL,"
+                " seen TEXT NOT NULL,"
+                " analysed_at REAL NOT NULL,"
+                " PRIMARY KEY (hsd_id, prompt_key))")
+            self._conn.execute("DELETE FROM analyses WHERE analysed_at < ?", (time.time() - ttl_seconds,))
+
+    def get_many(self, hsd_ids, key):
+        """
+        Returns:
+        dict: HSD ID -> {"summary": ..., "seen": {field: [hashes]}} for the HSDs analysed before with prompt key.
+        """
+        ids = list(dict.fromkeys(str(hsd_id) for hsd_id in hsd_ids))
+        oldest = time.time() - self.ttl_seconds
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT hsd_id, summary, seen FROM analyses"
+                    f" WHERE prompt_key = ? AND analysed_at >= ? AND hsd_id IN ({','.join('?' * len(chunk))})",
+                    [key, oldest, *chunk]).fetchall()
+                for hsd_id, summary, seen in rows:
+                    found[hsd_id] = {"summary": json.loads(summary), "seen": json.loads(seen)}
+        return found
+
+    def put_many(self, items, key):
+        """
+        Parameters:
+        items (iterable): (hsd_id, summary, seen) tuples, seen being {field: [hashes]}.
+        key (str): The prompt key.
+        """
+        now = time.time()
+        rows = [(str(hsd_id), key, json.dumps(summary), json.dumps(seen), now) for hsd_id, summary, seen in items]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?)", rows)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM analyses")
+
+    def prepare(self, records, key, full_context=False):
+        """
+        Replaces the HSDs analysed before with update records: id, title, status, previous_summary and the thread
+        entries added since (new_comments/new_forum_notes), plus the description if it changed.
+
+        Parameters:
+        records (dict | list): The HSD records, or a batch dict with the records under "data" (HTML already stripped).
+        key (str): The prompt key, see prompt_key().
+        full_context (bool): Send every HSD in full. What was sent is still recorded for later runs.
+
+        Returns:
+        tuple: (records in the same shape, list of PendingAnalysis to pass to commit(), number of update records)
+        """
+        batch = records if isinstance(records, dict) and isinstance(records.get("data"), list) else None
+        items = batch["data"] if batch is not None else records if isinstance(records, list) else [records]
+        known = {} if full_context else self.get_many((item.get("id") for item in items if isinstance(item, dict)), key)
+
+        prepared, pending, updates = [], [], 0
+        for item in items:
+            if not isinstance(item, dict) or not item.get("id"):
+                prepared.append(item)
+                continue
+            hsd_id = str(item["id"])
+            threads = {field: split_thread(item[field]) for field in THREAD_FIELDS if field in item}
+            thread_hashes = {field: [_digest(entry) for entry in entries] for field, entries in threads.items()}
+            stable_hashes = {field: _digest(str(item[field])) for field in STABLE_FIELDS if field in item}
+            pending.append(PendingAnalysis(hsd_id, thread_hashes, stable_hashes))
+
+            previous = known.get(hsd_id)
+            if previous is None:
+                prepared.append(item)
+                continue
+            seen = previous["seen"]
+            update = {field: value for field, value in item.items()
+                      if field not in THREAD_FIELDS and field not in STABLE_FIELDS}
+            update["previous_summary"] = previous["summary"]
+            for field, value in stable_hashes.items():
+                if seen.get("stable", {}).get(field) != value:
+                    update[field] = item[field]
+            for field, entries in threads.items():
+                seen_hashes = set(seen.get("threads", {}).get(field, ()))
+                new_entries = [entry for entry, digest in zip(entries, thread_hashes[field]) if digest not in seen_hashes]
+                update["new_" + field.rsplit(".", 1)[-1]] = "\n".join(new_entries)
+            prepared.append(update)
+            updates += 1
+
+        if batch is not None:
+            prepared = {**batch, "data": prepared}
+        elif not isinstance(records, list):
+            prepared = prepared[0]
+        return prepared, pending, updates
+
+    def commit(self, pending, response, key):
+        """
+        Records the summaries of an analysis response, so the next run only sends what is new.
+
+        Parameters:
+        pending (list): The PendingAnalysis list returned by prepare().
+        response (str): The model response ({"reports": [{"HSD_ID": ..., "Summary": ...}]}).
+        key (str): The prompt key.
+
+        Returns:
+        int: Number of HSDs recorded. HSDs missing from the response are not recorded and are sent in full next time.
+        """
+        summaries = parse_report_summaries(response)
+        items = [(analysis.hsd_id, summaries[analysis.hsd_id],
+                  {"threads": analysis.thread_hashes, "stable": analysis.stable_hashes})
+                 for analysis in pending if analysis.hsd_id in summaries]
+        if items:
+            self.put_many(items, key)
+        if len(items) < len(pending):
+            logger.info(f"Comment delta: {len(pending) - len(items)} of {len(pending)} HSDs missing from the response, "
+                        f"they will be sent in full next time")
+        return len(items)
+
+
+def parse_report_summaries(response):
+    """
+    Returns:
+    dict: HSD ID -> Summary of a {"reports": [...]} analysis response, empty if the response is not in that format.
+    """
+    try:
+        data = json.loads(_JSON_FENCE.sub("", response or ""))
+    except ValueError:
+        return {}
+    reports = data.get("reports") if isinstance(data, dict) else None
+    if not isinstance(reports, list):
+        return {}
+    return {str(report["HSD_ID"]).strip(): report["Summary"] for report in reports
+            if isinstance(report, dict) and "HSD_ID" in report and "Summary" in report}
+
+
+def get_default_store():
+    """
+    Returns the process-wide comment delta store, or None if disabled with HSD_DELTA=off.
+    """
+    global _default_store
+    if os.environ.get("HSD_DELTA", "").lower() in ("off", "0", "false", "no"):
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            path = os.environ.get("HSD_DELTA_PATH", DEFAULT_DELTA_PATH)
+            try:
+                _default_store = CommentDeltaStore(path)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not open the comment delta store at {path}, sending full history: {e}")
+                return None
+        return _default_store
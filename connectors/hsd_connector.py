@@ -4,19 +4,35 @@ import http.client
 import traceback
 from datetime import datetime
 import json
-from requests_kerberos import HTTPKerberosAuth
 import logging
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
 from common.logging_config import logger
+from connectors.hsd_session import get_shared_session, ARTICLE_URL
+from connectors.hsd_retry import call_with_retry, HsdFatalError
+from connectors.hsd_async_fetcher import fetch_hsd_batches, DEFAULT_MAX_CONCURRENCY
+from connectors.hsd_cache import get_default_cache, with_updated_date, strip_updated_date, REVALIDATE_FIELDS
+from connectors.hsd_query_pager import iter_query_pages, iter_query_records, iter_query_records_streaming, DEFAULT_QUERY_PAGE_SIZE
+from connectors.hsd_field_profiles import resolve_fields
+from connectors.hsd_search_index import get_default_index, index_fetched, flush_indexing, DEFAULT_SEARCH_LIMIT
 
 requests.packages.urllib3.disable_warnings()
 
 class HsdConnector:
     # CLEANUP (vbbhogad) - Lot of deadcode here needs to be cleaned. up. The whole HSD connector eventually needs to move to another file as these classes will be used in other script.
 
+    def __init__(self, pool_size=None, use_cache=True):
+        """
+        Parameters:
+        pool_size (int): Size of the keep-alive connection pool (optional). All connectors share one session,
+        so this only grows the shared pool if it is currently smaller.
+        use_cache (bool): Serve unchanged articles from the on-disk article cache (see connectors.hsd_cache).
+        """
+        self.session = get_shared_session(pool_size)
+        self.cache = get_default_cache() if use_cache else None
+
     def get_hsd(self, hsd_id, fields=None):
          """
          Fetches detailed information about an HSD page using its ID. The method sends a GET request to the HSD API and
@@ -24,13 +40,14 @@ class HsdConnector:
          Note: The HSD API requires Kerberos authentication. Meaning it can only be executed locally and not over cloud.
          Parameters:
          id (str): The ID of the HSD page to fetch information for.
-         fields (List<str>): fields to include in the response, list of strings (optional). If not defined, returns all fields.
+         fields (List<str> | str): fields to include in the response, list of strings or a field profile name from
+         connectors.hsd_field_profiles (optional). If not defined, returns all fields.
          Returns:
          dict: A dictionary containing detailed information about the HSD page. The dictionary includes the data
          associated with the given ID. If the ID does not exist or the request fails, the method raises an exception.
          Raises:
          requests.exceptions.HTTPError: If the HTTP request encounters an error or if the response status code is not 200 OK.
-         urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached MAX retries count (10)
+         urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached the retry policy's max attempts
          requests.exceptions.ProxyError: Problem with proxy settings
          http.client.RemoteDisconnected: During the query the remote was disconnected
          https://hsdes-api.intel.com/rest/article/{id}?fields={field1}%2C%20{field1}%2C%20{field1}...
@@ -39,35 +56,62 @@ class HsdConnector:
          :return:json of all the fields returned from the hsd
          """
 
+         fields = resolve_fields(fields)
          if fields == "":  # Backwards compatibility
              fields = None
          assert fields is None or (len(fields) > 0 and type(fields) != str and all([type(f) == str for f in fields])), \
              "fields must be None or a list\\iterator of strings. Got %s." % (repr(fields),)
-         retry = 10
-         while (retry > 0):
-             try:
-                 req = "https://hsdes-api.intel.com/rest/article/" + str(hsd_id)
-                 if fields is not None:
-                     req += "?fields=" + "%2C%20".join(fields)
-                 headers = {'Content-type': 'application/json'}
-                 # print req
-                 response_data = self._get_response(req, headers)
-                 if "data" in response_data:
-                     return response_data["data"][0]
-                 else:
-                     raise Exception('Could not find "data" in response...')
-             except urllib3.exceptions.MaxRetryError:
-                 logger.error('Got "urllib3.exceptions.MaxRetryError" exception, retrying {} more attempts'.format(retry - 1))
-                 retry -= 1
-             except requests.exceptions.ProxyError:
-                 logger.error('Got "requests.exceptions.ProxyError" exception, retrying {} more attempts'.format(retry - 1))
-                 retry -= 1
-             except http.client.RemoteDisconnected:
-                 logger.error('Got "http.client.RemoteDisconnected" exception, retrying {} more attempts'.format(retry - 1))
-                 retry -= 1
-             except Exception as e:
-                 logger.error('Got unknown exception: {}, retrying {} more attempts'.format(traceback.format_exc(), (retry - 1)))
-                 retry -= 1
+         entry = self.cache.get(hsd_id, fields) if self.cache is not None else None
+         if entry is not None and entry.data and entry.updated_date is not None \
+                 and self._get_updated_date(hsd_id) == entry.updated_date:
+             self.cache.touch([hsd_id], fields)
+             return strip_updated_date(entry.data, fields)[0]
+
+         request_fields = with_updated_date(fields) if self.cache is not None else fields
+         req = ARTICLE_URL + str(hsd_id)
+         if request_fields is not None:
+             req += "?fields=" + "%2C%20".join(request_fields)
+         headers = {'Content-type': 'application/json'}
+
+         def fetch():
+             response_data = self._get_response(req, headers)
+             if "data" not in response_data:
+                 raise HsdFatalError('Could not find "data" in response...')
+             if not response_data["data"]:
+                 # Deleted or hidden HSDs come back as an empty list
+                 raise HsdFatalError(f"No data found for HSD ID: {hsd_id}")
+             return response_data["data"]
+
+         try:
+             data = call_with_retry(fetch, description=f"HSD {hsd_id} fetch")
+         except Exception as e:
+             logger.error(f"Failed to fetch HSD {hsd_id}: {e}")
+             if entry is not None and entry.data:
+                 logger.warning(f"Serving cached copy of HSD {hsd_id}")
+                 return strip_updated_date(entry.data, fields)[0]
+             return None
+
+         if self.cache is not None:
+             self.cache.put(hsd_id, fields, data)
+         index_fetched(data)
+         return strip_updated_date(data, fields)[0]
+
+    def _get_updated_date(self, hsd_id):
+        """
+        Fetches only the updated_date of an HSD, used to revalidate a cached copy.
+
+        Returns:
+        str: The updated_date, or None if it could not be fetched (the caller then refetches the article).
+        """
+        req = ARTICLE_URL + str(hsd_id) + "?fields=" + "%2C%20".join(REVALIDATE_FIELDS)
+        headers = {'Content-type': 'application/json'}
+        try:
+            response_data = call_with_retry(lambda: self._get_response(req, headers),
+                                            description=f"HSD {hsd_id} revalidation")
+            return response_data["data"][0].get("updated_date")
+        except Exception as e:
+            logger.warning(f"Could not revalidate cached HSD {hsd_id}: {e}")
+            return None
 
     def get_hsd_links(self, hsd_id, fields=""):
         """
@@ -87,7 +131,7 @@ class HsdConnector:
 
                     Raises:
                     requests.exceptions.HTTPError: If the HTTP request encounters an error or if the response status code is not 200 OK.
-                    urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached MAX retries count (10)
+                    urllib3.exceptions.MaxRetryError: If the HSD could not be found and reached the retry policy's max attempts
                     requests.exceptions.ProxyError: Problem with proxy settings
                     http.client.RemoteDisconnected: During the query the remote was disconnected
 
@@ -97,35 +141,24 @@ class HsdConnector:
                     :return:json of all the fields for all the linked articles returned from the given hsd
             """
 
-        retry = 10
-        while (retry > 0):
-            try:
-                req = "https://hsdes-api.intel.com/rest/article/" + str(hsd_id) + "/links"
-                if len(fields) > 0:
-                    req += "?fields=" + str(fields[0])
-                    for i in range(len(fields) - 1):
-                        req += "%2C%20" + str(fields[i + 1])
-                    req += "&showHidden=Y&showDeleted=N"
-                headers = {'Content-type': 'application/json'}
-                # print req
-                response_data = self._get_response(req, headers)
-                if "responses" in response_data:
-                    return response_data
-                else:
-                    raise Exception('Could not find "data" in response...')
-            except urllib3.exceptions.MaxRetryError:
-                print('Got "urllib3.exceptions.MaxRetryError" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except requests.exceptions.ProxyError:
-                print('Got "requests.exceptions.ProxyError" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except http.client.RemoteDisconnected:
-                print('Got "http.client.RemoteDisconnected" exception, retrying {} more attempts'.format(retry - 1))
-                retry -= 1
-            except Exception as e:
-                print(
-                    'Got unknown exception: {}, retrying {} more attempts'.format(traceback.format_exc(), (retry - 1)))
-                retry -= 1
+        req = ARTICLE_URL + str(hsd_id) + "/links"
+        if len(fields) > 0:
+            req += "?fields=" + str(fields[0])
+            for i in range(len(fields) - 1):
+                req += "%2C%20" + str(fields[i + 1])
+            req += "&showHidden=Y&showDeleted=N"
+        headers = {'Content-type': 'application/json'}
+
+        def fetch():
+            response_data = self._get_response(req, headers)
+            if "responses" in response_data:
+                return response_data
+            raise HsdFatalError('Could not find "responses" in response...')
+
+        try:
+            return call_with_retry(fetch, description=f"HSD {hsd_id} links fetch")
+        except Exception as e:
+            logger.error(f"Failed to fetch links of HSD {hsd_id}: {e}")
 
     def _get_response(self, req, headers):
         """
@@ -142,8 +175,8 @@ class HsdConnector:
         HTTPError: If the GET request is not successful (i.e., if the response status code is not 200).
         Exception: If there is an error when trying to parse the response data as JSON.
     """
-        # Send a GET request to the specified URL (req) with the provided headers
-        response = requests.get(req, auth=HTTPKerberosAuth(), verify=False , headers=headers)
+        # Send a GET request over the shared pooled session (keep-alive connection and cached Kerberos context)
+        response = self.session.get(req, headers=headers)
         # If the response is successful (status code 200)
         if response.ok:
             try:
@@ -158,90 +191,93 @@ class HsdConnector:
             # If the response is not successful, raise an HTTPError for the given status code
             response.raise_for_status()
 
+    def _get_response_stream(self, req, headers):
+        """
+        Sends a GET request without reading the body, for incremental parsing (see connectors.hsd_json_stream).
+
+        Parameters:
+        req (str): The URL to send the GET request to.
+
+        Returns:
+        requests.Response: The open response. The caller must consume or close it.
+
+        Raises:
+        HTTPError: If the GET request is not successful.
+        """
+        response = self.session.get(req, headers=headers, stream=True)
+        if not response.ok:
+            response.close()
+            response.raise_for_status()
+        return response
+
     def display_hsd_query_fields(self, full_response_data):
         if "data" in full_response_data and isinstance(full_response_data["data"], list) and full_response_data["data"]:
             field_keys = full_response_data["data"][0].keys()
             newline_separator = '\n '
             logger.info(f"The provide query is fetching these HSD fields: {newline_separator.join(field_keys)}")
 
-    def fetch_query_data(self, query_id):
-
-        # Construct the URL dynamically
-        base_url = "https://hsdes-api.intel.com/rest/query/execution/"
-        req = f"{base_url}{query_id}"
-        headers = {'Content-type': 'application/json'}
-        response_data = self._get_response(req, headers)
-        try:
-            # Extract the total number of HSDs
-            total_hsds = response_data.get("total", 0)
-            if (total_hsds > 0):
-                logger.info(f"Total HSD records being processed: {total_hsds}")
+    def iter_query_data(self, query_id, page_size=DEFAULT_QUERY_PAGE_SIZE, fields=None):
+        """
+        Executes a query page by page and yields its rows one at a time as they are parsed from the response body,
+        so large queries can be processed while the rest is still downloading and peak memory is one row, not
+        the whole result set.
 
-                # Construct the updated URL with max_results parameter
-                full_query_url = f"{req}?max_results={total_hsds}"
-                # print(f"Fetching full data from: {full_query_url}")
+        Parameters:
+        query_id (str): The query ID
+        page_size (int): Rows per request
+        fields (List<str>): fields to include for each row (optional). If not defined, returns the query's columns.
 
-                # Fetch full data
-                full_response_data = self._get_response(full_query_url, headers)
+        Returns:
+        generator: The query rows (dict per HSD)
+        """
+        return iter_query_records_streaming(self._get_response_stream, query_id, page_size=page_size, fields=fields)
 
-                self.display_hsd_query_fields(full_response_data)
+    def fetch_query_data(self, query_id, page_size=DEFAULT_QUERY_PAGE_SIZE):
 
-                return full_response_data
-            else:
+        try:
+            # Rows are parsed incrementally, so the raw response body is never held next to the parsed rows
+            meta = {}
+            records = list(iter_query_records_streaming(self._get_response_stream, query_id, page_size=page_size,
+                                                        meta=meta))
+            if not records:
                 logger.info("No HSD entries found.")
+                return None
+
+            logger.info(f"Total HSD records being processed: {meta.get('total', len(records))}")
+            index_fetched(records)
+            full_response_data = {"total": meta.get("total", len(records)), "data": records}
+
+            self.display_hsd_query_fields(full_response_data)
+
+            return full_response_data
 
         except Exception as e:
-            logger.error("An error occurred:", e)
+            logger.error(f"An error occurred: {e}")
 
-    def fetch_hsd_ids_from_query(self, query_id):
+    def fetch_hsd_ids_from_query(self, query_id, page_size=DEFAULT_QUERY_PAGE_SIZE):
         """
-        Fetch all HSD IDs from a given query ID using the HSD API
+        Fetch all HSD IDs from a given query ID using the HSD API. Only the 'id' field is requested and the result
+        is read page by page (see connectors.hsd_query_pager).
         
         Parameters:
         query_id (str): The query ID to fetch HSD IDs from
+        page_size (int): Rows per request
         
         Returns:
-        dict: A dictionary containing:
-            - hsd_ids: List of HSD IDs found in the query
-            - total_count: Total number of HSDs in the query
+        list: HSD IDs found in the query, None if the query is empty, or a dictionary containing:
+            - error: Error message
             - query_id: The original query ID
-            - error: Error message if any
         """
         try:
-            # Construct the URL dynamically
-            base_url = "https://hsdes-api.intel.com/rest/query/execution/"
-            req = f"{base_url}{query_id}"
-            headers = {'Content-type': 'application/json'}
-            
-            # Get initial response to determine total count
-            response_data = self._get_response(req, headers)
-            
-            # Extract the total number of HSDs
-            total_hsds = response_data.get("total", 0)
-            if total_hsds > 0:
-                print(f"Total HSD entries found: {total_hsds}")
-
-                # Construct the updated URL with max_results parameter to get all entries
-                # Option 1: Use max_results to get all HSDs (default returns all fields)
-                # full_query_url = f"{req}?max_results={total_hsds}"
-
-                # Option 2: Use fields parameter to get only the 'id' field for each HSD
-                # This is more efficient if you only want HSD IDs and no other data.
-                full_query_url = f"{req}?max_results={total_hsds}&fields=id"
-
-                # Option 3: Use fields to get a minimal set (id, title, status, etc.)
-                # full_query_url = f"{req}?max_results={total_hsds}&fields=id,title,status"
-                
-                # Fetch full data
-                full_response_data = self._get_response(full_query_url, headers)
-                # timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                # hsd_query_data_file = f"hsd_query_{query_id}_{timestamp}.json"
-                # Extract HSD IDs from the response
-                if "data" in full_response_data and isinstance(full_response_data["data"], list):
-                    hsd_ids = [item.get("id") for item in full_response_data["data"] if item.get("id")]
-                    print(f"Extracted {len(hsd_ids)} HSD IDs from query {query_id}")
-                    # Save full response to the final output file
-                    return hsd_ids
+            hsd_ids = []
+            for page in iter_query_pages(self._get_response, query_id, page_size=page_size, fields=["id"]):
+                if page.start_at == 1 and page.total > 0:
+                    print(f"Total HSD entries found: {page.total}")
+                hsd_ids.extend(item.get("id") for item in page.records if item.get("id"))
+
+            if hsd_ids:
+                print(f"Extracted {len(hsd_ids)} HSD IDs from query {query_id}")
+                return hsd_ids
                 
         except Exception as e:
             error_msg = f"An error occurred while fetching HSD IDs from query {query_id}: {e}"
@@ -250,102 +286,81 @@ class HsdConnector:
                 "error": error_msg,
                 "query_id": query_id
             }
-        
-    def get_multiple_hsd_data_in_batch(self, hsd_ids, batch_size=8, fields=None):
+
+    def search_hsds(self, search_term, limit=DEFAULT_SEARCH_LIMIT):
+        """
+        Keyword search over the HSDs fetched so far (title, description, comments and forum notes), served from the
+        local full-text index (see connectors.hsd_search_index). Only HSDs this machine has fetched are found.
+
+        Parameters:
+        search_term (str): Words that must all appear (e.g. "FCCB", "punit_fuses pcode"), or an FTS5 query
+            ("fccb OR fuse", "pcode*").
+        limit (int): Maximum number of results, best matches first.
+
+        Returns:
+        dict: {"total": n, "data": [{"id", "title", "status"}, ...]} like fetch_query_data, or a dictionary containing:
+            - error: Error message
+            - search_term: The original search term
+        """
+        index = get_default_index()
+        if index is None:
+            return {"error": "The HSD search index is disabled (HSD_SEARCH_INDEX=off)", "search_term": search_term}
+        flush_indexing()
+        try:
+            records = index.search(search_term, limit=limit)
+        except ValueError as e:
+            return {"error": str(e), "search_term": search_term}
+        logger.info(f"Search for {search_term!r}: {len(records)} HSDs in a local index of {len(index)}")
+        return {"total": len(records), "data": records}
+
+    def search_hsd_ids(self, search_term, limit=DEFAULT_SEARCH_LIMIT):
+        """
+        Same as search_hsds() but returns only the HSD IDs, ready for get_multiple_hsd_data_in_batch().
+
+        Returns:
+        list: The matching HSD IDs (empty if none match or the search failed).
+        """
+        result = self.search_hsds(search_term, limit=limit)
+        return [record["id"] for record in result.get("data", [])]
+
+    def fetch_query_members(self, query_id, page_size=DEFAULT_QUERY_PAGE_SIZE):
+        """
+        Fetch the current members of a query together with their updated_date, used for incremental sync
+        (see connectors.hsd_query_sync).
+
+        Parameters:
+        query_id (str): The query ID
+        page_size (int): Rows per request
+
+        Returns:
+        dict: HSD ID -> updated_date for every HSD in the query (empty if the query has no entries)
+        """
+        records = iter_query_records(self._get_response, query_id, page_size=page_size, fields=["id", "updated_date"])
+        return {str(item["id"]): item.get("updated_date") for item in records if item.get("id")}
+
+    def get_multiple_hsd_data_in_batch(self, hsd_ids, batch_size=8, fields="sighting_summary", max_concurrency=DEFAULT_MAX_CONCURRENCY, token_budget=None):
         """
         Fetches detailed information for multiple HSD IDs in batches and saves each batch to separate JSON files.
         This helps avoid token limits when processing large numbers of HSDs.
+        The HSDs are fetched concurrently (see connectors.hsd_async_fetcher) and written in the original order.
         
         Parameters:
         hsd_ids (list): List of HSD IDs to fetch information for.
         batch_size (int): Number of HSDs to process in each batch (default: 10)
-        fields (List<str>): fields to include in the response, list of strings (optional).
+        fields (List<str> | str): fields to include in the response, list of strings or a field profile name from
+        connectors.hsd_field_profiles (default: "sighting_summary").
+        max_concurrency (int): Maximum number of concurrent article requests.
+        token_budget (int): Pack the HSDs into batches of at most this many tokens of HSD data, with at most
+        batch_size HSDs each, instead of fixed batches of batch_size (optional, see connectors.llm_token_budget).
         
         Returns:
         list: List of JSON file paths containing batch data
         """
-        fields = ["id","title", "description", "status", "comments","forum_notes"]
-        
-        if not hsd_ids or not isinstance(hsd_ids, list):
-            raise ValueError("hsd_ids must be a non-empty list")
+        fields = resolve_fields(fields)
         
-        # Split HSDs into batches
-        batches = [hsd_ids[i:i + batch_size] for i in range(0, len(hsd_ids), batch_size)]
-        batch_files = []
-        
-        print(f"📊 Processing {len(hsd_ids)} HSDs in {len(batches)} batches of {batch_size} HSDs each...")
-        
-        for batch_num, batch_hsd_ids in enumerate(batches, 1):
-            print(f"\n🔄 Processing Batch {batch_num}/{len(batches)} ({len(batch_hsd_ids)} HSDs)...")
-            
-            # Generate timestamp and dynamic filename for this batch
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            batch_file = f"hsd_batch_{batch_num}_of_{len(batches)}_{len(batch_hsd_ids)}hsds_{timestamp}.json"
-            
-            # Initialize batch data structure
-            batch_data = {"data": []}
-            successful_count = 0
-            failed_count = 0
-            
-            for i, hsd_id in enumerate(batch_hsd_ids, 1):
-                print(f"  Processing HSD {i}/{len(batch_hsd_ids)} in batch {batch_num}: {hsd_id}")
-                retry = 10
-                success = False
-                
-                while retry > 0 and not success:
-                    try:
-                        req = "https://hsdes-api.intel.com/rest/article/" + str(hsd_id)
-                        if fields is not None:
-                            req += "?fields=" + "%2C%20".join(fields)
-                        headers = {'Content-type': 'application/json'}
-                        
-                        response_data = self._get_response(req, headers)
-                        
-                        if "data" in response_data:
-                            if isinstance(response_data["data"], list):
-                                batch_data["data"].extend(response_data["data"])
-                                # Debug: Show status of each HSD
-                                for hsd_data in response_data["data"]:
-                                    hsd_status = hsd_data.get('status', 'Unknown')
-                                    print(f"    ✅ HSD {hsd_id} - Status: {hsd_status}")
-                            else:
-                                batch_data["data"].append(response_data["data"])
-                                # Debug: Show status of the HSD
-                                hsd_status = response_data["data"].get('status', 'Unknown')
-                                print(f"    ✅ HSD {hsd_id} - Status: {hsd_status}")
-                            successful_count += 1
-                            success = True
-                        else:
-                            print(f"    ✗ No data found for HSD ID: {hsd_id}")
-                            failed_count += 1
-                            success = True
-                            
-                    except Exception as e:
-                        print(f'    ⚠ Error for HSD {hsd_id}: {str(e)}, retrying {retry - 1} more attempts')
-                        retry -= 1
-                
-                if not success:
-                    print(f"    ✗ Failed to fetch data for HSD ID: {hsd_id} after all retries")
-                    failed_count += 1
-            
-            # Save batch data to file
-            with open(batch_file, 'w', encoding='utf-8') as f:
-                json.dump(batch_data, f, indent=4, ensure_ascii=False)
-            
-            batch_files.append(batch_file)
-            
-            # Show status distribution for this batch
-            status_counts = {}
-            for hsd_data in batch_data["data"]:
-                status = hsd_data.get('status', 'Unknown')
-                status_counts[status] = status_counts.get(status, 0) + 1
-            
-            print(f"  ✅ Batch {batch_num} complete:")
-            print(f"    • Successful: {successful_count}")
-            print(f"    • Failed: {failed_count}")
-            print(f"    • HSDs with content: {len(batch_data['data'])}")
-            print(f"    • Status distribution: {dict(status_counts)}")
-            print(f"    • Saved to: '{batch_file}'")
+        batch_files = fetch_hsd_batches(hsd_ids, batch_size=batch_size, fields=fields,
+                                        max_concurrency=max_concurrency, use_cache=self.cache is not None,
+                                        token_budget=token_budget)
         
         # Calculate overall status distribution across all batches
         overall_status_counts = {}
@@ -363,9 +378,6 @@ class HsdConnector:
             except Exception as e:
                 print(f"  ⚠️ Warning: Could not read {batch_file} for status summary: {e}")
         
-        print(f"\n📊 All Batches Complete:")
-        print(f"  • Total batches: {len(batches)}")
-        print(f"  • Batch files created: {len(batch_files)}")
         print(f"  • Total HSDs processed: {total_hsds_processed}")
         print(f"  • Overall status distribution: {dict(overall_status_counts)}")
         
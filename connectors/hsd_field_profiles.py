@@ -0,0 +1,31 @@
+# Named HSD field projections. Each pipeline asks the API only for the fields its stage actually reads, which keeps
+# payloads, JSON parsing and the prompts built from the articles small.
+FIELD_PROFILES = {
+    # Sighting summaries (HSD_Query_Summary): the prompt reads the discussion as well as the description
+    "sighting_summary": ["id", "title", "description", "status", "comments", "forum_notes"],
+    # FCCB / fuse analysis: fuse names and values live in the title, description and comments; status is needed
+    # for the rejected-HSD rule
+    "fccb": ["id", "title", "description", "status", "comments"],
+    # HSDHandler.get_hsd_tree: the node attributes plus the tenant/subject checked by validate_hsd
+    "tree_node": ["id", "title", "owner", "description", "subject", "status", "priority", "tenant", "from_subject"],
+}
+
+
+def resolve_fields(fields):
+    """
+    Turns a field profile name into its field list. Lists and None (all fields) are returned unchanged.
+
+    Parameters:
+    fields (str | List<str> | None): A profile name from FIELD_PROFILES, a list of field names, or None.
+
+    Returns:
+    List<str> | None: The fields to request.
+
+    Raises:
+    ValueError: If fields is a string that is not a known profile.
+    """
+    if isinstance(fields, str) and fields != "":
+        if fields not in FIELD_PROFILES:
+            raise ValueError(f"Unknown HSD field profile '{fields}'. Known profiles: {', '.join(FIELD_PROFILES)}")
+        return list(FIELD_PROFILES[fields])
+    return fields
@@ -0,0 +1,175 @@
+import codecs
+import json
+
+# ijson is optional: it parses with a C backend and never builds more than one array element at a time.
+# Without it a pure-Python incremental parser with the same interface is used.
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+CHUNK_SIZE = 64 * 1024
+_WHITESPACE = " \t\n\r"
+_SCALAR_EVENTS = ("string", "number", "boolean", "null")
+# Characters a JSON number can continue with: a number followed only by these at the end of the buffer may be cut
+# off by a chunk boundary ("12." or "1e")
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+
+def iter_json_array(stream, key="data", meta=None, chunk_size=CHUNK_SIZE):
+    """
+    Incrementally parses a JSON object such as {"total": 3, "data": [{...}, {...}, {...}]} from a binary stream and
+    yields the elements of the array under key one at a time. Only the element being parsed is held in memory.
+
+    Parameters:
+    stream: Binary file-like object, e.g. the raw body of a requests response opened with stream=True.
+    key (str): Top-level key of the array to stream.
+    meta (dict): If given, receives the other top-level scalar values (e.g. "total"). It is complete once the
+    generator is exhausted; values that appear before the array are available earlier.
+    chunk_size (int): Bytes read per read() call.
+
+    Yields:
+    The array elements, in order.
+
+    Raises:
+    ValueError: If the body is not a JSON object or is truncated.
+    """
+    if meta is None:
+        meta = {}
+    if ijson is not None:
+        return _iter_with_ijson(stream, key, meta)
+    return _iter_with_stdlib(stream, key, meta, chunk_size)
+
+
+def iter_response_items(response, key="data", meta=None, on_close=None):
+    """
+    Streams the array under key from a requests response opened with stream=True. Transfer encodings (gzip etc.)
+    are decoded on the fly. The response is closed when the generator finishes or is closed.
+
+    Parameters:
+    on_close (callable): Called as on_close(response, decoded_bytes) before the response is closed (optional).
+    """
+    response.raw.decode_content = True
+    stream = _CountingStream(response.raw)
+    try:
+        yield from iter_json_array(stream, key=key, meta=meta)
+    finally:
+        if on_close is not None:
+            on_close(response, stream.bytes_read)
+        response.close()
+
+
+class _CountingStream:
+    """Counts the (decoded) bytes read through it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def _iter_with_ijson(stream, key, meta):
+    item_prefix = key + ".item"
+    events = ijson.parse(stream, use_float=True)
+    for prefix, event, value in events:
+        if prefix == item_prefix:
+            if event in ("start_map", "start_array"):
+                builder = ijson.ObjectBuilder()
+                end_event = event.replace("start", "end")
+                while (prefix, event) != (item_prefix, end_event):
+                    builder.event(event, value)
+                    prefix, event, value = next(events)
+                yield builder.value
+            else:
+                yield value
+        elif "." not in prefix and prefix and event in _SCALAR_EVENTS:
+            meta[prefix] = value
+
+
+class _Reader:
+    """Text buffer over a binary stream that is refilled on demand and trimmed as values are consumed."""
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=None):
+        if self.eof:
+            return False
+        data = self.stream.read(size or self.chunk_size)
+        if not data:
+            self.buffer += self.decoder.decode(b"", final=True)
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(data)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skips whitespace and returns the next character without consuming it ("" at end of input)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if char == "" or char not in chars:
+            raise ValueError(f"Malformed JSON stream: expected one of {chars!r}, got {char or 'end of input'!r}")
+        self.pos += 1
+        return char
+
+    def value(self, decoder=json.JSONDecoder()):
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+                # A number at the very end of the buffer, or followed only by characters a number can continue
+                # with, may continue in the next chunk
+                if (self.eof or not isinstance(value, (int, float))
+                        or not all(char in _NUMBER_CHARS for char in self.buffer[end:])):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise ValueError("Malformed or truncated JSON stream")
+            # Read bigger chunks for big values so the re-parse cost stays linear
+            self.fill(size)
+            size *= 2
+
+
+def _iter_with_stdlib(stream, key, meta, chunk_size):
+    reader = _Reader(stream, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(",]") == "]":
+                        break
+        else:
+            value = reader.value()
+            if not isinstance(value, (dict, list)):
+                meta[name] = value
+        if reader.expect(",}") == "}":
+            return
@@ -0,0 +1,188 @@
+import re
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+from connectors.hsd_session import get_shared_session
+from connectors.hsd_query_pager import iter_query_pages
+from connectors.hsd_async_fetcher import fetch_articles
+from connectors.hsd_cache import get_default_cache, fields_key
+from connectors.hsd_field_profiles import resolve_fields
+
+# Prefetches use fewer concurrent requests than a real run so they never crowd out interactive work
+DEFAULT_PREFETCH_CONCURRENCY = 4
+# Articles warmed per step; cancellation takes effect between steps
+PREFETCH_WINDOW = 50
+# A finished prefetch is reused by later reruns for this long, after that the query is listed again
+PREFETCH_REUSE_SECONDS = 10 * 60
+QUERY_ID_PATTERN = re.compile(r"^\d{8,12}$")
+
+_prefetches = {}
+# Owners (e.g. Streamlit session IDs) using each prefetch: (query_id, fields_key) -> set. Prefetches are shared by
+# everyone in the process, so one is only cancelled when its last owner lets go of it.
+_prefetch_owners = {}
+_prefetches_lock = threading.Lock()
+
+
+def is_valid_query_id(query_id):
+    return bool(query_id) and QUERY_ID_PATTERN.match(str(query_id).strip()) is not None
+
+
+class QueryPrefetch:
+    """
+    Lists the HSD IDs of a query and warms the on-disk article cache (see connectors.hsd_cache) on a background
+    thread, so a run started later finds the IDs ready and its articles already cached.
+
+    Use start_query_prefetch() rather than creating instances directly, it deduplicates identical prefetches.
+
+    Parameters:
+    query_id (str): The query ID.
+    fields (str | List<str>): Field profile or field list the run will fetch; the cache is keyed by it.
+    max_concurrency (int): Maximum concurrent article requests.
+    """
+
+    def __init__(self, query_id, fields, max_concurrency=DEFAULT_PREFETCH_CONCURRENCY):
+        self.query_id = str(query_id).strip()
+        self.fields = resolve_fields(fields)
+        self.max_concurrency = max_concurrency
+        self.state = "pending"
+        self.hsd_ids = None
+        self.warmed = 0
+        self.error = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._handed_over = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"hsd-prefetch-{self.query_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stops the prefetch after the current step. IDs already listed stay available."""
+        self._cancel.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def handover(self, timeout=None):
+        """
+        Stops warming the cache, since a run is taking over the fetch, and returns the listed HSD IDs. If the
+        query is still being listed, waits for the listing to complete.
+
+        Parameters:
+        timeout (float): Seconds to wait for the background thread to stop (optional).
+
+        Returns:
+        list: The HSD IDs of the query, or None if listing did not complete.
+        """
+        self._handed_over.set()
+        self.wait(timeout)
+        return list(self.hsd_ids) if self.hsd_ids is not None else None
+
+    def status(self):
+        """
+        Returns:
+        dict: state (pending/listing/warming/done/handed over/cancelled/failed), total (IDs listed), warmed and error.
+        """
+        return {"state": self.state, "total": len(self.hsd_ids) if self.hsd_ids is not None else None,
+                "warmed": self.warmed, "error": self.error}
+
+    def _get_json(self, req, headers):
+        response = get_shared_session().get(req, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    def _run(self):
+        start = time.time()
+        try:
+            self.state = "listing"
+            hsd_ids = []
+            for page in iter_query_pages(self._get_json, self.query_id, fields=["id"]):
+                hsd_ids.extend(str(item["id"]) for item in page.records if item.get("id"))
+                if self._cancel.is_set():
+                    self.state = "cancelled"
+                    return
+            self.hsd_ids = hsd_ids
+
+            self.state = "warming"
+            cache = get_default_cache()
+            if cache is not None:
+                for offset in range(0, len(hsd_ids), PREFETCH_WINDOW):
+                    if self._cancel.is_set() or self._handed_over.is_set():
+                        self.state = "cancelled" if self._cancel.is_set() else "handed over"
+                        return
+                    results = fetch_articles(hsd_ids[offset:offset + PREFETCH_WINDOW], fields=self.fields,
+                                             max_concurrency=self.max_concurrency, cache=cache)
+                    self.warmed += sum(result.ok for result in results)
+            self.state = "done"
+            logger.info(f"Prefetched query {self.query_id}: {len(hsd_ids)} HSDs, {self.warmed} cached "
+                        f"in {time.time() - start:.1f}s")
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.warning(f"Prefetch of query {self.query_id} failed: {e}")
+        finally:
+            self.finished_at = time.time()
+            self._done.set()
+
+
+def start_query_prefetch(query_id, fields, max_concurrency=DEFAULT_PREFETCH_CONCURRENCY, owner=None):
+    """
+    Starts a background prefetch of a query, or returns the one already running (or recently finished) for the
+    same query and fields. Safe to call on every Streamlit rerun.
+
+    Parameters:
+    query_id (str): The query ID. Invalid IDs are ignored.
+    fields (str | List<str>): Field profile or field list the run will fetch.
+    max_concurrency (int): Maximum concurrent article requests.
+    owner (str): Who uses the prefetch, e.g. the Streamlit session ID (optional). Pass the same owner to
+    cancel_query_prefetch().
+
+    Returns:
+    QueryPrefetch: The prefetch, or None if query_id is not a valid query ID.
+    """
+    if not is_valid_query_id(query_id):
+        return None
+    key = (str(query_id).strip(), fields_key(resolve_fields(fields)))
+    with _prefetches_lock:
+        prefetch = _prefetches.get(key)
+        reusable = prefetch is not None and not prefetch.cancelled and prefetch.state != "failed" and \
+            (not prefetch.done or time.time() - prefetch.finished_at < PREFETCH_REUSE_SECONDS)
+        if not reusable:
+            prefetch = QueryPrefetch(key[0], fields, max_concurrency).start()
+            _prefetches[key] = prefetch
+        if owner is not None:
+            _prefetch_owners.setdefault(key, set()).add(owner)
+        return prefetch
+
+
+def cancel_query_prefetch(query_id, fields, owner=None):
+    """
+    Lets go of the prefetch of a query for owner, and cancels it if it is running and no other owner still uses
+    it. Without an owner the prefetch is cancelled regardless of who uses it.
+    """
+    if not is_valid_query_id(query_id):
+        return
+    key = (str(query_id).strip(), fields_key(resolve_fields(fields)))
+    with _prefetches_lock:
+        owners = _prefetch_owners.get(key, set())
+        owners.discard(owner)
+        if owner is not None and owners:
+            return
+        _prefetch_owners.pop(key, None)
+        prefetch = _prefetches.pop(key, None)
+    if prefetch is not None:
+        prefetch.cancel()
@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+from connectors.hsd_retry import call_with_retry
+from connectors.hsd_session import QUERY_EXECUTION_URL, record_transfer
+from connectors.hsd_json_stream import iter_response_items
+
+# Rows per page. Large enough that typical queries finish in one round trip, small enough that a query with tens
+# of thousands of rows never has more than two pages in memory.
+DEFAULT_QUERY_PAGE_SIZE = 1000
+
+
+class QueryPage:
+    """
+    One page of a query execution result.
+
+    Attributes:
+    records (list): The rows of this page (the "data" list of the response).
+    start_at (int): 1-based index of the first row of this page.
+    total (int): Total number of rows in the query, as reported by the first page.
+    """
+
+    def __init__(self, records, start_at, total):
+        self.records = records
+        self.start_at = start_at
+        self.total = total
+
+
+def iter_query_pages(get_response, query_id, page_size=DEFAULT_QUERY_PAGE_SIZE, fields=None):
+    """
+    Executes a query page by page and yields each page as soon as it arrives.
+
+    The first request already returns rows (and the total), so a query that fits in one page costs a single round
+    trip. While the caller processes a page the next one is fetched in the background, and at most one page ahead
+    is held, so memory stays bounded however large the query is.
+
+    Parameters:
+    get_response (callable): get_response(url, headers) -> parsed JSON, e.g. HsdConnector._get_response.
+    query_id (str): The query ID.
+    page_size (int): Rows per request (max_results).
+    fields (List<str>): fields to include for each row (optional). If not defined, returns the query's columns.
+
+    Yields:
+    QueryPage: The pages in order.
+    """
+    headers = {'Content-type': 'application/json'}
+
+    def fetch_page(start_at):
+        req = f"{QUERY_EXECUTION_URL}{query_id}?start_at={start_at}&max_results={page_size}"
+        if fields is not None:
+            req += "&fields=" + ",".join(fields)
+        return call_with_retry(lambda: get_response(req, headers),
+                               description=f"query {query_id} page at {start_at}")
+
+    first_page = fetch_page(1)
+    total = first_page.get("total", 0)
+    records = first_page.get("data", [])
+    start_at = 1
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="hsd-query-page") as executor:
+        while True:
+            next_start = start_at + len(records)
+            # Request the next page before handing this one to the caller
+            future = executor.submit(fetch_page, next_start) if records and next_start <= total else None
+            yield QueryPage(records, start_at, total)
+            if future is None:
+                return
+            start_at, records = next_start, future.result().get("data", [])
+            logger.debug(f"Query {query_id}: fetched rows {start_at}-{start_at + len(records) - 1} of {total}")
+
+
+def iter_query_records(get_response, query_id, page_size=DEFAULT_QUERY_PAGE_SIZE, fields=None):
+    """
+    Same as iter_query_pages() but yields the individual rows.
+    """
+    for page in iter_query_pages(get_response, query_id, page_size=page_size, fields=fields):
+        yield from page.records
+
+
+def iter_query_records_streaming(open_stream, query_id, page_size=DEFAULT_QUERY_PAGE_SIZE, fields=None, meta=None):
+    """
+    Same as iter_query_records() but each page body is parsed incrementally (see connectors.hsd_json_stream),
+    so rows are handed over while the rest of the page is still downloading and peak memory is one row rather
+    than one page. Pages are requested one after another.
+
+    Parameters:
+    open_stream (callable): open_stream(url, headers) -> requests.Response opened with stream=True and already
+    checked for errors, e.g. HsdConnector._get_response_stream.
+    query_id (str): The query ID.
+    page_size (int): Rows per request (max_results).
+    fields (List<str>): fields to include for each row (optional).
+    meta (dict): If given, receives the top-level values of the last page, e.g. "total".
+
+    Yields:
+    dict: The query rows.
+    """
+    headers = {'Content-type': 'application/json'}
+    meta = {} if meta is None else meta
+    start_at = 1
+    while True:
+        req = f"{QUERY_EXECUTION_URL}{query_id}?start_at={start_at}&max_results={page_size}"
+        if fields is not None:
+            req += "&fields=" + ",".join(fields)
+        # Only opening the page is retried; rows already handed to the caller cannot be taken back
+        response = call_with_retry(lambda: open_stream(req, headers), description=f"query {query_id} page at {start_at}")
+        count = 0
+        for record in iter_response_items(response, key="data", meta=meta, on_close=record_transfer):
+            count += 1
+            yield record
+        start_at += count
+        if count == 0 or start_at > meta.get("total", 0):
+            return
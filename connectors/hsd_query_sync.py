@@ -0,0 +1,184 @@
+import json
+import re
+import time
+from datetime import datetime
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+
+# One JSON state file per query is kept here. Override with the HSD_QUERY_SYNC_DIR environment variable.
+DEFAULT_STATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.hsd_cache', 'query_sync')
+
+
+class SyncDelta:
+    """
+    Difference between the previous and the current membership of a query.
+
+    Attributes:
+    added (list): HSD IDs that are new in the query.
+    removed (list): HSD IDs that left the query.
+    modified (list): HSD IDs whose updated_date changed, or whose previous result is missing.
+    unchanged (list): HSD IDs whose previous article and result can be reused as is.
+    """
+
+    def __init__(self, added, removed, modified, unchanged):
+        self.added = added
+        self.removed = removed
+        self.modified = modified
+        self.unchanged = unchanged
+
+    @property
+    def changed(self):
+        """HSD IDs that must go through fetch, LLM and export: added + modified."""
+        return self.added + self.modified
+
+    def summary(self):
+        return (f"{len(self.added)} added, {len(self.modified)} modified, {len(self.removed)} removed, "
+                f"{len(self.unchanged)} unchanged")
+
+
+def split_results_by_hsd(response_text):
+    """
+    Splits a JSON LLM response into per-HSD records so they can be stored and merged back on later runs.
+    Accepts the same shapes as the FCCB Excel parser: a list of records, {"data": [...]}, or a single record,
+    optionally wrapped in a ```json block.
+
+    Parameters:
+    response_text (str): The raw LLM response.
+
+    Returns:
+    dict: HSD ID (str) -> list of records for that HSD. Empty if the response is not JSON.
+    """
+    if not response_text:
+        return {}
+    match = re.search(r'```json\n(.*?)\n```', response_text, re.DOTALL)
+    content = match.group(1) if match else response_text.strip()
+    content = re.sub(r'//.*(?=\n)', '', content)
+    content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        return {}
+    if isinstance(data, dict):
+        data = data["data"] if isinstance(data.get("data"), list) else [data]
+    if not isinstance(data, list):
+        return {}
+
+    results = {}
+    for record in data:
+        if isinstance(record, dict):
+            hsd_id = record.get("hsd_id", record.get("id"))
+            if hsd_id is not None:
+                results.setdefault(str(hsd_id), []).append(record)
+    return results
+
+
+class QuerySync:
+    """
+    Remembers, per query, which HSDs were processed on the previous run together with their updated_date, the
+    fetched article and the LLM result. On the next run only added or modified HSDs need to be fetched and
+    analysed; the stored articles and results of unchanged HSDs are merged back into the outputs.
+
+    Parameters:
+    query_id (str): The HSD query ID.
+    state_dir (str): Directory of the state files (optional).
+    """
+
+    def __init__(self, query_id, state_dir=None):
+        self.query_id = str(query_id)
+        state_dir = state_dir or os.environ.get("HSD_QUERY_SYNC_DIR", DEFAULT_STATE_DIR)
+        os.makedirs(state_dir, exist_ok=True)
+        self.state_file = os.path.join(state_dir, f"query_sync_{self.query_id}.json")
+        self.entries = {}
+        self.last_synced = None
+        self._current = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.entries = state.get("entries", {})
+            self.last_synced = state.get("synced_at")
+        except FileNotFoundError:
+            self.entries = {}
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Ignoring unreadable query sync state {self.state_file}: {e}")
+            self.entries = {}
+
+    def save(self):
+        self.last_synced = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        state = {"query_id": self.query_id, "synced_at": self.last_synced, "entries": self.entries}
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_file, self.state_file)
+
+    def diff(self, members):
+        """
+        Compares the current query membership with the previous run.
+
+        Parameters:
+        members (dict): HSD ID -> updated_date for every HSD currently returned by the query.
+
+        Returns:
+        SyncDelta: The added, removed, modified and unchanged HSD IDs.
+        """
+        self._current = {str(hsd_id): updated_date for hsd_id, updated_date in members.items()}
+        added, modified, unchanged = [], [], []
+        for hsd_id, updated_date in self._current.items():
+            entry = self.entries.get(hsd_id)
+            if entry is None:
+                added.append(hsd_id)
+            elif updated_date is None or entry.get("updated_date") != updated_date or not entry.get("result"):
+                modified.append(hsd_id)
+            else:
+                unchanged.append(hsd_id)
+        removed = [hsd_id for hsd_id in self.entries if hsd_id not in self._current]
+        return SyncDelta(added, removed, modified, unchanged)
+
+    def record_batch(self, batch_file, response_text):
+        """
+        Stores the articles of a processed batch file and their LLM results.
+        HSDs without a result in the response are not stored, so they are processed again on the next run.
+
+        Returns:
+        int: Number of HSDs recorded.
+        """
+        try:
+            with open(batch_file, 'r', encoding='utf-8') as f:
+                articles = json.load(f).get("data", [])
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not read batch file {batch_file} for query sync: {e}")
+            return 0
+
+        results = split_results_by_hsd(response_text)
+        recorded = 0
+        for article in articles:
+            hsd_id = str(article.get("id"))
+            if hsd_id in results:
+                self.entries[hsd_id] = {
+                    "updated_date": self._current.get(hsd_id, article.get("updated_date")),
+                    "article": article,
+                    "result": results[hsd_id],
+                    "processed_at": time.time(),
+                }
+                recorded += 1
+        return recorded
+
+    def forget(self, hsd_ids):
+        """Drops HSDs that left the query."""
+        for hsd_id in hsd_ids:
+            self.entries.pop(str(hsd_id), None)
+
+    def unchanged_articles(self, hsd_ids):
+        return [self.entries[str(hsd_id)]["article"] for hsd_id in hsd_ids if str(hsd_id) in self.entries]
+
+    def unchanged_results(self, hsd_ids):
+        results = []
+        for hsd_id in hsd_ids:
+            if str(hsd_id) in self.entries:
+                results.extend(self.entries[str(hsd_id)]["result"])
+        return results
@@ -0,0 +1,156 @@
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+from connectors.hsd_retry import parse_retry_after
+
+# Process-wide request budget for the HSD API. Every HsdConnector (connectors/ and the Tools copies), the batch
+# fetchers and the tree crawler send through the shared session, so this budget is shared by all of them however
+# many Streamlit sessions or worker threads are running. Override with HSD_RATE_LIMIT (requests per second,
+# 0 for no rate cap) and HSD_MAX_IN_FLIGHT.
+DEFAULT_RATE_LIMIT = float(os.environ.get("HSD_RATE_LIMIT", "20"))
+DEFAULT_MAX_IN_FLIGHT = int(os.environ.get("HSD_MAX_IN_FLIGHT", "16"))
+# After a 429 the rate is multiplied by this factor, then grows back by RECOVERY_FRACTION of the configured rate
+# per successful response, so the aggregate settles just under what the server tolerates
+THROTTLE_FACTOR = 0.5
+RECOVERY_FRACTION = 0.01
+# Pause applied to everyone after a 429 without a Retry-After header
+DEFAULT_THROTTLE_PAUSE = 1.0
+
+
+class RateLimiter:
+    """
+    Token bucket (requests per second, with bursts up to burst) plus a cap on requests in flight.
+
+    On HTTP 429 all callers pause for the server's Retry-After and the rate is lowered; successful responses
+    raise it again step by step up to the configured rate. The retry itself is left to call_with_retry, which
+    treats 429 as retryable.
+
+    Parameters:
+    rate (float): Sustained requests per second. 0 or None disables the rate cap (the in-flight cap still applies).
+    max_in_flight (int): Maximum number of requests being sent or awaiting response headers at once.
+    burst (int): Bucket size, i.e. how many requests may start back to back after an idle period (optional).
+    Defaults to max_in_flight.
+    min_rate (float): Lower bound for the rate after repeated throttling.
+    name (str): Used in log messages.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE_LIMIT, max_in_flight=DEFAULT_MAX_IN_FLIGHT, burst=None, min_rate=1.0,
+                 name="HSD API"):
+        self.max_rate = rate or None
+        self.max_in_flight = max_in_flight
+        self.burst = burst or max_in_flight
+        self.min_rate = min_rate
+        self.name = name
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._rate = self.max_rate
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.requests = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _reserve(self):
+        """Takes a token (the balance may go negative) and returns how long the caller has to wait for it."""
+        now = time.monotonic()
+        wait = self._paused_until - now
+        if self._rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self._rate)
+            self._last_refill = now
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self._rate)
+        return wait
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent: first for a free in-flight slot, then for a token. Every acquire()
+        must be followed by exactly one release().
+        """
+        start = time.monotonic()
+        self._slots.acquire()
+        with self._lock:
+            wait = self._reserve()
+        while wait > 0:
+            time.sleep(wait)
+            # A 429 seen by another caller while this one slept pushes the start further out
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+        waited = time.monotonic() - start
+        with self._lock:
+            self._in_flight += 1
+            self.requests += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def release(self, status_code=None, retry_after=None):
+        """
+        Frees the in-flight slot and adapts the rate to the outcome.
+
+        Parameters:
+        status_code (int): HTTP status of the response, or None if the request failed without a response.
+        retry_after (float): Seconds from the response's Retry-After header (optional).
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if status_code == 429:
+                self._throttle(retry_after)
+            elif status_code is not None and status_code < 500 and self._rate is not None and self._rate < self.max_rate:
+                self._rate = min(self.max_rate, self._rate + self.max_rate * RECOVERY_FRACTION)
+        self._slots.release()
+
+    def _throttle(self, retry_after):
+        self.throttled += 1
+        now = time.monotonic()
+        pause = retry_after if retry_after is not None else DEFAULT_THROTTLE_PAUSE
+        self._paused_until = max(self._paused_until, now + pause)
+        if self._rate is not None:
+            self._rate = max(self.min_rate, self._rate * THROTTLE_FACTOR)
+            # Drop the saved-up burst so the requests after the pause start at the lowered rate
+            self._tokens = min(self._tokens, 0.0)
+            self._last_refill = self._paused_until
+        logger.warning(f"{self.name} throttled (HTTP 429): pausing all requests for {pause:.1f}s"
+                       + (f", rate lowered to {self._rate:.1f} req/s" if self._rate is not None else ""))
+
+    def release_response(self, response):
+        """Calls release() with the status and Retry-After of a requests.Response (or None if sending failed)."""
+        if response is None:
+            self.release()
+        else:
+            self.release(response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+
+    def stats(self):
+        """
+        Returns:
+        dict: requests, throttled (429 responses), wait_seconds (total time callers spent waiting for the limiter),
+        max_wait_seconds, current_rate (req/s, None if uncapped) and in_flight.
+        """
+        with self._lock:
+            return {"requests": self.requests, "throttled": self.throttled,
+                    "wait_seconds": round(self.wait_seconds, 3), "max_wait_seconds": round(self.max_wait_seconds, 3),
+                    "current_rate": self._rate, "in_flight": self._in_flight}
+
+    def reset_stats(self):
+        with self._lock:
+            self._reset_stats()
+
+    def log_stats(self):
+        stats = self.stats()
+        rate = f"{stats['current_rate']:.1f} req/s" if stats["current_rate"] is not None else "uncapped"
+        logger.info(f"{self.name} rate limiter: {stats['requests']} requests, {stats['wait_seconds']:.1f}s total wait "
+                    f"(max {stats['max_wait_seconds']:.1f}s), {stats['throttled']} throttled, current rate {rate}")
+        return stats
+
+
+# Shared by every HSD connector in the process (see connectors.hsd_session)
+HSD_RATE_LIMITER = RateLimiter()
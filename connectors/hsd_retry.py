@@ -0,0 +1,205 @@
+import email.utils
+import http.client
+import random
+import threading
+import time
+import requests
+import urllib3
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+
+# HTTP status codes worth retrying: timeouts, throttling and transient server/gateway errors.
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class HsdFatalError(Exception):
+    """
+    A failure that retrying cannot fix (e.g. a response without "data", 404, 401). Raised immediately.
+    """
+    pass
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without contacting the API while the circuit breaker is open (the API is considered down).
+    """
+    pass
+
+
+def get_retry_after(exception):
+    """
+    Reads the Retry-After header (delta-seconds or HTTP-date) from the response attached to an exception.
+
+    Returns:
+    float: Seconds to wait, or None if the header is missing or malformed.
+    """
+    response = getattr(exception, "response", None)
+    if response is None:
+        return None
+    return parse_retry_after(response.headers.get("Retry-After"))
+
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header value (delta-seconds or HTTP-date).
+
+    Returns:
+    float: Seconds to wait, or None if the value is missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: the delay before retry n is a random value in
+    [0, min(max_delay, base_delay * 2 ** n)], or the server's Retry-After if that is longer.
+
+    Parameters:
+    max_attempts (int): Total attempts including the first one.
+    base_delay (float): Backoff base in seconds.
+    max_delay (float): Upper bound for a single delay in seconds (Retry-After is also capped to this).
+    """
+
+    def __init__(self, max_attempts=6, base_delay=0.5, max_delay=30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def compute_delay(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    @staticmethod
+    def is_retryable(exception):
+        """
+        Classifies an exception as transient (retry) or fatal (raise immediately).
+        """
+        if isinstance(exception, (HsdFatalError, CircuitOpenError)):
+            return False
+        if isinstance(exception, requests.exceptions.HTTPError):
+            response = exception.response
+            return response is not None and response.status_code in RETRYABLE_STATUS_CODES
+        if isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                                  requests.exceptions.ChunkedEncodingError, urllib3.exceptions.MaxRetryError,
+                                  urllib3.exceptions.ProtocolError, http.client.RemoteDisconnected)):
+            return True
+        # A truncated or non-JSON body (e.g. a proxy error page) is usually transient
+        if isinstance(exception, ValueError):
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """
+    Fails fast once the API is clearly down. After failure_threshold consecutive retryable failures the
+    circuit opens and calls raise CircuitOpenError for reset_timeout seconds. After that a single trial
+    call is let through (half-open): success closes the circuit, failure opens it again.
+
+    Parameters:
+    failure_threshold (int): Consecutive transient failures that open the circuit.
+    reset_timeout (float): Seconds the circuit stays open before a trial call is allowed.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._trial_in_flight:
+                raise CircuitOpenError(f"HSD API circuit is open, failing fast (retry in {max(remaining, 0):.0f}s)")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("HSD API circuit closed, API is responding again")
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._trial_in_flight or (self._opened_at is None and self._consecutive_failures >= self.failure_threshold):
+                logger.error(f"HSD API circuit opened after {self._consecutive_failures} consecutive failures")
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def reset(self):
+        self.record_success()
+
+
+# Shared by every HSD connector in the process so they all see the same view of the API health
+DEFAULT_RETRY_POLICY = RetryPolicy()
+HSD_CIRCUIT_BREAKER = CircuitBreaker()
+
+
+def call_with_retry(func, description="HSD request", policy=None, breaker=None):
+    """
+    Calls func() and retries transient failures according to the retry policy, behind the circuit breaker.
+
+    Parameters:
+    func (callable): Performs one attempt and returns its result or raises.
+    description (str): Used in log messages.
+    policy (RetryPolicy): Retry policy (optional). Defaults to DEFAULT_RETRY_POLICY.
+    breaker (CircuitBreaker): Circuit breaker (optional). Defaults to the shared HSD_CIRCUIT_BREAKER.
+
+    Returns:
+    The value returned by func().
+
+    Raises:
+    CircuitOpenError: If the circuit is open.
+    HsdFatalError (or any non-retryable exception): Immediately, without retrying.
+    The last exception if all attempts fail.
+    """
+    policy = policy or DEFAULT_RETRY_POLICY
+    breaker = breaker or HSD_CIRCUIT_BREAKER
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = func()
+        except Exception as e:
+            retryable = policy.is_retryable(e)
+            if retryable:
+                breaker.record_failure()
+            else:
+                # The API answered; a deterministic failure says nothing about its health
+                breaker.record_success()
+            attempt += 1
+            if not retryable or attempt >= policy.max_attempts:
+                raise
+            delay = policy.compute_delay(attempt, get_retry_after(e))
+            logger.warning(f"{description} failed ({e}), retrying in {delay:.1f}s, {policy.max_attempts - attempt} more attempts")
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
@@ -0,0 +1,221 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+from common.html_text import html_to_text
+
+# Index location. Override with the HSD_SEARCH_INDEX_PATH environment variable, or set HSD_SEARCH_INDEX=off to stop
+# indexing fetched articles.
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.hsd_cache', 'hsd_search.sqlite3')
+DEFAULT_SEARCH_LIMIT = 1000
+# Searchable columns and the HSD fields they are filled from (the first one present wins)
+INDEXED_FIELDS = {
+    "title": ("title",),
+    "description": ("description",),
+    "comments": ("comments",),
+    "forum_notes": ("forum_notes", "sighting.forum_notes"),
+}
+# Search terms containing FTS5 syntax are passed through as is, anything else is matched word by word
+_FTS_SYNTAX = re.compile(r'["*^:()]|\b(?:AND|OR|NOT|NEAR)\b')
+
+_default_index = None
+_default_index_lock = threading.Lock()
+# Fetched articles are indexed on one background thread so indexing (HTML-to-text, FTS writes) never delays a fetch.
+# A single worker also keeps the writes in fetch order.
+_indexer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hsd-search-index")
+_last_indexing = None
+
+
+def fts_query(term):
+    """
+    Turns a search term into an FTS5 query. Plain terms match articles containing every word (each word as a
+    phrase, so "punit_fuses" matches that exact token sequence); terms using FTS5 syntax are used unchanged.
+    """
+    term = term.strip()
+    if _FTS_SYNTAX.search(term):
+        return term
+    return " ".join('"' + word.replace('"', '""') + '"' for word in term.split())
+
+
+class HsdSearchIndex:
+    """
+    SQLite FTS5 full-text index over the title, description, comments and forum notes of fetched HSDs. Filled
+    incrementally by the connectors as articles are fetched (see index_fetched()), so keyword searches run locally
+    in milliseconds instead of going through an HSD query.
+
+    Articles fetched with only some of the indexed fields keep the other fields from earlier fetches, and
+    unchanged articles are not rewritten.
+
+    Parameters:
+    path (str): Path of the SQLite database file. Created if missing.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        columns = ", ".join(INDEXED_FIELDS)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS hsd_fts USING fts5({columns}, tokenize='unicode61')")
+            # One row per indexed article, rowid = HSD ID (shared with hsd_fts)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hsd_docs ("
+                " hsd_id INTEGER PRIMARY KEY,"
+                " status TEXT,"
+                " digest TEXT NOT NULL,"
+                " indexed_at REAL NOT NULL)")
+
+    def index(self, records):
+        """
+        Adds or updates articles in the index.
+
+        Parameters:
+        records (iterable): HSD records (dicts or HsdArticle) with an "id". Records without any indexed field
+        (e.g. id,updated_date revalidation stamps) are ignored.
+
+        Returns:
+        int: Number of articles written.
+        """
+        prepared = {}
+        for record in records:
+            hsd_id = str(record.get("id") or "").strip()
+            if not hsd_id.isdigit():
+                continue
+            values = {column: next((record.get(field) for field in fields if field in record), None)
+                      for column, fields in INDEXED_FIELDS.items()}
+            if all(value is None for value in values.values()):
+                continue
+            digest = hashlib.blake2b(repr(sorted(values.items())).encode("utf-8", "surrogatepass"),
+                                     digest_size=12).hexdigest()
+            prepared[int(hsd_id)] = (values, record.get("status"), digest)
+        if not prepared:
+            return 0
+
+        written = 0
+        now = time.time()
+        with self._lock, self._conn:
+            known = {rowid: (digest, status) for rowid, digest, status in
+                     self._select_chunked("SELECT hsd_id, digest, status FROM hsd_docs WHERE hsd_id IN ({})", list(prepared))}
+            for rowid, (values, status, digest) in prepared.items():
+                if rowid in known and known[rowid][0] == digest:
+                    continue
+                if status is None and rowid in known:
+                    status = known[rowid][1]
+                texts = {column: html_to_text(value) if value is not None else None for column, value in values.items()}
+                if rowid in known:
+                    previous = self._conn.execute(f"SELECT {', '.join(INDEXED_FIELDS)} FROM hsd_fts WHERE rowid = ?",
+                                                  (rowid,)).fetchone()
+                    if previous is not None:
+                        texts = {column: text if text is not None else old
+                                 for (column, text), old in zip(texts.items(), previous)}
+                    self._conn.execute("DELETE FROM hsd_fts WHERE rowid = ?", (rowid,))
+                self._conn.execute(f"INSERT INTO hsd_fts (rowid, {', '.join(texts)}) VALUES (?{', ?' * len(texts)})",
+                                   (rowid, *texts.values()))
+                self._conn.execute("INSERT OR REPLACE INTO hsd_docs (hsd_id, status, digest, indexed_at) VALUES (?, ?, ?, ?)",
+                                   (rowid, status, digest, now))
+                written += 1
+        return written
+
+    def _select_chunked(self, sql, ids):
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            yield from self._conn.execute(sql.format(",".join("?" * len(chunk))), chunk)
+
+    def search(self, term, limit=DEFAULT_SEARCH_LIMIT):
+        """
+        Full-text search, best matches first (bm25).
+
+        Parameters:
+        term (str): Words to look for (all must match), or an FTS5 query ("fccb OR fuse", "pcode*", "title: fccb").
+        limit (int): Maximum number of results.
+
+        Returns:
+        list: {"id", "title", "status"} dicts of the matching articles.
+
+        Raises:
+        ValueError: If the term is not a valid FTS5 query.
+        """
+        query = fts_query(term)
+        if not query:
+            return []
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT hsd_fts.rowid, hsd_fts.title, hsd_docs.status FROM hsd_fts"
+                    " LEFT JOIN hsd_docs ON hsd_docs.hsd_id = hsd_fts.rowid"
+                    " WHERE hsd_fts MATCH ? ORDER BY bm25(hsd_fts) LIMIT ?", (query, limit)).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search term {term!r}: {e}")
+        return [{"id": str(rowid), "title": title, "status": status} for rowid, title, status in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM hsd_docs").fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM hsd_fts")
+            self._conn.execute("DELETE FROM hsd_docs")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_default_index():
+    """
+    Returns the process-wide search index, or None if disabled with HSD_SEARCH_INDEX=off.
+    """
+    global _default_index
+    if os.environ.get("HSD_SEARCH_INDEX", "").lower() in ("off", "0", "false", "no"):
+        return None
+    with _default_index_lock:
+        if _default_index is None:
+            path = os.environ.get("HSD_SEARCH_INDEX_PATH", DEFAULT_INDEX_PATH)
+            try:
+                _default_index = HsdSearchIndex(path)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not open the HSD search index at {path}, indexing disabled: {e}")
+                return None
+        return _default_index
+
+
+def index_fetched(records):
+    """
+    Queues fetched HSD records for the default search index and returns immediately. Never raises: indexing must
+    not break a fetch.
+    """
+    global _last_indexing
+    index = get_default_index()
+    if index is None:
+        return
+    records = list(records)
+    if records:
+        _last_indexing = _indexer.submit(_index_quietly, index, records)
+
+
+def _index_quietly(index, records):
+    try:
+        return index.index(records)
+    except Exception as e:
+        logger.warning(f"Could not index fetched HSDs: {e}")
+        return 0
+
+
+def flush_indexing(timeout=None):
+    """
+    Waits until every article queued by index_fetched() is in the index. Called before searching.
+    """
+    if _last_indexing is not None:
+        _last_indexing.exception(timeout)
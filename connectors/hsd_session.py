@@ -0,0 +1,187 @@
+import threading
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+from connectors.hsd_rate_limiter import HSD_RATE_LIMITER
+from connectors.transfer_stats import HSD_TRANSFER_STATS
+
+requests.packages.urllib3.disable_warnings()
+
+# API root and authentication. Point HSD_API_BASE_URL at a local stand-in (Tools/hsd_standin_server.py) and set
+# HSD_API_AUTH=none to run the HSD code paths without Kerberos or the live API.
+HSD_API_BASE_URL = os.environ.get("HSD_API_BASE_URL", "https://hsdes-api.intel.com").rstrip("/")
+HSD_API_AUTH = os.environ.get("HSD_API_AUTH", "kerberos").lower()
+ARTICLE_URL = HSD_API_BASE_URL + "/rest/article/"
+QUERY_EXECUTION_URL = HSD_API_BASE_URL + "/rest/query/execution/"
+EQL_EXECUTION_URL = HSD_API_BASE_URL + "/rest/query/execution/eql"
+
+# Number of keep-alive connections kept open per host. Callers that fan out (batch fetchers, tree crawler)
+# should pass their worker count so no worker has to wait for a free connection.
+DEFAULT_POOL_SIZE = 16
+# (connect, read) timeout in seconds for requests that do not set their own. The read timeout applies per socket
+# read, so long streamed query pages are not cut off.
+DEFAULT_TIMEOUT = (10, 120)
+# Every content coding urllib3 can decode here: gzip and deflate always, br/zstd when brotli/zstandard is installed.
+# HSD comments and descriptions are verbose HTML and typically shrink 5-10x.
+ACCEPT_ENCODING = urllib3.util.request.ACCEPT_ENCODING
+
+_shared_session = None
+_shared_pool_size = 0
+_shared_session_lock = threading.Lock()
+
+
+class ThreadLocalKerberosAuth(requests.auth.AuthBase):
+    """
+    Kerberos (SPNEGO) auth that keeps one HTTPKerberosAuth object per thread.
+
+    HTTPKerberosAuth caches the negotiated security context per host on the instance, so reusing one instance
+    avoids rebuilding the context for every request. That cache is not safe to share between threads that are
+    authenticating concurrently, so each thread gets its own instance.
+
+    Parameters:
+    force_preemptive (bool): Send the Negotiate header on the first request instead of waiting for the 401
+    challenge, which saves one round trip per request.
+    """
+
+    def __init__(self, force_preemptive=True):
+        # Imported here so HSD_API_AUTH=none (stand-in server, benchmarks) works without requests_kerberos installed
+        from requests_kerberos import HTTPKerberosAuth
+        self._auth_class = HTTPKerberosAuth
+        self.force_preemptive = force_preemptive
+        self._local = threading.local()
+
+    def _get_auth(self):
+        auth = getattr(self._local, "auth", None)
+        if auth is None:
+            auth = self._auth_class(force_preemptive=self.force_preemptive)
+            self._local.auth = auth
+        return auth
+
+    def __call__(self, request):
+        return self._get_auth()(request)
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that sends every request through a RateLimiter, so all sessions mounted with it share one
+    request budget. The in-flight slot is held until the response headers arrive; the body of a stream=True
+    response is downloaded outside of it.
+
+    Parameters:
+    limiter (RateLimiter): The limiter to use (optional). Defaults to the process-wide HSD_RATE_LIMITER.
+    """
+
+    def __init__(self, limiter=None, **kwargs):
+        self.limiter = limiter or HSD_RATE_LIMITER
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self.limiter.acquire()
+        response = None
+        try:
+            response = super().send(request, **kwargs)
+            return response
+        finally:
+            self.limiter.release_response(response)
+
+
+class HsdSession(requests.Session):
+    """
+    requests.Session that applies DEFAULT_TIMEOUT and counts response bytes on the wire versus decoded in
+    HSD_TRANSFER_STATS. Streamed bodies are counted by their reader (see connectors.hsd_json_stream).
+    """
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = DEFAULT_TIMEOUT
+        response = super().send(request, **kwargs)
+        if not kwargs.get("stream"):
+            record_transfer(response, len(response.content))
+        return response
+
+
+def record_transfer(response, decoded_bytes):
+    """
+    Adds a fully read requests response to HSD_TRANSFER_STATS.
+
+    Parameters:
+    response (requests.Response): The response.
+    decoded_bytes (int): Size of the decoded body.
+    """
+    try:
+        wire_bytes = response.raw.tell()
+    except (AttributeError, OSError):
+        wire_bytes = decoded_bytes
+    HSD_TRANSFER_STATS.record(wire_bytes, decoded_bytes, compressed=bool(response.headers.get("Content-Encoding")))
+
+
+def _mount_pool(session, pool_size):
+    previous = session.adapters.get("https://")
+    adapter = RateLimitedAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Release the keep-alive connections of the replaced pool; connections still in use are closed when returned
+    if isinstance(previous, RateLimitedAdapter):
+        previous.close()
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE):
+    """
+    Creates a requests.Session configured for the HSD API: pooled keep-alive connections behind the shared
+    rate limiter, compressed responses, default timeouts, reusable Kerberos auth (unless HSD_API_AUTH=none) and
+    TLS verification disabled (same as the previous per-request calls).
+
+    Parameters:
+    pool_size (int): Maximum number of pooled connections per host.
+
+    Returns:
+    requests.Session: The configured session.
+    """
+    session = HsdSession()
+    _mount_pool(session, pool_size)
+    if HSD_API_AUTH != "none":
+        session.auth = ThreadLocalKerberosAuth()
+    session.verify = False
+    session.headers.update({'Connection': 'keep-alive', 'Accept-Encoding': ACCEPT_ENCODING})
+    return session
+
+
+def get_shared_session(pool_size=None):
+    """
+    Returns the process-wide HSD session, creating it on first use. Every HsdConnector instance shares this
+    session so TCP/TLS connections and the Kerberos context survive across calls and across instances.
+
+    Parameters:
+    pool_size (int): Requested pool size (optional). If larger than the current pool, the pool is grown.
+
+    Returns:
+    requests.Session: The shared session.
+    """
+    global _shared_session, _shared_pool_size
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_pool_size = pool_size or DEFAULT_POOL_SIZE
+            _shared_session = create_session(_shared_pool_size)
+            logger.info(f"Created shared HSD session for {HSD_API_BASE_URL} with connection pool size {_shared_pool_size}")
+        elif pool_size is not None and pool_size > _shared_pool_size:
+            _shared_pool_size = pool_size
+            _mount_pool(_shared_session, _shared_pool_size)
+            logger.info(f"Grew shared HSD session connection pool to {_shared_pool_size}")
+        return _shared_session
+
+
+def close_shared_session():
+    """
+    Closes the shared session and its pooled connections. The next get_shared_session() call creates a new one.
+    """
+    global _shared_session, _shared_pool_size
+    with _shared_session_lock:
+        if _shared_session is not None:
+            _shared_session.close()
+        _shared_session = None
+        _shared_pool_size = 0
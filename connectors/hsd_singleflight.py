@@ -0,0 +1,118 @@
+import threading
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+from connectors.hsd_cache import fields_key
+from connectors.hsd_field_profiles import resolve_fields
+
+
+def hsd_key(hsd_id, fields=None, kind="article"):
+    """
+    Builds the coalescing key of an HSD lookup. Field lists are order-insensitive and profile names resolve to
+    the same key as their field list.
+    """
+    return kind, str(hsd_id), fields_key(resolve_fields(fields))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces duplicate lookups: while a call for a key is in flight, other callers with the same key wait for it
+    instead of issuing their own request, and (with remember_results) later callers get the stored result
+    without any request. All of them receive the same result object, so callers must treat it as read-only.
+
+    Failed calls are never remembered: the error is raised to every waiting caller and the next call retries.
+    None results are not remembered either, since the connectors return None on failure.
+
+    Parameters:
+    remember_results (bool): Keep successful results for repeated (not only concurrent) lookups.
+    name (str): Used in log messages.
+    """
+
+    def __init__(self, remember_results=True, name="HSD lookups"):
+        self.remember_results = remember_results
+        self.name = name
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._results = {}
+        self.calls_made = 0
+        self.calls_saved = 0
+
+    def do(self, key, func):
+        """
+        Returns func() for key, sharing one call among concurrent and repeated callers.
+
+        Parameters:
+        key (hashable): Identifies the lookup, e.g. hsd_key(hsd_id, fields).
+        func (callable): Performs the lookup.
+
+        Returns:
+        The (shared) result of func().
+        """
+        with self._lock:
+            if key in self._results:
+                self.calls_saved += 1
+                return self._results[key]
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._in_flight[key] = call
+                self.calls_made += 1
+            else:
+                self.calls_saved += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if self.remember_results and call.error is None and call.result is not None:
+                    self._results[key] = call.result
+            call.done.set()
+        return call.result
+
+    def remember(self, key, result):
+        """Stores a result obtained elsewhere (e.g. by a bulk prefetch) so lookups of key are served from it."""
+        if result is None:
+            return
+        with self._lock:
+            self._results[key] = result
+
+    def forget(self, key=None):
+        """Drops one remembered result, or all of them if key is None."""
+        with self._lock:
+            if key is None:
+                self._results.clear()
+            else:
+                self._results.pop(key, None)
+
+    def stats(self):
+        """
+        Returns:
+        dict: calls_made (lookups that reached the API) and calls_saved (lookups served by another call).
+        """
+        with self._lock:
+            return {"calls_made": self.calls_made, "calls_saved": self.calls_saved}
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(f"{self.name}: {stats['calls_made']} calls made, {stats['calls_saved']} duplicate calls saved")
+        return stats
@@ -0,0 +1,149 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+
+# Completions in flight at once. Each batch spends most of its time waiting on the model, so a handful in parallel
+# turns a long sequential run into roughly the time of its slowest batches. Override with LLM_MAX_IN_FLIGHT.
+DEFAULT_LLM_CONCURRENCY = int(os.environ.get("LLM_MAX_IN_FLIGHT", "8"))
+
+
+class TokenUsage:
+    """
+    Thread-safe token counters, shared by all completions of a connector. The plain += on connector attributes
+    loses updates when completions finish on several threads at once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.requests = 0
+            self.cache_hits = 0
+            self.cache_misses = 0
+            self.saved_tokens = 0
+            self.payload_tokens_before = 0
+            self.payload_tokens_after = 0
+
+    def record(self, prompt_tokens, completion_tokens):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+            self.requests += 1
+
+    def record_completion(self, completion):
+        """Adds the usage of a chat completion response (ignored if the response carries none)."""
+        usage = getattr(completion, "usage", None)
+        if usage is not None:
+            self.record(usage.prompt_tokens, usage.completion_tokens)
+
+    def record_cached(self, completion, cached):
+        """
+        Counts a completion that went through the response cache (see connectors.llm_response_cache): a hit costs
+        no tokens and is counted as saved, a miss is recorded like any other completion.
+        """
+        if not cached:
+            with self._lock:
+                self.cache_misses += 1
+            self.record_completion(completion)
+            return
+        usage = getattr(completion, "usage", None)
+        with self._lock:
+            self.cache_hits += 1
+            self.saved_tokens += usage.total_tokens if usage is not None else 0
+
+    def record_payload(self, tokens_before, tokens_after):
+        """Counts the HSD data tokens of a prompt before and after compaction (see connectors.llm_prompt_payload)."""
+        with self._lock:
+            self.payload_tokens_before += tokens_before
+            self.payload_tokens_after += tokens_after
+
+    def stats(self):
+        """
+        Returns:
+        dict: prompt_tokens, completion_tokens, total_tokens, requests; cache_hits, cache_misses and
+        saved_tokens for completions served through the response cache; payload_tokens_before and
+        payload_tokens_after of the HSD data sent.
+        """
+        with self._lock:
+            return {"prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+                    "total_tokens": self.prompt_tokens + self.completion_tokens, "requests": self.requests,
+                    "cache_hits": self.cache_hits, "cache_misses": self.cache_misses,
+                    "saved_tokens": self.saved_tokens, "payload_tokens_before": self.payload_tokens_before,
+                    "payload_tokens_after": self.payload_tokens_after}
+
+
+class BatchOutcome:
+    """
+    Result of one batch. Exactly one of result/error is meaningful.
+
+    Attributes:
+    index (int): Position of the batch in the input (0-based).
+    item: The batch as passed in (e.g. the batch file path).
+    result: What the batch function returned.
+    error (str): Error message if the batch function raised.
+    seconds (float): Wall time of the batch.
+    """
+
+    def __init__(self, index, item, result=None, error=None, seconds=0.0):
+        self.index = index
+        self.item = item
+        self.result = result
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _run_one(index, item, func):
+    start = time.time()
+    try:
+        return BatchOutcome(index, item, result=func(item), seconds=time.time() - start)
+    except Exception as e:
+        logger.warning(f"Batch {index + 1} failed: {e}")
+        return BatchOutcome(index, item, error=str(e) or type(e).__name__, seconds=time.time() - start)
+
+
+def run_batches(items, func, max_in_flight=DEFAULT_LLM_CONCURRENCY, on_done=None):
+    """
+    Runs func(item) for every batch concurrently, with at most max_in_flight running at once.
+
+    A failing batch never affects the others: its exception is caught and reported in its outcome.
+
+    Parameters:
+    items (list): The batches, e.g. batch file paths.
+    func (callable): func(item) -> result, called on a worker thread. Must be thread-safe.
+    max_in_flight (int): Maximum concurrent batches. 1 runs them one after another.
+    on_done (callable): on_done(outcome, completed, total), called on the calling thread as each batch finishes
+        (in completion order), e.g. to update a progress bar (optional).
+
+    Returns:
+    list: One BatchOutcome per item, in input order.
+    """
+    items = list(items)
+    outcomes = [None] * len(items)
+    if not items:
+        return outcomes
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(items))),
+                            thread_name_prefix="llm-batch") as executor:
+        futures = [executor.submit(_run_one, index, item, func) for index, item in enumerate(items)]
+        for completed, future in enumerate(as_completed(futures), 1):
+            outcome = future.result()
+            outcomes[outcome.index] = outcome
+            if on_done is not None:
+                on_done(outcome, completed, len(items))
+    failed = sum(not outcome.ok for outcome in outcomes)
+    logger.info(f"Ran {len(items)} batches ({failed} failed) in {time.time() - start:.1f}s with up to "
+                f"{max_in_flight} in flight, slowest batch {max(outcome.seconds for outcome in outcomes):.1f}s")
+    return outcomes
@@ -0,0 +1,112 @@
+import json
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+from common.html_text import HTML_FIELDS, collapse_whitespace, html_to_text
+from connectors.llm_token_budget import count_tokens, DEFAULT_MODEL
+
+# Longest text kept per field when sending HSD data to the model, 0 for no limit. Override with LLM_MAX_FIELD_CHARS.
+DEFAULT_MAX_FIELD_CHARS = int(os.environ.get("LLM_MAX_FIELD_CHARS", "0"))
+# Fields the length limit applies to: the long free-text ones
+TRUNCATED_FIELDS = HTML_FIELDS
+# Share of a truncated field kept from its start; the rest comes from its end, where the latest comments usually are
+TRUNCATE_HEAD_SHARE = 0.6
+_EMPTY = (None, "", [], {})
+
+
+def truncate_text(text, limit):
+    """
+    Shortens text to about limit characters, keeping its start and end and marking what was left out.
+    """
+    if not limit or len(text) <= limit:
+        return text
+    head = int(limit * TRUNCATE_HEAD_SHARE)
+    tail = limit - head
+    return f"{text[:head]}\n[... {len(text) - limit} characters omitted ...]\n{text[-tail:]}"
+
+
+def compact_record(record, max_field_chars=DEFAULT_MAX_FIELD_CHARS, field_limits=None):
+    """
+    Returns an HSD record reduced to what the model needs: HTML fields as text, whitespace collapsed in every text
+    value, null and empty fields dropped and long text fields optionally truncated.
+
+    Parameters:
+    record (dict): The HSD record (or an update record from connectors.hsd_comment_delta).
+    max_field_chars (int): Character limit for the fields in TRUNCATED_FIELDS, 0 for none.
+    field_limits (dict): Per-field character limits, overriding max_field_chars (optional).
+
+    Returns:
+    dict: The compact record. Field order is kept.
+    """
+    compact = {}
+    for field, value in record.items():
+        if isinstance(value, str):
+            value = html_to_text(value) if field in HTML_FIELDS else collapse_whitespace(value)
+            limit = (field_limits or {}).get(field, max_field_chars if field in TRUNCATED_FIELDS else 0)
+            value = truncate_text(value, limit)
+        if value in _EMPTY:
+            continue
+        compact[field] = value
+    return compact
+
+
+def compact_prompt_records(records, max_field_chars=DEFAULT_MAX_FIELD_CHARS, field_limits=None):
+    """
+    compact_record() for a record, a list of records or a batch dict with the records under "data".
+
+    Returns:
+    The same shape as records.
+    """
+    if isinstance(records, list):
+        return [compact_prompt_records(record, max_field_chars, field_limits) for record in records]
+    if not isinstance(records, dict):
+        return records
+    if isinstance(records.get("data"), list):
+        return {**records, "data": compact_prompt_records(records["data"], max_field_chars, field_limits)}
+    return compact_record(records, max_field_chars, field_limits)
+
+
+def dumps_compact(data):
+    """
+    Minified JSON for prompts: no indentation or spaces after separators, non-ASCII text kept as is rather than
+    escaped (an escape costs several tokens per character).
+    """
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def serialise_for_prompt(records, max_field_chars=DEFAULT_MAX_FIELD_CHARS, field_limits=None):
+    """
+    Returns:
+    str: HSD data as sent to the model, see compact_record() and dumps_compact().
+    """
+    return dumps_compact(compact_prompt_records(records, max_field_chars, field_limits))
+
+
+def record_tokens(record, model=DEFAULT_MODEL):
+    """
+    Tokens an HSD record adds to a batch prompt, measured on the payload serialise_for_prompt() sends (plus one for
+    the separator between records).
+    """
+    return count_tokens(serialise_for_prompt(record), model) + 1
+
+
+def payload_report(raw, payload, label="HSD data"):
+    """
+    Compares the tokens of HSD data as it used to be sent (indented JSON with the raw HTML) with the compact payload.
+
+    Parameters:
+    raw: The HSD data as read from the batch file.
+    payload (str): The serialised payload actually sent.
+    label (str): What the data is, for the message.
+
+    Returns:
+    tuple: (tokens before, tokens after, message)
+    """
+    before = count_tokens(json.dumps(raw, indent=4))
+    after = count_tokens(payload)
+    saved = 100.0 * (before - after) / before if before else 0.0
+    message = f"🧮 {label}: {before} -> {after} tokens ({saved:.0f}% fewer)"
+    logger.debug(message)
+    return before, after, message
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+
+try:
+    from openai.types.chat import ChatCompletion
+except ImportError:
+    ChatCompletion = None
+
+# Cache location. Override with the LLM_CACHE_PATH environment variable, or set LLM_CACHE=off to always call Azure.
+DEFAULT_LLM_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.hsd_cache', 'llm_responses.sqlite3')
+# A report re-run within a week reuses its completions; after that the prompt is sent again
+DEFAULT_LLM_CACHE_TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL", 7 * 24 * 3600))
+DEFAULT_LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 5000))
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def _jsonable(value):
+    # Structured output formats may be given as pydantic models
+    if hasattr(value, "model_json_schema"):
+        return value.model_json_schema()
+    return repr(value)
+
+
+def completion_cache_key(**params):
+    """
+    Content address of a chat completion request: a hash of every request parameter (deployment, messages,
+    response_format, temperature, ...). Any change to a prompt gives a different key.
+    """
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=_jsonable)
+    return hashlib.blake2b(payload.encode("utf-8", "surrogatepass"), digest_size=20).hexdigest()
+
+
+class LlmResponseCache:
+    """
+    SQLite backed cache of chat completions keyed by completion_cache_key(). Entries older than ttl_seconds are
+    evicted, and the least recently used ones once the cache holds more than max_entries.
+
+    Parameters:
+    path (str): Path of the SQLite database file. Created if missing.
+    ttl_seconds (float): Maximum age of an entry.
+    max_entries (int): Maximum number of entries kept.
+    """
+
+    def __init__(self, path=DEFAULT_LLM_CACHE_PATH, ttl_seconds=DEFAULT_LLM_CACHE_TTL_SECONDS,
+                 max_entries=DEFAULT_LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Completions finish on worker threads (see connectors.llm_batch_executor), access is serialised
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self.evict()
+
+    def get(self, key):
+        """
+        Returns:
+        str: The cached completion JSON, or None if missing or expired.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT payload FROM responses WHERE key = ? AND created_at >= ?",
+                                     (key, now - self.ttl_seconds)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0] if row is not None else None
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM responses WHERE key = ? AND created_at >= ?",
+                                      (key, time.time() - self.ttl_seconds)).fetchone() is not None
+
+    def put(self, key, payload):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, payload, now, now))
+
+    def evict(self):
+        """
+        Drops expired entries and, above max_entries, the least recently used ones.
+
+        Returns:
+        int: Number of entries removed.
+        """
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM responses WHERE created_at < ?",
+                                         (time.time() - self.ttl_seconds,)).rowcount
+            excess = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (excess,)).rowcount
+        return removed
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def get_default_llm_cache():
+    """
+    Returns the process-wide LLM response cache, or None if disabled with LLM_CACHE=off.
+    """
+    global _default_cache
+    if os.environ.get("LLM_CACHE", "").lower() in ("off", "0", "false", "no") or ChatCompletion is None:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            path = os.environ.get("LLM_CACHE_PATH", DEFAULT_LLM_CACHE_PATH)
+            try:
+                _default_cache = LlmResponseCache(path)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not open the LLM response cache at {path}, caching disabled: {e}")
+                return None
+        return _default_cache
+
+
+def _finished(completion):
+    choices = getattr(completion, "choices", None)
+    return bool(choices) and all(choice.finish_reason == "stop" for choice in choices)
+
+
+def cached_completion(client, cache=None, bypass=False, **params):
+    """
+    client.chat.completions.create(**params), served from the cache when the identical request was made before.
+
+    Parameters:
+    client (AzureOpenAI): The client.
+    cache (LlmResponseCache): The cache (optional). None always calls the API.
+    bypass (bool): Call the API even on a cache hit; the fresh completion replaces the cached one.
+    Only completions whose choices all finished with "stop" are cached.
+    params: The request parameters (model, messages, response_format, temperature, ...).
+
+    Returns:
+    tuple: (ChatCompletion, True if it was served from the cache)
+    """
+    key = completion_cache_key(**params) if cache is not None else None
+    if key is not None and not bypass:
+        payload = cache.get(key)
+        if payload is not None:
+            try:
+                return ChatCompletion.model_validate_json(payload), True
+            except ValueError as e:
+                logger.warning(f"Ignoring unreadable cached completion: {e}")
+    completion = client.chat.completions.create(**params)
+    # Answers cut off by the token limit or blocked by the content filter are not reused: the next run asks again
+    if key is not None and _finished(completion):
+        try:
+            cache.put(key, completion.model_dump_json())
+        except (sqlite3.Error, AttributeError) as e:
+            logger.warning(f"Could not cache completion: {e}")
+    return completion, False
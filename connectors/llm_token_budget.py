@@ -0,0 +1,118 @@
+import functools
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_MODEL = "gpt-4o"
+# Prompt tokens allowed per batch (system prompt, user prompt and HSD data). Well inside the gpt-4o context window:
+# long prompts answer slower and summarise worse. Override with LLM_PROMPT_TOKEN_BUDGET.
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.environ.get("LLM_PROMPT_TOKEN_BUDGET", "24000"))
+# Room left for the answer: every HSD gets its own report, so the completion grows with the number of HSDs in a
+# batch and must stay under the deployment's output limit. Override with LLM_COMPLETION_TOKENS_PER_HSD.
+DEFAULT_COMPLETION_TOKENS_PER_HSD = int(os.environ.get("LLM_COMPLETION_TOKENS_PER_HSD", "500"))
+MAX_COMPLETION_TOKENS = 16384
+# HSD data always gets at least this much of the budget, however long the prompts are
+MIN_DATA_TOKENS = 2000
+# Used when tiktoken or its encoding files are not available
+CHARS_PER_TOKEN = 4
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model=DEFAULT_MODEL):
+    """
+    Returns the tiktoken encoding of a model, loaded once per process. Loading an encoding reads (and on first use
+    downloads) its BPE file, which costs far more than encoding a prompt.
+
+    Returns:
+    tiktoken.Encoding: The encoding, or None if tiktoken or the encoding file is unavailable (token counts are
+    then estimated from the text length).
+    """
+    if tiktoken is None:
+        logger.info("tiktoken is not installed, estimating token counts from text length")
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception as e:
+        logger.warning(f"Could not load the tiktoken encoding for {model}, estimating token counts from text length: {e}")
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"Could not load a tiktoken encoding, estimating token counts from text length: {e}")
+        return None
+
+
+def count_tokens(text, model=DEFAULT_MODEL):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model=DEFAULT_MODEL):
+    """
+    Returns:
+    int: Tokens of the contents of chat messages ({"role", "content"} dicts).
+    """
+    return sum(count_tokens(message["content"], model) for message in messages if message.get("content"))
+
+
+def data_token_budget(*prompts, budget=DEFAULT_PROMPT_TOKEN_BUDGET, model=DEFAULT_MODEL):
+    """
+    Tokens left for HSD data in each batch once the prompts sent with every batch are counted.
+
+    Parameters:
+    prompts (str): The prompts sent with every batch (system prompt, user prompt, formatting instructions).
+    budget (int): Prompt token budget per batch.
+    model (str): Model whose tokenizer is used.
+    """
+    fixed = sum(count_tokens(prompt, model) for prompt in prompts if prompt)
+    return max(MIN_DATA_TOKENS, budget - fixed)
+
+
+def max_batch_hsds(completion_tokens_per_hsd=DEFAULT_COMPLETION_TOKENS_PER_HSD,
+                   max_completion_tokens=MAX_COMPLETION_TOKENS):
+    """
+    Returns:
+    int: Most HSDs a batch may hold so that their reports still fit in one completion.
+    """
+    return max(1, max_completion_tokens // max(1, completion_tokens_per_hsd))
+
+
+def pack_by_tokens(sizes, budget, max_items=None):
+    """
+    Bin-packs items into as few batches as possible, each with a total size within budget (first-fit decreasing).
+    Items larger than the budget get a batch of their own.
+
+    Parameters:
+    sizes (list): Token size of each item.
+    budget (int): Maximum total size of a batch.
+    max_items (int): Maximum number of items per batch (optional).
+
+    Returns:
+    list: Batches as lists of item indices. Each batch keeps the input order, and batches are ordered by their
+    first item, so the same sizes always give the same batches.
+    """
+    bins = []
+    for index in sorted(range(len(sizes)), key=lambda i: (-sizes[i], i)):
+        size = sizes[index]
+        for members in bins:
+            if members[0] + size <= budget and (max_items is None or len(members[1]) < max_items):
+                members[0] += size
+                members[1].append(index)
+                break
+        else:
+            if size > budget:
+                logger.warning(f"Item {index + 1} needs {size} tokens, more than the batch budget of {budget}; "
+                               f"it is sent in a batch of its own")
+            bins.append([size, [index]])
+    return sorted((sorted(members) for _, members in bins), key=lambda members: members[0])
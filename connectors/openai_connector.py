@@ -1,6 +1,5 @@
 from openai import AzureOpenAI
 import requests
-import httpx
 import openai
 import urllib3
 import http.client
@@ -17,9 +16,13 @@ from datetime import datetime
 from pathlib import Path
 from requests_kerberos import HTTPKerberosAuth
 import argparse
-import tiktoken
 import logging
 sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from connectors.azure_http_client import create_azure_http_client
+from connectors.llm_batch_executor import TokenUsage
+from connectors.llm_response_cache import cached_completion, get_default_llm_cache
+from connectors.llm_token_budget import count_message_tokens
+from connectors.llm_prompt_payload import serialise_for_prompt, payload_report
 #from logging_config import logger
 import logging
 logger = logging.getLogger(__name__)
@@ -57,29 +60,47 @@ client = AzureOpenAI(
     api_key = openai_key, #TODO - Need to update the API KEY and it shouldn't be hard coded it
     base_url = "https://laasapim01.laas.icloud.intel.com/azopenai",
     default_headers={"Ocp-Apim-Subscription-Key" :openai_key},
-    http_client=httpx.Client(verify=False)
+    http_client=create_azure_http_client()
     )
 
 class OpenAIConnector:
     # Initialize the OpenAI connector class
-    def __init__(self, deployment_name=None):
+    def __init__(self, deployment_name=None, use_cache=True, bypass_cache=False):
+        """
+        Parameters:
+        deployment_name (str): Azure OpenAI deployment (default: DEFAULT_DEPLOYMENT_NAME).
+        use_cache (bool): Serve repeated identical requests from the LLM response cache
+            (see connectors.llm_response_cache).
+        bypass_cache (bool): Always call the model; fresh completions still refresh the cache.
+        """
         if (deployment_name is None):
             deployment_name = DEFAULT_DEPLOYMENT_NAME
         self.deployment_name = deployment_name
-        self.total_prompt_tokens = 0
-        self.total_completion_tokens = 0
-        self.total_hsds_processed = 0
+        self.llm_cache = get_default_llm_cache() if use_cache else None
+        self.bypass_cache = bypass_cache
+        # Completions may run on several threads at once (see connectors.llm_batch_executor)
+        self.usage = TokenUsage()
         self.finish_reason = ""
 
+    @property
+    def total_prompt_tokens(self):
+        return self.usage.prompt_tokens
+
+    @property
+    def total_completion_tokens(self):
+        return self.usage.completion_tokens
+
+    @property
+    def total_hsds_processed(self):
+        # Cached responses count as processed, they just cost no tokens
+        return self.usage.requests + self.usage.cache_hits
+
     def estimate_token_count(self, messages):
         """
         Estimate the token count for the given messages.
         """
-        encoding = tiktoken.encoding_for_model(self.deployment_name)
-        num_tokens = 0
-        for message in messages:
-            num_tokens += len(encoding.encode(message["content"]))
-        return num_tokens
+        # The encoder is loaded once per process (see connectors.llm_token_budget)
+        return count_message_tokens(messages, self.deployment_name)
 
     # Run the prompt on the OpenAI model
     def run_prompt(self, prompt):
@@ -95,10 +116,8 @@ class OpenAIConnector:
         # Record the start time
         start_time = time.time()
 
-        completion = client.chat.completions.create(
-            model=self.deployment_name,
-            messages=prompt
-        )
+        completion, cached = cached_completion(client, self.llm_cache, self.bypass_cache,
+                                               model=self.deployment_name, messages=prompt)
 
         # Record the end time
         end_time = time.time()
@@ -112,11 +131,9 @@ class OpenAIConnector:
         total_tokens = completion.usage.total_tokens
 
         # Update token counts
-        self.total_prompt_tokens += completion.usage.prompt_tokens
-        self.total_completion_tokens += completion.usage.completion_tokens
-        self.total_hsds_processed += 1
+        self.usage.record_cached(completion, cached)
 
-        logger.info(f" Prompt tokens: {prompt_tokens} | Completion tokens: {completion_tokens} | Total tokens: {total_tokens} | Time taken: {time_taken:.2f} seconds")
+        logger.info(f"{'[cached]' if cached else ''} Prompt tokens: {prompt_tokens} | Completion tokens: {completion_tokens} | Total tokens: {total_tokens} | Time taken: {time_taken:.2f} seconds")
 
         gpt_completion = completion.choices[0].message.content
         return {
@@ -147,10 +164,8 @@ class OpenAIConnector:
         # Record the start time
         start_time = time.time()
         
-        completion = client.chat.completions.create(
-            model=self.deployment_name,
-            messages=messages
-        )
+        completion, cached = cached_completion(client, self.llm_cache, self.bypass_cache,
+                                               model=self.deployment_name, messages=messages)
         
         # Record the end time
         end_time = time.time()
@@ -165,11 +180,9 @@ class OpenAIConnector:
         finish_reason = completion.choices[0].finish_reason
         
         # Update token counts
-        self.total_prompt_tokens += completion.usage.prompt_tokens
-        self.total_completion_tokens += completion.usage.completion_tokens
-        self.total_hsds_processed += 1
+        self.usage.record_cached(completion, cached)
         
-        logger.info(f" Prompt tokens: {prompt_tokens} | Completion tokens: {completion_tokens} | Total tokens: {total_tokens} | Time taken: {time_taken:.2f} seconds | Finish reason: {finish_reason}")
+        logger.info(f"{'[cached]' if cached else ''} Prompt tokens: {prompt_tokens} | Completion tokens: {completion_tokens} | Total tokens: {total_tokens} | Time taken: {time_taken:.2f} seconds | Finish reason: {finish_reason}")
         if finish_reason == "length":
             logger.warning("WARNING: The completion was stopped due to reaching the maximum token limit.")
         
@@ -202,10 +215,8 @@ class OpenAIConnector:
         # Record the start time
         start_time = time.time()
         
-        completion = client.chat.completions.create(
-            model=self.deployment_name,
-            messages=messages
-        )
+        completion, cached = cached_completion(client, self.llm_cache, self.bypass_cache,
+                                               model=self.deployment_name, messages=messages)
         
         # Record the end time
         end_time = time.time()
@@ -220,11 +231,9 @@ class OpenAIConnector:
         finish_reason = completion.choices[0].finish_reason
         
         # Update token counts
-        self.total_prompt_tokens += completion.usage.prompt_tokens
-        self.total_completion_tokens += completion.usage.completion_tokens
-        self.total_hsds_processed += 1
+        self.usage.record_cached(completion, cached)
         
-        logger.info(f" Prompt tokens: {prompt_tokens} | Completion tokens: {completion_tokens} | Total tokens: {total_tokens} | Time taken: {time_taken:.2f} seconds | Finish reason: {finish_reason}")
+        logger.info(f"{'[cached]' if cached else ''} Prompt tokens: {prompt_tokens} | Completion tokens: {completion_tokens} | Total tokens: {total_tokens} | Time taken: {time_taken:.2f} seconds | Finish reason: {finish_reason}")
         if finish_reason == "length":
             logger.warning("WARNING: The completion was stopped due to reaching the maximum token limit.")
         
@@ -237,9 +246,13 @@ class OpenAIConnector:
 
     def run_prompt_with_json(self, hsd_query_data_file, system_prompt, user_action_prompt):
         try:
-            with open(hsd_query_data_file, 'r') as f:
+            with open(hsd_query_data_file, 'r', encoding='utf-8') as f:
                 json_data = json.load(f)
-                json_data_str = json.dumps(json_data, indent=4)
+                # Minified, HTML as text, empty fields dropped (see connectors.llm_prompt_payload)
+                json_data_str = serialise_for_prompt(json_data)
+                before, after, message = payload_report(json_data, json_data_str)
+                self.usage.record_payload(before, after)
+                logger.info(message)
                 messages = [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_action_prompt + "/n" + json_data_str},
@@ -263,17 +276,9 @@ class OpenAIConnector:
             {"role": "user", "content": concatened_user_prompt_with_item}
         ]
         
-        if response_format_schema:
-            completion = client.chat.completions.create(
-                model=DEFAULT_DEPLOYMENT_NAME,
-                messages=messages,
-                response_format=response_format_schema
-            )
-        else:
-            completion = client.chat.completions.create(
-                model=DEFAULT_DEPLOYMENT_NAME,
-                messages=messages
-            )
+        params = {"response_format": response_format_schema} if response_format_schema else {}
+        completion, cached = cached_completion(client, self.llm_cache, self.bypass_cache,
+                                               model=DEFAULT_DEPLOYMENT_NAME, messages=messages, **params)
 
         # Record the end time
         end_time = time.time()
@@ -286,12 +291,10 @@ class OpenAIConnector:
         completion_tokens = completion.usage.completion_tokens
         total_tokens = completion.usage.total_tokens
 
-        logger.info(f"HSD ID: {hsd_id} | Prompt tokens: {prompt_tokens} | Completion tokens: {completion_tokens} | Total tokens: {total_tokens} | Time taken: {time_taken:.2f} seconds")
+        logger.info(f"{'[cached] ' if cached else ''}HSD ID: {hsd_id} | Prompt tokens: {prompt_tokens} | Completion tokens: {completion_tokens} | Total tokens: {total_tokens} | Time taken: {time_taken:.2f} seconds")
 
         # Update token counts
-        self.total_prompt_tokens += completion.usage.prompt_tokens
-        self.total_completion_tokens += completion.usage.completion_tokens
-        self.total_hsds_processed += 1
+        self.usage.record_cached(completion, cached)
 
         return completion.choices[0].message.content if not response_format_schema else completion.choices[0].message
     
@@ -311,9 +314,13 @@ class OpenAIConnector:
         return response_json
 
     def get_token_usage(self):
+        stats = self.usage.stats()
         return {
-            "total_prompt_tokens": self.total_prompt_tokens,
-            "total_completion_tokens": self.total_completion_tokens,
-            "total_hsds_processed": self.total_hsds_processed,
-            "grand_total_tokens": self.total_prompt_tokens + self.total_completion_tokens
+            "total_prompt_tokens": stats["prompt_tokens"],
+            "total_completion_tokens": stats["completion_tokens"],
+            "total_hsds_processed": stats["requests"] + stats["cache_hits"],
+            "grand_total_tokens": stats["total_tokens"],
+            "cache_hits": stats["cache_hits"],
+            "cache_misses": stats["cache_misses"],
+            "tokens_saved_by_cache": stats["saved_tokens"]
         }
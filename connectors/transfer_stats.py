@@ -0,0 +1,79 @@
+import atexit
+import threading
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../', 'common'))
+from common.logging_config import logger
+
+
+class TransferStats:
+    """
+    Counts response bodies as transferred (after transfer compression) and as decoded, so the effect of gzip/brotli
+    on a run can be read off directly.
+
+    Parameters:
+    name (str): Used in log messages.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.responses = 0
+            self.compressed_responses = 0
+            self.wire_bytes = 0
+            self.decoded_bytes = 0
+
+    def record(self, wire_bytes, decoded_bytes, compressed=False):
+        """
+        Parameters:
+        wire_bytes (int): Body bytes received from the network.
+        decoded_bytes (int): Body bytes after content decoding.
+        compressed (bool): The response had a Content-Encoding.
+        """
+        with self._lock:
+            self.responses += 1
+            self.compressed_responses += bool(compressed)
+            self.wire_bytes += wire_bytes
+            self.decoded_bytes += decoded_bytes
+
+    def stats(self):
+        """
+        Returns:
+        dict: responses, compressed_responses, wire_bytes, decoded_bytes and ratio (wire / decoded).
+        """
+        with self._lock:
+            ratio = self.wire_bytes / self.decoded_bytes if self.decoded_bytes else None
+            return {"responses": self.responses, "compressed_responses": self.compressed_responses,
+                    "wire_bytes": self.wire_bytes, "decoded_bytes": self.decoded_bytes, "ratio": ratio}
+
+    def log_stats(self):
+        stats = self.stats()
+        ratio = f"{stats['ratio']:.0%}" if stats["ratio"] is not None else "n/a"
+        logger.info(f"{self.name} transfer: {stats['responses']} responses ({stats['compressed_responses']} compressed), "
+                    f"{format_bytes(stats['wire_bytes'])} on the wire for {format_bytes(stats['decoded_bytes'])} decoded "
+                    f"({ratio})")
+        return stats
+
+
+def format_bytes(count):
+    for unit in ("B", "KB", "MB"):
+        if count < 1024:
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} GB"
+
+
+HSD_TRANSFER_STATS = TransferStats("HSD API")
+AZURE_TRANSFER_STATS = TransferStats("Azure OpenAI")
+
+
+@atexit.register
+def _log_run_totals():
+    for transfer_stats in (HSD_TRANSFER_STATS, AZURE_TRANSFER_STATS):
+        if transfer_stats.responses:
+            transfer_stats.log_stats()
@@ -1,8 +1,25 @@
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import time
 from bigtree import Node
 import connectors.hsd_connector as HSD
-import threading
-import time
+from connectors.hsd_async_fetcher import fetch_articles
+from connectors.hsd_field_profiles import resolve_fields
+from connectors.hsd_rate_limiter import HSD_RATE_LIMITER
+from common.logging_config import logger
+from common.html_text import html_to_text
+
+# Worker threads get_hsd_tree uses to fetch one level of the tree, however large the tree is
+DEFAULT_TREE_WORKERS = 8
+# Link attributes the crawler needs to pick the children of a node
+TREE_LINK_FIELDS = ["id", "subject", "relationship", "parent_id"]
+# Children kept under a node, following the hierarchy TP > TPF > TCD > TC
+TREE_CHILD_SUBJECTS = ("test_plan_feature", "test_case_definition", "test_case")
+# Snapshot of the PVIM folder/test plan hierarchy browsed by run_main, so navigation works from memory and offline.
+# Folders older than PVIM_SNAPSHOT_MAX_AGE seconds are refreshed from the API when it is reachable.
+PVIM_SNAPSHOT_PATH = os.environ.get("HSD_PVIM_SNAPSHOT", os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.hsd_cache', 'pvim_hierarchy.json'))
+PVIM_SNAPSHOT_MAX_AGE = 7 * 24 * 3600
 
 class HSDHandler:
     def __init__(self):
@@ -14,11 +31,7 @@ class HSDHandler:
         # # print(hsd)
         if self.validate_hsd(hsd) == 0:
             html_desc = hsd['description']
-        if html_desc is None:
-            return ''
-        else:
-            soup = BeautifulSoup(html_desc, "html.parser")
-            return soup.text
+        return html_to_text(html_desc)
     
     def validate_hsd(self,hsd):
         __supported_tenants = ["server", "validation_central"]
@@ -29,57 +42,97 @@ class HSDHandler:
             raise Exception("Tenant Subject not supported")
         return 0
 
-    def get_hsd_tree(self, hsd_id, node_parent, is_test_plan=False):
-        time.sleep(0.001)
-        data = self.hsd.get_hsd(hsd_id)
+    def get_hsd_tree(self, hsd_id, node_parent=None, is_test_plan=False, max_depth=None, max_workers=DEFAULT_TREE_WORKERS):
+        """
+        Builds the bigtree Node hierarchy (TP > TPF > TCD > TC) below an HSD.
+
+        The tree is crawled breadth first, one level at a time: the articles of a level are fetched together
+        (bulk queries projected to the "tree_node" fields) while a fixed pool of max_workers threads fetches their
+        links. HSDs reached a second time (link cycles, shared children) are not expanded again.
+
+        Links are not batched: the API only returns links per article (/rest/article/{id}/links) and the bulk EQL
+        query (connectors.hsd_bulk_fetcher) selects article fields, not links, so every expanded node still costs
+        one links request. The pool only runs a level's requests concurrently, it does not reduce their number.
+
+        Parameters:
+        hsd_id (str): The HSD at the top of the tree.
+        node_parent (Node): Node to attach the tree to (optional).
+        is_test_plan (bool): Unused, kept for compatibility.
+        max_depth (int): Number of levels to expand below hsd_id (optional). If not defined, the whole tree.
+        max_workers (int): Worker threads used to fetch a level.
+
+        Returns:
+        Node: The node of hsd_id, with the tree below it.
+
+        Raises:
+        Exception: If hsd_id itself cannot be fetched or is not supported (see validate_hsd). Failing descendants
+        are logged and left out of the tree.
+        """
+        hsd_id = str(hsd_id)
+        root = None
+        visited = {hsd_id}
+        level = [(hsd_id, node_parent)]
+        depth = 0
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hsd-tree") as executor:
+            while level:
+                expand = max_depth is None or depth < max_depth
+                link_futures = [executor.submit(self.hsd.get_hsd_links, node_id, TREE_LINK_FIELDS) if expand else None
+                                for node_id, _ in level]
+                articles = fetch_articles([node_id for node_id, _ in level], fields=resolve_fields("tree_node"),
+                                          max_concurrency=max_workers, cache=self.hsd.cache)
+                next_level = []
+                for (node_id, parent), article, link_future in zip(level, articles, link_futures):
+                    try:
+                        if not article.ok or not article.data:
+                            raise Exception(article.error or f"No data found for HSD ID: {node_id}")
+                        node = self._build_tree_node(article.data[0], parent)
+                    except Exception as e:
+                        if root is None:
+                            raise
+                        logger.error(f"Skipping HSD {node_id} and its children in the tree: {e}")
+                        continue
+                    if root is None:
+                        root = node
+                    if link_future is None:
+                        continue
+                    links = link_future.result() or {}
+                    for child_id in self._tree_child_ids(node_id, links.get('responses', [])):
+                        if child_id in visited:
+                            logger.warning(f"HSD {child_id} is linked more than once in the tree of {hsd_id}, expanding it once")
+                            continue
+                        visited.add(child_id)
+                        next_level.append((child_id, node))
+                level = next_level
+                depth += 1
+
+        logger.info(f"Built the HSD tree of {hsd_id}: {len(visited)} HSDs in {depth} levels")
+        HSD_RATE_LIMITER.log_stats()
+        return root
+
+    def _build_tree_node(self, data, node_parent):
         self.validate_hsd(data)
         node_dict = {
             "name": data['title'],
             "id": data['id'],
             "owner": data['owner'],
-            "report": BeautifulSoup(data['description'], "html.parser").text if data['description'] != None else '',
+            "report": html_to_text(data['description']),
             "subject": data["subject"],
             "parent": node_parent,
             "status": data.get('status', ''),
             "priority": data.get('priority', ''),
             "title": data['title']  # Ensure title is included
         }
-        root = Node.from_dict(node_dict)
-        links = self.hsd.get_hsd_links(hsd_id)
+        return Node.from_dict(node_dict)
 
-        threads = []
-        for hsd_link in links['responses']:
+    @staticmethod
+    def _tree_child_ids(hsd_id, links):
+        children = []
+        for hsd_link in links:
             # Ensure the hierarchy: TP > TPF > TCD > TC
-            if hsd_link['relationship'] == 'parent-child':
-                if hsd_link['subject'] == 'test_plan_feature' and hsd_link['parent_id'] == hsd_id:
-                    # Link TPF under TP
-                    thread = threading.Thread(
-                        target=self.get_hsd_tree,
-                        args=(hsd_link['id'], root, False)
-                    )
-                elif hsd_link['subject'] == 'test_case_definition' and hsd_link['parent_id'] == hsd_id:
-                    # Link TCD under TPF
-                    thread = threading.Thread(
-                        target=self.get_hsd_tree,
-                        args=(hsd_link['id'], root, False)
-                    )
-                elif hsd_link['subject'] == 'test_case' and hsd_link['parent_id'] == hsd_id:
-                    # Link TC under TCD
-                    thread = threading.Thread(
-                        target=self.get_hsd_tree,
-                        args=(hsd_link['id'], root, False)
-                    )
-                else:
-                    continue
-                threads.append(thread)
-                thread.start()
-
-        for thread in threads:
-            thread.join()
-
-        # Ensure the root node is returned only for the top-level call
-        if node_parent is None:
-            return root
+            if hsd_link.get('relationship') == 'parent-child' and hsd_link.get('subject') in TREE_CHILD_SUBJECTS \
+                    and str(hsd_link.get('parent_id')) == hsd_id:
+                children.append(str(hsd_link['id']))
+        return children
         
     #Function that perform the query to HSD to request HSD links details
     def __get_hsd_info(self, hsd_id):
@@ -116,34 +169,116 @@ class HSDHandler:
         return parent_node
             
 
-#Class to save the children and parent relationship
+#Class to save the children and parent relationship, indexed in both directions
 class Tree:
     def __init__(self):
         self.nodes = {}
+        self.parents = {}
+        # Link details of each expanded node (what _get_hsd_info returned) and when they were fetched
+        self.info = {}
+        self._descendants = {}
+        # True when the tree changed since it was loaded or last saved, so save() only writes changed trees
+        self.dirty = False
 
     def add_node(self, parent, children):
+        children = list(children)
+        if self.nodes.get(parent) == children:
+            return
+        for child in self.nodes.get(parent, []):
+            if self.parents.get(child) == parent:
+                del self.parents[child]
         self.nodes[parent] = children
+        for child in self.nodes[parent]:
+            self.parents[child] = parent
+        self._descendants.clear()
+        self.dirty = True
 
     def get_children(self, parent):
         return self.nodes.get(parent, [])
 
     def has_parent(self, child):
-        return any(child in children for children in self.nodes.values())
+        return child in self.parents
 
     def get_parent(self, child):
-        for parent, children in self.nodes.items():
-            if child in children:
-                return parent
-        return None
+        return self.parents.get(child)
+
+    def get_descendants(self, parent):
+        """
+        Returns all nodes below parent in depth-first order, each with its depth below parent (1 for the children).
+        A node linked more than once is listed once. The result is memoised until the tree changes.
+
+        Returns:
+        tuple: (node, depth) pairs.
+        """
+        descendants = self._descendants.get(parent)
+        if descendants is None:
+            found = []
+            seen = {parent}
+            pending = [(child, 1) for child in reversed(self.get_children(parent))]
+            while pending:
+                child, depth = pending.pop()
+                if child in seen:
+                    continue
+                seen.add(child)
+                found.append((child, depth))
+                pending.extend((grandchild, depth + 1) for grandchild in reversed(self.get_children(child)))
+            descendants = self._descendants[parent] = tuple(found)
+        return descendants
     
     def print_all_descendants(self, parent, depth=0):
-        children = self.get_children(parent)
-        if not children:
+        """
+        Logs the descendants of parent (debug level), one per line, indented by their depth.
+
+        Returns:
+        list: The logged lines.
+        """
+        lines = ["  " * (depth + child_depth - 1) + str(child) for child, child_depth in self.get_descendants(parent)]
+        for line in lines:
+            logger.debug(line)
+        return lines
+
+    def set_info(self, hsd_id, links):
+        self.info[hsd_id] = {"fetched_at": time.time(), "links": links}
+        self.dirty = True
+
+    def get_info(self, hsd_id, max_age=None):
+        """
+        Returns the stored link details of hsd_id, or None if there are none (or they are older than max_age seconds).
+        """
+        entry = self.info.get(hsd_id)
+        if entry is None or (max_age is not None and time.time() - entry["fetched_at"] > max_age):
+            return None
+        return entry["links"]
+
+    def save(self, path=PVIM_SNAPSHOT_PATH):
+        """
+        Writes the tree to the snapshot file, unless nothing changed since it was loaded or last saved.
+        """
+        if not self.dirty:
             return
-        else:
-            for child in children:
-                # # print("  " * depth + child)
-                self.print_all_descendants(child, depth + 1)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"nodes": self.nodes, "info": self.info}, f)
+        os.replace(temp_path, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path=PVIM_SNAPSHOT_PATH):
+        """
+        Loads a tree saved with save(). Returns an empty tree if the snapshot is missing or unreadable.
+        """
+        tree = cls()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return tree
+        for parent, children in snapshot.get("nodes", {}).items():
+            tree.add_node(parent, children)
+        tree.info = snapshot.get("info", {})
+        tree.dirty = False
+        return tree
 
 #For CMD prompt to dinamically show the options and return the selected index
 def _menu_prompt(options, msg=None, rtn_feature=False):
@@ -169,14 +304,27 @@ def _menu_prompt(options, msg=None, rtn_feature=False):
             # print(e)
             return None
 
-#Function that perform the query to HSD to request HSD links details
-def _get_hsd_info(hsd_id):
+#Function that perform the query to HSD to request HSD links details, served from the tree snapshot when possible
+def _get_hsd_info(hsd_id, tree=None, hsd=None):
+    if tree is not None:
+        links = tree.get_info(hsd_id, PVIM_SNAPSHOT_MAX_AGE)
+        if links is not None:
+            return links
     fields = ["id","subject","tenant","title","owner","status","relationship"]
     ## print("Getting info...")
-    hsd = HSDHandler()
+    hsd = hsd or HSDHandler()
     rsp = hsd.hsd.get_hsd_links(hsd_id, fields)
     ## print("Ready!")
-    return rsp.get("responses")
+    if rsp is None:
+        # API not reachable: an outdated snapshot entry is better than nothing
+        links = tree.get_info(hsd_id) if tree is not None else None
+        if links is None:
+            raise Exception(f"Could not fetch the links of HSD {hsd_id}")
+        return links
+    links = rsp.get("responses")
+    if tree is not None:
+        tree.set_info(hsd_id, links)
+    return links
 
 #In this function we take in consideration only pvim folders and test plans
 def _process_info(llist):
@@ -200,41 +348,47 @@ def _process_info(llist):
 
 #Main function to iterate over the pvim folders
 def run_main():
-    import os
     os.system("cls")
     # print("Application intended for IP/SOC validators")
-    tree = Tree()
+    # Folders browsed before are served from the snapshot, so going back and forth needs no HSD queries
+    tree = Tree.load()
+    handler = HSDHandler()
     pvim_start = '1015583783'  #parent pvim folder
     hsd_2_search = pvim_start
     tp_found = False
-    while not tp_found:
-        extract_info = _get_hsd_info(hsd_2_search)
-        options = _process_info(extract_info)
-        llist = []
-        id_num = []
-        for opt in options.keys():
-            rsp = options.get(opt)
-            visual = rsp[1] + "\t(" + rsp[3] + ")"
-            llist.append(visual)
-            id_num.append(rsp[0])
-        #Saving the hierarchy of the found HSD
-        tree.add_node(hsd_2_search, id_num)
-        #Return to previous folder is not available in the root folder
-        if pvim_start != hsd_2_search:
-            llist.append("Return to previous folder")
-            rtn_feature = True
-        else:
-            rtn_feature = False
-        #Create the cmd prompt menu for the folder selection
-        sel_opt = _menu_prompt(llist, "Select an option:", rtn_feature)
-        if sel_opt == -1:
-            hsd_2_search = tree.get_parent(hsd_2_search)
-            continue
-        values = options.get(sel_opt)
-        #If the selected HSD is a test plan we can finish the function
-        hsd_2_search = values[0]
-        if values[4]:
-            tp_found = True
+    # The snapshot is written once per navigation step (only if that step fetched anything) and when leaving
+    try:
+        while not tp_found:
+            extract_info = _get_hsd_info(hsd_2_search, tree, handler)
+            options = _process_info(extract_info)
+            llist = []
+            id_num = []
+            for opt in options.keys():
+                rsp = options.get(opt)
+                visual = rsp[1] + "\t(" + rsp[3] + ")"
+                llist.append(visual)
+                id_num.append(rsp[0])
+            #Saving the hierarchy of the found HSD
+            tree.add_node(hsd_2_search, id_num)
+            tree.save()
+            #Return to previous folder is not available in the root folder
+            if pvim_start != hsd_2_search:
+                llist.append("Return to previous folder")
+                rtn_feature = True
+            else:
+                rtn_feature = False
+            #Create the cmd prompt menu for the folder selection
+            sel_opt = _menu_prompt(llist, "Select an option:", rtn_feature)
+            if sel_opt == -1:
+                hsd_2_search = tree.get_parent(hsd_2_search)
+                continue
+            values = options.get(sel_opt)
+            #If the selected HSD is a test plan we can finish the function
+            hsd_2_search = values[0]
+            if values[4]:
+                tp_found = True
+    finally:
+        tree.save()
     # print("Your selected test plan is:",hsd_2_search)
     return hsd_2_search
     